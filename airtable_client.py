@@ -0,0 +1,197 @@
+import os
+import time
+import random
+import threading
+from collections import Counter
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# AIRTABLE_ENDPOINT_URL points the scripts at another server, e.g. the benchmark's mock Airtable
+AIRTABLE_ENDPOINT_URL = (os.getenv("AIRTABLE_ENDPOINT_URL") or "https://api.airtable.com").rstrip("/")
+AIRTABLE_API_URL = f"{AIRTABLE_ENDPOINT_URL}/v0"
+
+# Airtable blocks a client for 30 seconds after it exceeds the rate limit
+RATE_LIMIT_PENALTY = 30.0
+
+# Responses worth retrying: rate limited, or a transient server error
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+class AirtableClient:
+    """Shared Airtable REST client used by the region scripts
+
+    All requests go through one pooled `requests.Session`, so connections are
+    kept alive between calls (and between the worker threads of an --async
+    run). Every request has a timeout. Rate-limited (429) responses, transient
+    5xx responses and connection errors are retried with exponential backoff;
+    a `Retry-After` header is honored, and a 429 without one waits out
+    Airtable's 30-second penalty. While one thread waits out a 429, the other
+    threads sharing the client wait too instead of extending the penalty.
+
+    Requests, retries, 429s, errors and the time spent backing off are
+    counted in `stats`. Each response is also reported to the limiter, so an
+    adaptive one slows down on 429s, Retry-After headers and rising latency.
+
+    Methods return the final `requests.Response`, so callers check
+    `response.ok` as before. Connection errors that persist after the last
+    retry are raised. Requests that aren't safe to repeat (creating a
+    webhook) are only retried when Airtable certainly didn't act on them:
+    after a 429, or when the connection could not be opened.
+    """
+
+    def __init__(self, token, base_id, table_name, timeout=(5, 30), max_retries=5, backoff=1.0, max_backoff=60.0, limiter=None, pool_size=16):
+        self.base_id = base_id
+        self.table_name = table_name
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.limiter = limiter
+        self.blocked_until = 0.0
+        self.stats = Counter()
+        self.lock = threading.Lock()
+
+        self.session = requests.Session()
+        self.session.headers.update({
+            "Authorization": f"Bearer {token}",
+            "Content-Type": "application/json"
+        })
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    @property
+    def table_url(self):
+        return f"{AIRTABLE_API_URL}/{self.base_id}/{self.table_name}"
+
+    @property
+    def schema_url(self):
+        return f"{AIRTABLE_API_URL}/meta/bases/{self.base_id}/tables"
+
+    @property
+    def webhooks_url(self):
+        return f"{AIRTABLE_API_URL}/bases/{self.base_id}/webhooks"
+
+    def record_url(self, record_id):
+        return f"{self.table_url}/{record_id}"
+
+    def request(self, method, url, idempotent=True, **kwargs):
+        """Send a request, retrying rate-limited and transient failures (only the former unless `idempotent`)"""
+        kwargs.setdefault("timeout", self.timeout)
+        attempt = 0
+        while True:
+            self._wait_for_penalty()
+            if self.limiter:
+                self.limiter.acquire()
+
+            self._count("requests", "retries" if attempt else None)
+            started = time.monotonic()
+            try:
+                response = self.session.request(method, url, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                self._count("connection_errors")
+                # A request that may have reached Airtable is only sent again when repeating it is harmless
+                if attempt >= self.max_retries or not (idempotent or isinstance(e, requests.ConnectTimeout)):
+                    raise
+                delay = self._backoff(attempt)
+                print(f"Airtable request failed ({e}); retrying in {delay:.1f}s")
+            else:
+                if response.status_code == 429:
+                    self._count("throttled")
+                elif response.status_code >= 500:
+                    self._count("server_errors")
+                if self.limiter:
+                    self._report(response, time.monotonic() - started)
+                retryable = response.status_code == 429 or (idempotent and response.status_code in RETRY_STATUSES)
+                if not retryable or attempt >= self.max_retries:
+                    return response
+                delay = self._retry_after(response)
+                if delay is None:
+                    delay = RATE_LIMIT_PENALTY if response.status_code == 429 else self._backoff(attempt)
+                if response.status_code == 429:
+                    with self.lock:
+                        self.blocked_until = max(self.blocked_until, time.monotonic() + delay)
+                print(f"Airtable returned {response.status_code}; retrying in {delay:.1f}s")
+
+            with self.lock:
+                self.stats["retry_wait_seconds"] += delay
+            time.sleep(delay)
+            attempt += 1
+
+    def _report(self, response, latency):
+        # Tell an adaptive limiter how Airtable is coping with the current rate
+        if response.status_code == 429:
+            self.limiter.throttled("Airtable returned 429")
+        elif "Retry-After" in response.headers:
+            self.limiter.throttled(f"Airtable sent Retry-After {response.headers['Retry-After']}")
+        elif response.status_code < 500:
+            self.limiter.succeeded(latency, kind=response.request.method)
+
+    def _count(self, *names):
+        with self.lock:
+            for name in names:
+                if name:
+                    self.stats[name] += 1
+
+    def _wait_for_penalty(self):
+        with self.lock:
+            wait = self.blocked_until - time.monotonic()
+        if wait > 0:
+            time.sleep(wait)
+
+    def _backoff(self, attempt):
+        # Full jitter keeps concurrent workers from retrying in lockstep
+        return random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+
+    def _retry_after(self, response):
+        try:
+            return max(0.0, float(response.headers.get("Retry-After")))
+        except (TypeError, ValueError):
+            return None
+
+    def list_records(self, **params):
+        """Fetch one page of records from the table"""
+        return self.request("GET", self.table_url, params=params)
+
+    def get_record(self, record_id):
+        return self.request("GET", self.record_url(record_id))
+
+    def update_record(self, record_id, fields):
+        return self.request("PATCH", self.record_url(record_id), json={"fields": fields})
+
+    def update_records(self, records):
+        """Update up to 10 records in one request; `records` is a list of {"id", "fields"}"""
+        return self.request("PATCH", self.table_url, json={"records": records})
+
+    def get_schema(self):
+        """Fetch the schema of every table in the base"""
+        return self.request("GET", self.schema_url)
+
+    def create_webhook(self, specification, notification_url=None):
+        """Create a webhook on the base; Airtable pings `notification_url` (if any) when it has payloads"""
+        # Not retried after it may have reached Airtable: a second webhook would count against the base's limit
+        return self.request("POST", self.webhooks_url, idempotent=False, json={"notificationUrl": notification_url, "specification": specification})
+
+    def list_webhooks(self):
+        return self.request("GET", self.webhooks_url)
+
+    def list_webhook_payloads(self, webhook_id, cursor=None):
+        """Fetch the next page of change payloads of a webhook, starting at `cursor`"""
+        params = {"cursor": cursor} if cursor else {}
+        return self.request("GET", f"{self.webhooks_url}/{webhook_id}/payloads", params=params)
+
+    def refresh_webhook(self, webhook_id):
+        """Push back a webhook's expiration (Airtable disables webhooks after 7 days)"""
+        return self.request("POST", f"{self.webhooks_url}/{webhook_id}/refresh")
+
+    def delete_webhook(self, webhook_id):
+        return self.request("DELETE", f"{self.webhooks_url}/{webhook_id}")
+
+    def close(self):
+        self.session.close()
@@ -0,0 +1,124 @@
+import os
+import json
+import sqlite3
+from datetime import datetime, timedelta, timezone
+
+# Default mirror file, kept next to the scripts
+DEFAULT_MIRROR_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "parks_mirror.sqlite3")
+
+# Re-read edits made shortly before the previous sync started, in case clocks disagree
+SYNC_OVERLAP = timedelta(minutes=5)
+
+class ParksMirror:
+    """Local SQLite copy of an Airtable table, kept current with incremental syncs
+
+    The first sync downloads the whole table. Later syncs only ask Airtable
+    for records modified since the previous sync (LAST_MODIFIED_TIME()), which
+    is usually a single small request. Deleted records can't be seen by a
+    delta sync, so a full sync is run again once the last one is older than
+    `full_sync_days`, or when requested. Requests go through the given
+    AirtableClient.
+    """
+
+    def __init__(self, client, path=DEFAULT_MIRROR_PATH, full_sync_days=7):
+        self.client = client
+        self.table_key = f"{client.base_id}/{client.table_name}"
+        self.full_sync_days = full_sync_days
+        self.connection = sqlite3.connect(path)
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS records ("
+            " table_key TEXT NOT NULL,"
+            " id TEXT NOT NULL,"
+            " created_time TEXT,"
+            " fields TEXT NOT NULL,"
+            " PRIMARY KEY (table_key, id))"
+        )
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS sync_state ("
+            " table_key TEXT PRIMARY KEY,"
+            " last_sync TEXT,"
+            " last_full_sync TEXT)"
+        )
+        self.connection.commit()
+
+    def _state(self):
+        row = self.connection.execute(
+            "SELECT last_sync, last_full_sync FROM sync_state WHERE table_key = ?", (self.table_key,)
+        ).fetchone()
+        if not row:
+            return None, None
+        return tuple(datetime.fromisoformat(value) if value else None for value in row)
+
+    def _fetch(self, params):
+        """Yield every record matching `params`, following Airtable's pagination"""
+        params = dict(params, pageSize=100)
+        while True:
+            response = self.client.list_records(**params)
+            if not response.ok:
+                raise RuntimeError(f"Error syncing mirror: {response.status_code} {response.text}")
+            data = response.json()
+            yield from data.get("records", [])
+            if not data.get("offset"):
+                return
+            params["offset"] = data["offset"]
+
+    def sync(self, full=False):
+        """Bring the mirror up to date and return the number of records downloaded"""
+        started = datetime.now(timezone.utc)
+        last_sync, last_full_sync = self._state()
+        full = full or not last_sync or not last_full_sync or started - last_full_sync > timedelta(days=self.full_sync_days)
+
+        params = {}
+        if not full:
+            since = (last_sync - SYNC_OVERLAP).strftime("%Y-%m-%dT%H:%M:%S.000Z")
+            params["filterByFormula"] = f"IS_AFTER(LAST_MODIFIED_TIME(), DATETIME_PARSE('{since}'))"
+
+        records = list(self._fetch(params))
+
+        with self.connection:
+            if full:
+                self.connection.execute("DELETE FROM records WHERE table_key = ?", (self.table_key,))
+            self.upsert(records, commit=False)
+            self.connection.execute(
+                "INSERT OR REPLACE INTO sync_state (table_key, last_sync, last_full_sync) VALUES (?, ?, ?)",
+                (self.table_key, started.isoformat(), (started if full else last_full_sync).isoformat()),
+            )
+
+        print(f"Mirror {'full' if full else 'incremental'} sync: {len(records)} records downloaded, {self.count()} in mirror")
+        return len(records)
+
+    def upsert(self, records, commit=True):
+        """Store records (as returned by the Airtable API) in the mirror"""
+        self.connection.executemany(
+            "INSERT OR REPLACE INTO records (table_key, id, created_time, fields) VALUES (?, ?, ?, ?)",
+            [(self.table_key, record["id"], record.get("createdTime"), json.dumps(record.get("fields", {}))) for record in records],
+        )
+        if commit:
+            self.connection.commit()
+
+    def count(self):
+        return self.connection.execute(
+            "SELECT COUNT(*) FROM records WHERE table_key = ?", (self.table_key,)
+        ).fetchone()[0]
+
+    def get(self, record_id):
+        """Return one mirrored record, or None"""
+        row = self.connection.execute(
+            "SELECT id, created_time, fields FROM records WHERE table_key = ? AND id = ?", (self.table_key, record_id)
+        ).fetchone()
+        return self._record(row) if row else None
+
+    def records(self):
+        """Yield every mirrored record in the same shape as the Airtable API"""
+        cursor = self.connection.execute(
+            "SELECT id, created_time, fields FROM records WHERE table_key = ? ORDER BY rowid", (self.table_key,)
+        )
+        for row in cursor:
+            yield self._record(row)
+
+    def _record(self, row):
+        record_id, created_time, fields = row
+        return {"id": record_id, "createdTime": created_time, "fields": json.loads(fields)}
+
+    def close(self):
+        self.connection.close()
@@ -0,0 +1,159 @@
+import os
+import json
+import time
+
+from run_metrics import write_atomically
+
+# Default schema cache file, kept next to the scripts
+DEFAULT_SCHEMA_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "airtable_schema.json")
+
+# Field types whose cells hold text, numbers or a checkbox
+TEXT_TYPES = {"singleLineText", "multilineText", "richText", "email", "url", "phoneNumber"}
+NUMBER_TYPES = {"number", "percent", "currency", "rating", "duration"}
+
+# Field types Airtable computes itself; writes to them are rejected
+COMPUTED_TYPES = {
+    "formula", "rollup", "count", "lookup", "multipleLookupValues", "autoNumber", "button",
+    "createdTime", "lastModifiedTime", "createdBy", "lastModifiedBy",
+}
+
+class TableSchema:
+    """The fields of one Airtable table: their types and, for select fields, their options"""
+
+    def __init__(self, table):
+        self.id = table.get("id")
+        self.name = table.get("name")
+        self.fields = {field["name"]: field for field in table.get("fields", [])}
+
+    def field_type(self, name):
+        field = self.fields.get(name)
+        return field["type"] if field else None
+
+    def choices(self, name):
+        """The option names of a select field, in the table's order (empty for other fields)"""
+        field = self.fields.get(name) or {}
+        return [choice.get("name") for choice in field.get("options", {}).get("choices", [])]
+
+    def validate(self, fields):
+        """Return what Airtable would reject in a write of `fields` (an empty list when nothing)
+
+        Checks that each field exists and is not computed, that select values
+        are existing options (writes don't create options) and that text,
+        number and checkbox values have the right type. Empty values, which
+        clear a cell, are always accepted.
+        """
+        problems = []
+        for name, value in fields.items():
+            field_type = self.field_type(name)
+            if field_type is None:
+                problems.append(f"unknown field '{name}'")
+            elif field_type in COMPUTED_TYPES:
+                problems.append(f"'{name}' is a computed {field_type} field")
+            elif value is None:
+                continue
+            elif field_type == "singleSelect":
+                problem = self._check_choices(name, [value] if isinstance(value, str) else None)
+                if problem:
+                    problems.append(problem)
+            elif field_type == "multipleSelects":
+                problem = self._check_choices(name, value if isinstance(value, list) and all(isinstance(item, str) for item in value) else None)
+                if problem:
+                    problems.append(problem)
+            elif field_type in TEXT_TYPES and not isinstance(value, str):
+                problems.append(f"'{name}' is a {field_type} field; got {value!r}")
+            elif field_type in NUMBER_TYPES and (isinstance(value, bool) or not isinstance(value, (int, float))):
+                problems.append(f"'{name}' is a {field_type} field; got {value!r}")
+            elif field_type == "checkbox" and not isinstance(value, bool):
+                problems.append(f"'{name}' is a checkbox field; got {value!r}")
+        return problems
+
+    def _check_choices(self, name, values):
+        if values is None:
+            expected = "an option name" if self.field_type(name) == "singleSelect" else "a list of option names"
+            return f"'{name}' is a {self.field_type(name)} field and takes {expected}"
+        choices = set(self.choices(name))
+        unknown = [value for value in values if value not in choices]
+        if unknown:
+            return f"{', '.join(repr(value) for value in unknown)} not among the options of '{name}' ({', '.join(self.choices(name))})"
+        return None
+
+class SchemaCache:
+    """Local copy of the meta API's table schemas, one entry per base
+
+    load() reads the base's schema from the cache file while it is younger
+    than `ttl_seconds`, and otherwise (or when asked to refresh) fetches it
+    from the meta API and saves it. If the fetch fails but an expired copy
+    is cached, that copy is used rather than none.
+    """
+
+    def __init__(self, path=DEFAULT_SCHEMA_PATH, ttl_seconds=24 * 3600):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.fetched_at = None
+
+    def read(self):
+        try:
+            with open(self.path) as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    def load(self, airtable, refresh=False):
+        """Return the tables of `airtable`'s base as {table name or ID: TableSchema}"""
+        cached = self.read().get(airtable.base_id)
+        if cached and not refresh and time.time() - cached.get("fetched_at", 0) <= self.ttl_seconds:
+            self.fetched_at = cached["fetched_at"]
+            return self._tables(cached)
+
+        response = airtable.get_schema()
+        if not response.ok:
+            if cached:
+                print(f"Error fetching schema ({response.status_code}); using the copy cached {self._age(cached['fetched_at'])} ago")
+                self.fetched_at = cached["fetched_at"]
+                return self._tables(cached)
+            raise RuntimeError(f"Error fetching schema: {response.status_code} {response.text}")
+
+        entry = {"fetched_at": time.time(), "tables": response.json().get("tables", [])}
+        # Reread the file so entries other bases saved in the meantime are kept
+        schemas = self.read()
+        schemas[airtable.base_id] = entry
+        write_atomically(self.path, json.dumps(schemas, indent=2) + "\n")
+        self.fetched_at = entry["fetched_at"]
+        return self._tables(entry)
+
+    def table(self, airtable, refresh=False):
+        """Return the TableSchema of `airtable`'s table"""
+        tables = self.load(airtable, refresh)
+        if airtable.table_name not in tables and not refresh:
+            # The table may have been created or renamed since the schema was cached
+            tables = self.load(airtable, refresh=True)
+        if airtable.table_name not in tables:
+            raise RuntimeError(f"Table '{airtable.table_name}' not found in base {airtable.base_id}")
+        return tables[airtable.table_name]
+
+    def _tables(self, entry):
+        tables = {}
+        for table in map(TableSchema, entry.get("tables", [])):
+            tables[table.name] = tables[table.id] = table
+        return tables
+
+    def _age(self, fetched_at):
+        hours = (time.time() - fetched_at) / 3600
+        return f"{hours:.1f} hours" if hours < 48 else f"{hours / 24:.0f} days"
+
+def region_option_problems(table, regions):
+    """Compare the Region field of `table` with the regions the scripts write; returns a list of messages"""
+    field_type = table.field_type("Region")
+    if field_type is None:
+        return [f"Table '{table.name}' has no Region field"]
+    if field_type not in ("singleSelect", "multipleSelects"):
+        return [f"Region is a {field_type} field, not a select field"]
+    choices = table.choices("Region")
+    problems = []
+    missing = [region for region in regions if region not in choices]
+    if missing:
+        problems.append(f"Region options missing from the table: {', '.join(missing)} (writes of these regions will be rejected)")
+    unused = [choice for choice in choices if choice not in regions]
+    if unused:
+        problems.append(f"Region options the scripts never write: {', '.join(unused)}")
+    return problems
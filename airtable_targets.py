@@ -0,0 +1,52 @@
+import os
+import json
+
+# Example targets file (a JSON list; "name", "token_env" and "airtable_rps" are optional):
+# [
+#   {"name": "national", "base_id": "appJLgVdJISZ38p3R", "table": "national-parks"},
+#   {"name": "state", "base_id": "appXXXXXXXXXXXXXX", "table": "state-parks", "token_env": "STATE_PARKS_TOKEN", "airtable_rps": 4}
+# ]
+
+def load_targets(path, default_token=None):
+    """Read the list of Airtable base/table targets from a JSON file
+
+    Each target is returned as a dict with "name", "base_id", "table",
+    "token" and "airtable_rps" (None unless set). A target's token is read
+    from the environment variable named by "token_env", falling back to
+    `default_token`. Raises ValueError when the file is malformed.
+    """
+    with open(path) as f:
+        entries = json.load(f)
+    if not isinstance(entries, list) or not entries:
+        raise ValueError(f"{path}: expected a non-empty JSON list of targets")
+
+    targets = []
+    names = set()
+    for number, entry in enumerate(entries, 1):
+        if not isinstance(entry, dict) or not entry.get("base_id") or not entry.get("table"):
+            raise ValueError(f"{path}: target {number} needs a base_id and a table")
+
+        name = entry.get("name") or f"{entry['base_id']}/{entry['table']}"
+        if name in names:
+            raise ValueError(f"{path}: more than one target is named '{name}'")
+        names.add(name)
+
+        token = os.getenv(entry["token_env"]) if entry.get("token_env") else None
+        if entry.get("token_env") and not token:
+            raise ValueError(f"{path}: target '{name}' reads its token from {entry['token_env']}, which is not set")
+
+        targets.append({
+            "name": name,
+            "base_id": entry["base_id"],
+            "table": entry["table"],
+            "token": token or default_token,
+            "airtable_rps": entry.get("airtable_rps"),
+        })
+    return targets
+
+def print_targets_table(columns, rows):
+    """Print a per-target table: the first column left-aligned, the rest right-aligned"""
+    rows = [columns] + [[str(value) for value in row] for row in rows]
+    widths = [max(len(row[index]) for row in rows) for index in range(len(columns))]
+    for row in rows:
+        print("  ".join(value.ljust(width) if index == 0 else value.rjust(width) for index, (value, width) in enumerate(zip(row, widths))))
@@ -0,0 +1,101 @@
+import os
+import re
+import sys
+import time
+import shlex
+import argparse
+import threading
+import subprocess
+
+from mock_servers import MockAirtable, MockOpenAI, make_parks
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def parse_schedule(text):
+    """Parse "20 6@4 15@10" into [(0, 20), (4, 6), (10, 15)]: requests/second from each second of the run"""
+    schedule = []
+    for part in text.split():
+        capacity, _, start = part.partition("@")
+        schedule.append((float(start or 0), float(capacity)))
+    return sorted(schedule)
+
+def follow_schedule(mock, schedule, done):
+    """Change the mock's capacity at the scheduled times until `done` is set"""
+    started = time.monotonic()
+    for start, capacity in schedule:
+        if done.wait(max(0.0, start - (time.monotonic() - started))):
+            return
+        mock.capacity = capacity
+
+def run_case(adaptive, args):
+    airtable = MockAirtable(
+        make_parks(args.parks, seed=args.seed, assigned_fraction=0.0),
+        latency=args.airtable_latency_ms / 1000, retry_after=args.retry_after, seed=args.seed
+    ).start()
+    openai_mock = MockOpenAI(latency=args.openai_latency_ms / 1000, retry_after=args.retry_after, seed=args.seed).start()
+    env = dict(
+        os.environ,
+        AIRTABLE_TOKEN="bench",
+        AIRTABLE_BASE_ID=airtable.base_id,
+        AIRTABLE_TABLE_NAME=airtable.table_name,
+        AIRTABLE_ENDPOINT_URL=airtable.url,
+        OPENAI_BASE_URL=f"{openai_mock.url}/v1",
+        OPENAI_API_KEY="bench",
+    )
+    command = [
+        sys.executable, "update_regions.py", "--no-cache", "--no-journal", "--force",
+        "--airtable-rps", str(args.airtable_rps), "--openai-rpm", str(args.openai_rpm), "--openai-tpm", "1000000000",
+    ] + ([] if adaptive else ["--no-adaptive"]) + shlex.split(args.update_args)
+
+    done = threading.Event()
+    threads = [
+        threading.Thread(target=follow_schedule, args=(airtable, parse_schedule(args.airtable_capacity), done), daemon=True),
+        threading.Thread(target=follow_schedule, args=(openai_mock, parse_schedule(args.openai_capacity), done), daemon=True),
+    ]
+    for thread in threads:
+        thread.start()
+    started = time.perf_counter()
+    completed = subprocess.run(command, cwd=ROOT, env=env, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True, timeout=args.timeout)
+    seconds = time.perf_counter() - started
+    done.set()
+    airtable.stop()
+    openai_mock.stop()
+
+    lines = completed.stdout.splitlines()
+    if completed.returncode != 0:
+        print("\n".join(lines[-20:]))
+    return {
+        "mode": "adaptive" if adaptive else "fixed",
+        "ok": completed.returncode == 0,
+        "seconds": round(seconds, 1),
+        "airtable_calls": sum(count for name, count in airtable.calls.items() if name.startswith("airtable_")),
+        "airtable_429s": airtable.calls["throttled"],
+        "openai_calls": openai_mock.calls["openai_chat"],
+        "openai_429s": openai_mock.calls["throttled"],
+        # The progress bar shares the output, so messages may not start a line
+        "cuts": len(re.findall(r"Rate limit \S+ lowered", completed.stdout)),
+        "final": next((line.split("Rate limits at the end: ", 1)[1] for line in lines if "Rate limits at the end: " in line), "-"),
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare adaptive and fixed rate limits against mock APIs whose capacity changes during the run")
+    parser.add_argument("--parks", type=int, default=1000, help="Synthetic table size (default: 1000)")
+    parser.add_argument("--airtable-rps", type=float, default=20, help="Airtable limit given to update_regions.py (default: 20)")
+    parser.add_argument("--openai-rpm", type=float, default=600, help="OpenAI request limit given to update_regions.py (default: 600)")
+    parser.add_argument("--airtable-capacity", type=str, default="20 6@3 15@10", help="Airtable capacity schedule, requests/second[@from second] (default: \"20 6@3 15@10\")")
+    parser.add_argument("--openai-capacity", type=str, default="30 8@6", help="OpenAI capacity schedule, as --airtable-capacity (default: \"30 8@6\")")
+    parser.add_argument("--airtable-latency-ms", type=float, default=20, help="Latency added to every Airtable response (default: 20)")
+    parser.add_argument("--openai-latency-ms", type=float, default=100, help="Latency added to every OpenAI response (default: 100)")
+    parser.add_argument("--retry-after", type=int, default=1, help="Retry-After seconds sent with 429s (default: 1; Airtable's real penalty is 30)")
+    parser.add_argument("--update-args", type=str, default="--async --batch-size 1", help="Extra arguments for update_regions.py (default: \"--async --batch-size 1\", one PATCH per park)")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the synthetic table (default: 0)")
+    parser.add_argument("--timeout", type=float, default=1800, help="Seconds before a run is abandoned (default: 1800)")
+    args = parser.parse_args()
+
+    results = [run_case(adaptive, args) for adaptive in (False, True)]
+    columns = ["mode", "ok", "seconds", "airtable_calls", "airtable_429s", "openai_calls", "openai_429s", "cuts", "final"]
+    rows = [columns] + [[str(result[column]) for column in columns] for result in results]
+    widths = [max(len(row[index]) for row in rows) for index in range(len(columns))]
+    print()
+    for row in rows:
+        print("  ".join(value.rjust(width) for value, width in zip(row, widths)))
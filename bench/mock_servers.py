@@ -0,0 +1,536 @@
+import os
+import re
+import sys
+import hmac
+import json
+import time
+import base64
+import random
+import hashlib
+import threading
+import urllib.request
+from collections import Counter, deque
+from datetime import datetime, timezone
+from urllib.parse import urlparse, parse_qs
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from region_rules import REGION_MAPPING, REGIONS
+from openai_batch_standin import answer_from_states
+
+# Local stand-ins for the Airtable REST/meta API and the OpenAI chat endpoint,
+# used by run_bench.py. Both add a configurable latency to every response,
+# can inject 429s or enforce a capacity in requests per second, and count
+# the calls they receive.
+
+# A point inside each of a few states, used for parks that only have coordinates
+STATE_POINTS = {
+    "Utah": (39.3, -111.7), "Texas": (31.0, -99.0), "Ohio": (40.3, -82.8), "Maine": (45.3, -69.2),
+    "Colorado": (39.0, -105.5), "Georgia": (32.7, -83.4), "Kansas": (38.5, -98.4), "Oregon": (43.9, -120.6),
+    "New York": (42.9, -75.5), "Alaska": (64.0, -150.0),
+}
+
+WORDS = "canyon river forest ridge valley lake summit trail meadow glacier desert coast island prairie cave".split()
+
+def make_parks(count, seed=0, assigned_fraction=0.1):
+    """Build a synthetic parks table mixing every classification path
+
+    Most parks list states from one region (settled by the rule engine); the
+    rest span regions, name unknown states, or only have coordinates, so they
+    go to the geo resolver or the AI model.
+    """
+    rng = random.Random(seed)
+    states_by_region = {region: states for region, states in REGION_MAPPING.items()}
+    parks = []
+    for index in range(count):
+        fields = {"Name": f"Synthetic Park {index}"}
+        region = rng.choice(REGIONS)
+        kind = rng.random()
+        if kind < 0.75:
+            fields["States (Multi)"] = rng.sample(states_by_region[region], rng.choice([1, 1, 1, 2]))
+        elif kind < 0.85:
+            other = rng.choice([r for r in REGIONS if r != region])
+            fields["States"] = f"{rng.choice(states_by_region[region])}, {rng.choice(states_by_region[other])}"
+        elif kind < 0.92:
+            state = rng.choice(list(STATE_POINTS))
+            fields["Latitude"], fields["Longitude"] = STATE_POINTS[state]
+            region = next(r for r, states in REGION_MAPPING.items() if state in states)
+        else:
+            fields["States"] = f"{rng.choice(states_by_region[region])}, Atlantis"
+        fields["Description"] = " ".join(rng.choice(WORDS) for _ in range(rng.randint(20, 400)))
+        if rng.random() < assigned_fraction:
+            fields["Region"] = [region]
+        parks.append({"id": f"rec{index:014d}", "createdTime": "2024-01-01T00:00:00.000Z", "fields": fields})
+    return parks
+
+def percentiles(values, points=(50, 95, 99)):
+    """Return {p: value} for the given percentiles of `values` (nearest rank)"""
+    if not values:
+        return {point: None for point in points}
+    ordered = sorted(values)
+    return {point: ordered[min(len(ordered) - 1, max(0, int(round(point / 100 * len(ordered))) - 1))] for point in points}
+
+class MockServer:
+    """Base of the mock servers: a threaded HTTP server with latency, 429 injection and call counts
+
+    With a `capacity`, requests beyond that many in the last second are
+    answered with a 429, as a real API enforcing its quota would. The
+    capacity may be changed while the server runs.
+    """
+
+    def __init__(self, latency=0.0, jitter=0.0, error_rate=0.0, retry_after=1, seed=0, capacity=None):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.retry_after = retry_after
+        self.capacity = capacity
+        self.recent = deque()
+        self.random = random.Random(seed)
+        self.calls = Counter()
+        self.lock = threading.Lock()
+        self.server = None
+
+    def start(self, host="127.0.0.1", port=0):
+        self.server = ThreadingHTTPServer((host, port), self.make_handler())
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def count(self, name):
+        with self.lock:
+            self.calls[name] += 1
+
+    def delay(self):
+        with self.lock:
+            extra = self.random.uniform(0, self.jitter) if self.jitter else 0.0
+            throttled = self.random.random() < self.error_rate or self.over_capacity()
+        time.sleep(self.latency + extra)
+        return throttled
+
+    def over_capacity(self):
+        """Count a request against the capacity; True when it exceeds it (call with the lock held)"""
+        if self.capacity is None:
+            return False
+        now = time.monotonic()
+        while self.recent and self.recent[0] <= now - 1.0:
+            self.recent.popleft()
+        if len(self.recent) >= self.capacity:
+            return True
+        self.recent.append(now)
+        return False
+
+    def quota_headers(self):
+        """Headers announcing the quota left, sent with every response (none by default)"""
+        return {}
+
+    def make_handler(self):
+        mock = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def send_json(self, status, payload, headers=None):
+                body = json.dumps(payload).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def read_json(self):
+                length = int(self.headers.get("Content-Length", 0))
+                return json.loads(self.rfile.read(length) or b"{}")
+
+            def handle_request(self, method):
+                # Read the body first so a throttled keep-alive connection stays usable
+                body = self.read_json() if method != "GET" else None
+                if mock.delay():
+                    mock.count("throttled")
+                    self.send_json(429, mock.rate_limit_body(), {"Retry-After": str(int(mock.retry_after)), **mock.quota_headers()})
+                    return
+                status, payload = mock.route(method, urlparse(self.path), body)
+                self.send_json(status, payload, mock.quota_headers())
+
+            def do_GET(self):
+                self.handle_request("GET")
+
+            def do_POST(self):
+                self.handle_request("POST")
+
+            def do_PATCH(self):
+                self.handle_request("PATCH")
+
+            def do_DELETE(self):
+                self.handle_request("DELETE")
+
+        return Handler
+
+    def rate_limit_body(self):
+        return {"error": {"type": "rate_limit", "message": "Rate limit exceeded"}}
+
+    def route(self, method, url, body):
+        raise NotImplementedError
+
+class MockAirtable(MockServer):
+    """In-memory Airtable base with one table, speaking enough of the REST and meta API for the scripts
+
+    Supports pagination (pageSize, offset, maxRecords), fields[] projection,
+    the filterByFormula expressions the scripts generate, single and batched
+    PATCH, and the table schema. The time each record is listed and next
+    written is kept to measure per-park latency.
+
+    Webhooks can be created, listed, refreshed and deleted. Changes to the
+    fields a webhook watches, whether made through the API or with edit()
+    and add() (standing in for someone editing the base), are queued as
+    payloads and announced by a signed ping to its notification URL.
+    """
+
+    def __init__(self, parks, base_id="appBench", table_name="national-parks", **kwargs):
+        super().__init__(**kwargs)
+        self.base_id = base_id
+        self.table_name = table_name
+        self.records = {park["id"]: park for park in parks}
+        self.order = [park["id"] for park in parks]
+        self.modified = {record_id: 0.0 for record_id in self.order}
+        self.listed_at = {}
+        self.park_latencies = []
+        self.webhooks = {}
+        self.transaction = 0
+
+    def rate_limit_body(self):
+        return {"errors": [{"error": "RATE_LIMIT_REACHED", "message": "Rate limit exceeded. Please try again later"}]}
+
+    def schema(self):
+        return {"tables": [{
+            "id": "tblBench",
+            "name": self.table_name,
+            "primaryFieldId": "fldName",
+            "fields": [
+                {"id": "fldName", "name": "Name", "type": "singleLineText"},
+                {"id": "fldStates", "name": "States", "type": "singleLineText"},
+                {"id": "fldStatesMulti", "name": "States (Multi)", "type": "multipleSelects",
+                 "options": {"choices": [{"name": state} for states in REGION_MAPPING.values() for state in states]}},
+                {"id": "fldLat", "name": "Latitude", "type": "number"},
+                {"id": "fldLon", "name": "Longitude", "type": "number"},
+                {"id": "fldDescription", "name": "Description", "type": "multilineText"},
+                {"id": "fldRegion", "name": "Region", "type": "multipleSelects",
+                 "options": {"choices": [{"name": region} for region in REGIONS]}},
+            ]
+        }]}
+
+    def field_ids(self):
+        return {field["name"]: field["id"] for field in self.schema()["tables"][0]["fields"]}
+
+    def route(self, method, url, body):
+        path = url.path.rstrip("/")
+        if path == f"/v0/meta/bases/{self.base_id}/tables" and method == "GET":
+            self.count("airtable_meta")
+            return 200, self.schema()
+        if path.startswith(f"/v0/bases/{self.base_id}/webhooks"):
+            return self.route_webhooks(method, path[len(f"/v0/bases/{self.base_id}/webhooks"):], parse_qs(url.query), body)
+
+        table_path = f"/v0/{self.base_id}/{self.table_name}"
+        if path == table_path and method == "GET":
+            self.count("airtable_list")
+            return self.list_records(parse_qs(url.query))
+        if path == table_path and method == "PATCH":
+            self.count("airtable_patch")
+            records = body.get("records", [])
+            if len(records) > 10:
+                return 422, {"error": {"type": "INVALID_RECORDS", "message": "At most 10 records per request"}}
+            return self.update([(record.get("id"), record.get("fields", {})) for record in records])
+        if path.startswith(table_path + "/"):
+            record_id = path[len(table_path) + 1:]
+            if method == "GET":
+                self.count("airtable_get")
+                record = self.records.get(record_id)
+                return (200, record) if record else (404, {"error": "NOT_FOUND"})
+            if method == "PATCH":
+                self.count("airtable_patch")
+                status, payload = self.update([(record_id, body.get("fields", {}))])
+                return status, payload["records"][0] if status == 200 else payload
+        return 404, {"error": "NOT_FOUND"}
+
+    def list_records(self, query):
+        page_size = min(int(query.get("pageSize", ["100"])[0]), 100)
+        max_records = int(query.get("maxRecords", ["0"])[0]) or None
+        # Offsets are "<position>:<records matched so far>", so maxRecords holds across pages
+        position, matched = (int(part) for part in query.get("offset", ["0:0"])[0].split(":"))
+        fields = query.get("fields[]")
+        try:
+            matches = compile_formula(query.get("filterByFormula", [""])[0], self.modified)
+        except ValueError as e:
+            return 422, {"error": {"type": "INVALID_FILTER_BY_FORMULA", "message": str(e)}}
+
+        page = []
+        now = time.monotonic()
+        while position < len(self.order) and len(page) < page_size and not (max_records and matched >= max_records):
+            record = self.records[self.order[position]]
+            position += 1
+            if not matches(record):
+                continue
+            matched += 1
+            page.append(record if not fields else dict(record, fields={name: value for name, value in record["fields"].items() if name in fields}))
+            with self.lock:
+                self.listed_at.setdefault(record["id"], now)
+
+        payload = {"records": page}
+        if position < len(self.order) and not (max_records and matched >= max_records):
+            payload["offset"] = f"{position}:{matched}"
+        return 200, payload
+
+    def update(self, updates):
+        valid = set(REGIONS)
+        for record_id, fields in updates:
+            if record_id not in self.records:
+                return 404, {"error": "NOT_FOUND"}
+            region = fields.get("Region")
+            if region is not None and (not isinstance(region, list) or not set(region) <= valid):
+                return 422, {"error": {"type": "INVALID_MULTIPLE_CHOICE_OPTIONS", "message": f"Insufficient permissions to create new select option {region}"}}
+
+        now = time.monotonic()
+        updated = []
+        with self.lock:
+            for record_id, fields in updates:
+                record = self.records[record_id]
+                previous = {name: record["fields"].get(name) for name in fields}
+                record["fields"].update(fields)
+                self.modified[record_id] = time.time()
+                if record_id in self.listed_at:
+                    self.park_latencies.append(now - self.listed_at.pop(record_id))
+                self.record_change(record_id, previous, fields, "publicApi")
+                updated.append(record)
+        return 200, {"records": updated}
+
+    def edit(self, record_id, fields):
+        """Change a record as someone editing the base would, without going through the API"""
+        with self.lock:
+            record = self.records[record_id]
+            previous = {name: record["fields"].get(name) for name in fields}
+            record["fields"].update(fields)
+            self.modified[record_id] = time.time()
+            self.record_change(record_id, previous, fields, "client")
+
+    def add(self, record):
+        """Add a record as someone editing the base would"""
+        with self.lock:
+            self.records[record["id"]] = record
+            self.order.append(record["id"])
+            self.modified[record["id"]] = time.time()
+            self.record_change(record["id"], None, record["fields"], "client")
+
+    def route_webhooks(self, method, path, query, body):
+        if not path and method == "POST":
+            self.count("airtable_webhook_create")
+            webhook_id = f"ach{len(self.webhooks) + 1:014d}"
+            secret = base64.b64encode(os.urandom(32)).decode("ascii")
+            with self.lock:
+                self.webhooks[webhook_id] = {
+                    "id": webhook_id, "specification": body.get("specification", {}), "notificationUrl": body.get("notificationUrl"),
+                    "macSecretBase64": secret, "payloads": [], "expires": time.time() + 7 * 86400,
+                }
+            return 200, {"id": webhook_id, "macSecretBase64": secret, "expirationTime": self.expiration(webhook_id)}
+        if not path and method == "GET":
+            self.count("airtable_webhook_list")
+            return 200, {"webhooks": [{
+                "id": webhook["id"], "specification": webhook["specification"], "notificationUrl": webhook["notificationUrl"],
+                "cursorForNextPayload": len(webhook["payloads"]) + 1, "isHookEnabled": True, "expirationTime": self.expiration(webhook["id"]),
+            } for webhook in self.webhooks.values()]}
+
+        webhook_id, _, action = path.strip("/").partition("/")
+        webhook = self.webhooks.get(webhook_id)
+        if not webhook:
+            return 404, {"error": "NOT_FOUND"}
+        if action == "payloads" and method == "GET":
+            self.count("airtable_webhook_payloads")
+            cursor = max(1, int(query.get("cursor", ["1"])[0]))
+            with self.lock:
+                payloads = webhook["payloads"][cursor - 1:cursor - 1 + 50]
+                might_have_more = len(webhook["payloads"]) > cursor - 1 + len(payloads)
+            return 200, {"payloads": payloads, "cursor": cursor + len(payloads), "mightHaveMore": might_have_more}
+        if action == "refresh" and method == "POST":
+            self.count("airtable_webhook_refresh")
+            webhook["expires"] = time.time() + 7 * 86400
+            return 200, {"expirationTime": self.expiration(webhook_id)}
+        if not action and method == "DELETE":
+            self.count("airtable_webhook_delete")
+            with self.lock:
+                del self.webhooks[webhook_id]
+            return 200, {}
+        return 404, {"error": "NOT_FOUND"}
+
+    def expiration(self, webhook_id):
+        return datetime.fromtimestamp(self.webhooks[webhook_id]["expires"], timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.000Z")
+
+    def record_change(self, record_id, previous, fields, source):
+        """Queue a webhook payload for a created (`previous` None) or changed record; call with the lock held"""
+        ids = self.field_ids()
+        for webhook in self.webhooks.values():
+            watched = webhook["specification"].get("options", {}).get("filters", {}).get("watchDataInFieldIds")
+            changed = {
+                ids[name]: value for name, value in fields.items()
+                if name in ids and (previous is None or previous.get(name) != value) and (not watched or ids[name] in watched)
+            }
+            if not changed and previous is not None:
+                continue
+            self.transaction += 1
+            if previous is None:
+                table_changes = {"createdRecordsById": {record_id: {"createdTime": self.records[record_id].get("createdTime"), "cellValuesByFieldId": changed}}}
+            else:
+                before = {ids[name]: value for name, value in previous.items() if name in ids and ids[name] in changed}
+                table_changes = {"changedRecordsById": {record_id: {"current": {"cellValuesByFieldId": changed}, "previous": {"cellValuesByFieldId": before}}}}
+            webhook["payloads"].append({
+                "timestamp": datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.000Z"),
+                "baseTransactionNumber": self.transaction,
+                "payloadFormat": "v0",
+                "actionMetadata": {"source": source, "sourceMetadata": {}},
+                "changedTablesById": {"tblBench": table_changes},
+            })
+            if webhook["notificationUrl"]:
+                threading.Thread(target=self.ping, args=(webhook,), daemon=True).start()
+
+    def ping(self, webhook):
+        """Tell a webhook's notification URL that payloads are waiting, signed like Airtable signs it"""
+        body = json.dumps({"base": {"id": self.base_id}, "webhook": {"id": webhook["id"]}, "timestamp": datetime.now(timezone.utc).isoformat()}).encode("utf-8")
+        mac = hmac.new(base64.b64decode(webhook["macSecretBase64"]), body, hashlib.sha256).hexdigest()
+        request = urllib.request.Request(webhook["notificationUrl"], data=body, method="POST", headers={
+            "Content-Type": "application/json", "X-Airtable-Content-MAC": f"hmac-sha256={mac}",
+        })
+        try:
+            urllib.request.urlopen(request, timeout=5).close()
+            self.count("webhook_pings")
+        except OSError:
+            self.count("webhook_ping_errors")
+
+def split_arguments(text):
+    """Split a formula's argument list on top-level commas"""
+    arguments, depth, quote, current = [], 0, None, ""
+    for char in text:
+        if quote:
+            current += char
+            if char == quote and not current.endswith("\\" + quote):
+                quote = None
+            continue
+        if char in "\"'":
+            quote = char
+        elif char == "(":
+            depth += 1
+        elif char == ")":
+            depth -= 1
+        elif char == "," and depth == 0:
+            arguments.append(current.strip())
+            current = ""
+            continue
+        current += char
+    if current.strip():
+        arguments.append(current.strip())
+    return arguments
+
+def compile_formula(formula, modified):
+    """Turn a filterByFormula generated by the scripts into a record predicate
+
+    Only the shapes the scripts use are understood: AND(...), OR(...), NOT(...),
+    {Field}=BLANK(), RECORD_ID()='rec...', FIND(LOWER("text"), LOWER({Field}))
+    and the mirror's IS_AFTER(LAST_MODIFIED_TIME(), DATETIME_PARSE('...')). Anything else is
+    rejected like Airtable rejects an invalid formula.
+    """
+    formula = formula.strip()
+    if not formula:
+        return lambda record: True
+
+    match = re.fullmatch(r"AND\((.*)\)", formula, re.DOTALL)
+    if match:
+        parts = [compile_formula(part, modified) for part in split_arguments(match.group(1))]
+        return lambda record: all(part(record) for part in parts)
+
+    match = re.fullmatch(r"OR\((.*)\)", formula, re.DOTALL)
+    if match:
+        parts = [compile_formula(part, modified) for part in split_arguments(match.group(1))]
+        return lambda record: any(part(record) for part in parts)
+
+    match = re.fullmatch(r"NOT\((.*)\)", formula, re.DOTALL)
+    if match:
+        part = compile_formula(match.group(1), modified)
+        return lambda record: not part(record)
+
+    match = re.fullmatch(r"RECORD_ID\(\)\s*=\s*'(rec\w+)'", formula)
+    if match:
+        record_id = match.group(1)
+        return lambda record: record["id"] == record_id
+
+    match = re.fullmatch(r"\{([^}]+)\}\s*=\s*BLANK\(\)", formula)
+    if match:
+        field = match.group(1)
+        return lambda record: not record["fields"].get(field)
+
+    match = re.fullmatch(r'FIND\(LOWER\("((?:[^"\\]|\\.)*)"\),\s*LOWER\(\{([^}]+)\}\)\)', formula)
+    if match:
+        needle = re.sub(r"\\(.)", r"\1", match.group(1)).lower()
+        field = match.group(2)
+        return lambda record: needle in str(record["fields"].get(field, "")).lower()
+
+    match = re.fullmatch(r"IS_AFTER\(LAST_MODIFIED_TIME\(\),\s*DATETIME_PARSE\('([^']+)'\)\)", formula)
+    if match:
+        since = datetime.strptime(match.group(1), "%Y-%m-%dT%H:%M:%S.000Z").replace(tzinfo=timezone.utc).timestamp()
+        return lambda record: modified.get(record["id"], 0.0) > since
+
+    raise ValueError(f"Unsupported formula: {formula}")
+
+class MockOpenAI(MockServer):
+    """OpenAI chat completions endpoint that answers region prompts from the states they list
+
+    With a `capacity`, responses carry OpenAI's x-ratelimit-limit-requests
+    and x-ratelimit-remaining-requests headers, per minute like OpenAI's.
+    """
+
+    def quota_headers(self):
+        if self.capacity is None:
+            return {}
+        with self.lock:
+            used = len(self.recent)
+        return {
+            "x-ratelimit-limit-requests": str(int(self.capacity * 60)),
+            "x-ratelimit-remaining-requests": str(max(0, int((self.capacity - used) * 60))),
+        }
+
+    def route(self, method, url, body):
+        if method != "POST" or not url.path.rstrip("/").endswith("/chat/completions"):
+            return 404, {"error": {"message": f"Unknown path {url.path}", "type": "invalid_request_error"}}
+        self.count("openai_chat")
+
+        messages = body.get("messages", [])
+        if (body.get("response_format") or {}).get("type") == "json_object":
+            parks = [json.loads(line) for line in messages[-1]["content"].splitlines() if line.startswith("{")]
+            content = json.dumps({"classifications": [
+                {"record_id": park.get("record_id"), "region": answer_from_states([{"content": f"- States: {park.get('states', '')}"}])}
+                for park in parks
+            ]})
+        else:
+            content = answer_from_states(messages)
+
+        prompt_tokens = sum(len(message.get("content", "")) for message in messages) // 4
+        completion_tokens = max(1, len(content) // 4)
+        return 200, {
+            "id": f"chatcmpl-bench{self.calls['openai_chat']}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model"),
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens, "total_tokens": prompt_tokens + completion_tokens}
+        }
@@ -0,0 +1,191 @@
+import os
+import re
+import sys
+import json
+import time
+import uuid
+import argparse
+import threading
+from email.parser import BytesParser
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from region_rules import get_region_by_states
+
+# Local stand-in for the OpenAI Files and Batches endpoints used by `update_regions.py batch`.
+# Start it, then point the script at it:
+#   python bench/openai_batch_standin.py --port 8765
+#   python update_regions.py --openai-base-url http://127.0.0.1:8765/v1 --api-key test batch submit
+# Requests are answered from the states listed in each prompt, so no OpenAI account is needed.
+
+class BatchStandIn:
+    """In-memory files and batches, completed `delay` seconds after they are created"""
+
+    def __init__(self, delay=0.0, answer=None):
+        self.delay = delay
+        self.answer = answer or answer_from_states
+        self.files = {}
+        self.batches = {}
+        self.lock = threading.Lock()
+
+    def add_file(self, content, filename, purpose):
+        file_id = f"file-{uuid.uuid4().hex[:24]}"
+        with self.lock:
+            self.files[file_id] = {
+                "id": file_id,
+                "object": "file",
+                "bytes": len(content),
+                "created_at": int(time.time()),
+                "filename": filename,
+                "purpose": purpose,
+                "status": "processed",
+                "content": content
+            }
+        return self._public(self.files[file_id])
+
+    def create_batch(self, input_file_id, endpoint, completion_window, metadata=None):
+        if input_file_id not in self.files:
+            return None
+        batch_id = f"batch_{uuid.uuid4().hex[:24]}"
+        total = len([line for line in self.files[input_file_id]["content"].splitlines() if line.strip()])
+        with self.lock:
+            self.batches[batch_id] = {
+                "id": batch_id,
+                "object": "batch",
+                "endpoint": endpoint,
+                "input_file_id": input_file_id,
+                "completion_window": completion_window,
+                "status": "in_progress",
+                "output_file_id": None,
+                "error_file_id": None,
+                "created_at": int(time.time()),
+                "request_counts": {"total": total, "completed": 0, "failed": 0},
+                "metadata": metadata,
+                "ready_at": time.monotonic() + self.delay
+            }
+        return self.get_batch(batch_id)
+
+    def get_batch(self, batch_id):
+        batch = self.batches.get(batch_id)
+        if not batch:
+            return None
+        if batch["status"] == "in_progress" and time.monotonic() >= batch["ready_at"]:
+            self._complete(batch)
+        return self._public(batch)
+
+    def _complete(self, batch):
+        outputs = []
+        for line in self.files[batch["input_file_id"]]["content"].decode("utf-8").splitlines():
+            if not line.strip():
+                continue
+            request = json.loads(line)
+            body = request.get("body", {})
+            content = self.answer(body.get("messages", []))
+            prompt_tokens = sum(len(message.get("content", "")) for message in body.get("messages", [])) // 4
+            outputs.append(json.dumps({
+                "id": f"batch_req_{uuid.uuid4().hex[:24]}",
+                "custom_id": request.get("custom_id"),
+                "response": {
+                    "status_code": 200,
+                    "request_id": uuid.uuid4().hex,
+                    "body": {
+                        "id": f"chatcmpl-{uuid.uuid4().hex[:24]}",
+                        "object": "chat.completion",
+                        "created": int(time.time()),
+                        "model": body.get("model"),
+                        "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+                        "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": 1, "total_tokens": prompt_tokens + 1}
+                    }
+                },
+                "error": None
+            }))
+
+        output = self.add_file(("\n".join(outputs) + "\n").encode("utf-8"), f"{batch['id']}_output.jsonl", "batch_output")
+        with self.lock:
+            batch["status"] = "completed"
+            batch["output_file_id"] = output["id"]
+            batch["completed_at"] = int(time.time())
+            batch["request_counts"]["completed"] = len(outputs)
+
+    def _public(self, item):
+        return {key: value for key, value in item.items() if key not in ("content", "ready_at")}
+
+def answer_from_states(messages):
+    """Answer a region prompt with the region of the states it lists"""
+    prompt = messages[-1]["content"] if messages else ""
+    match = re.search(r"^- States: (.*)$", prompt, re.MULTILINE)
+    states = [state.strip() for state in match.group(1).split(",")] if match else []
+    return get_region_by_states(states) or "Unknown"
+
+def make_handler(standin):
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def _send(self, status, payload=None, raw=None):
+            body = raw if raw is not None else json.dumps(payload).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/octet-stream" if raw is not None else "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _not_found(self):
+            self._send(404, {"error": {"message": f"Unknown path {self.path}", "type": "invalid_request_error"}})
+
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            if self.path.rstrip("/").endswith("/files"):
+                message = BytesParser().parsebytes(
+                    b"Content-Type: " + self.headers["Content-Type"].encode("latin-1") + b"\r\n\r\n" + body
+                )
+                fields = {part.get_param("name", header="content-disposition"): part for part in message.get_payload()}
+                upload = fields["file"]
+                purpose = fields["purpose"].get_payload(decode=True).decode("utf-8") if "purpose" in fields else "batch"
+                self._send(200, standin.add_file(upload.get_payload(decode=True), upload.get_filename() or "upload.jsonl", purpose))
+            elif self.path.rstrip("/").endswith("/batches"):
+                request = json.loads(body or b"{}")
+                batch = standin.create_batch(
+                    request.get("input_file_id"), request.get("endpoint"), request.get("completion_window"), request.get("metadata")
+                )
+                if batch:
+                    self._send(200, batch)
+                else:
+                    self._send(400, {"error": {"message": "Unknown input_file_id", "type": "invalid_request_error"}})
+            else:
+                self._not_found()
+
+        def do_GET(self):
+            path = self.path.split("?")[0].rstrip("/")
+            match = re.search(r"/files/([^/]+)/content$", path)
+            if match and match.group(1) in standin.files:
+                self._send(200, raw=standin.files[match.group(1)]["content"])
+                return
+            match = re.search(r"/batches/([^/]+)$", path)
+            batch = standin.get_batch(match.group(1)) if match else None
+            if batch:
+                self._send(200, batch)
+            else:
+                self._not_found()
+
+    return Handler
+
+def serve(port=8765, delay=0.0, host="127.0.0.1"):
+    """Start the stand-in on a background thread and return the server"""
+    server = ThreadingHTTPServer((host, port), make_handler(BatchStandIn(delay)))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local stand-in for the OpenAI Batch API")
+    parser.add_argument("--port", type=int, default=8765, help="Port to listen on (default: 8765)")
+    parser.add_argument("--delay", type=float, default=0.0, help="Seconds before a submitted batch completes (default: 0)")
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer(("127.0.0.1", args.port), make_handler(BatchStandIn(args.delay)))
+    print(f"OpenAI Batch API stand-in listening on http://127.0.0.1:{args.port}/v1")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,81 @@
+import os
+import sys
+import json
+import time
+import argparse
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import park_record
+from mock_servers import make_parks
+from park_record import configure_description_limit
+
+PAGE_SIZE = 100
+
+def make_pages(count, description_words):
+    """Encode synthetic parks as Airtable list pages of 100 records"""
+    parks = make_parks(count, seed=1)
+    if description_words:
+        for park in parks:
+            words = park["fields"]["Description"].split()
+            park["fields"]["Description"] = " ".join(words[index % len(words)] for index in range(description_words))
+    return [json.dumps({"records": parks[start:start + PAGE_SIZE]}).encode() for start in range(0, count, PAGE_SIZE)]
+
+def raw_records(pages):
+    """What fetch_parks used to keep: every record as the decoded dict"""
+    records = []
+    for page in pages:
+        records.extend(json.loads(page)["records"])
+    return records
+
+def park_records(pages):
+    parks = []
+    for page in pages:
+        parks.extend(park_record.parse_page(page)[0])
+    return parks
+
+def measure_memory(build, pages):
+    """Bytes still allocated once `build` has returned, i.e. held by the records it built"""
+    tracemalloc.start()
+    records = build(pages)
+    held, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return held, len(records)
+
+def time_decode(decode, pages, repeat):
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for page in pages:
+            decode(page)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure the memory held per park and the page decoding time, raw dicts vs ParkRecord")
+    parser.add_argument("--parks", type=int, default=20000, help="Synthetic table size (default: 20000)")
+    parser.add_argument("--description-words", type=int, default=0, help="Make every description this many words long (default: 20-400 words, as the other benchmarks)")
+    parser.add_argument("--park-tokens", type=int, default=160, help="Prompt budget per park, which sets the description length kept (default: 160)")
+    parser.add_argument("--repeat", type=int, default=5, help="Decoding runs per parser; the fastest is reported (default: 5)")
+    args = parser.parse_args()
+
+    configure_description_limit(args.park_tokens)
+    pages = make_pages(args.parks, args.description_words)
+    print(f"{args.parks} parks in {len(pages)} pages ({sum(map(len, pages)) / 1024 / 1024:.1f} MiB of JSON)")
+
+    raw_bytes, count = measure_memory(raw_records, pages)
+    slot_bytes, _ = measure_memory(park_records, pages)
+    print(f"Raw dicts:   {raw_bytes / count:8.0f} bytes per park ({raw_bytes / 1024 / 1024:.1f} MiB)")
+    print(f"ParkRecord:  {slot_bytes / count:8.0f} bytes per park ({slot_bytes / 1024 / 1024:.1f} MiB)")
+
+    json_seconds = time_decode(json.loads, pages, args.repeat)
+    print(f"json.loads:   {json_seconds * 1000:7.1f} ms for all pages")
+    if park_record.orjson:
+        orjson_seconds = time_decode(park_record.orjson.loads, pages, args.repeat)
+        print(f"orjson.loads: {orjson_seconds * 1000:7.1f} ms for all pages ({json_seconds / orjson_seconds:.1f}x)")
+    else:
+        print("orjson is not installed; pages are decoded with json (pip install orjson)")
+    parse_seconds = time_decode(park_record.parse_page, pages, args.repeat)
+    print(f"parse_page:   {parse_seconds * 1000:7.1f} ms for all pages (decoding and building the ParkRecords)")
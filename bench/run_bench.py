@@ -0,0 +1,130 @@
+import os
+import sys
+import json
+import time
+import shlex
+import argparse
+import subprocess
+
+from mock_servers import MockAirtable, MockOpenAI, make_parks, percentiles
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Scripts under benchmark, with the arguments that lift their own rate limits
+# so the numbers reflect the code rather than the configured request budgets
+SCRIPTS = {
+    "update": ["update_regions.py", "--api-key", "bench", "--no-cache", "--airtable-rps", "100000", "--openai-rpm", "10000000", "--openai-tpm", "1000000000", "--no-adaptive"],
+    "count": ["count_regions.py"],
+}
+
+def run_case(script, size, args):
+    """Run one script against fresh mock servers holding `size` synthetic parks"""
+    airtable = MockAirtable(
+        make_parks(size, seed=args.seed, assigned_fraction=args.assigned_fraction),
+        latency=args.airtable_latency_ms / 1000, jitter=args.jitter_ms / 1000,
+        error_rate=args.airtable_429_rate, retry_after=args.retry_after, seed=args.seed
+    ).start()
+    openai_mock = MockOpenAI(
+        latency=args.openai_latency_ms / 1000, jitter=args.jitter_ms / 1000,
+        error_rate=args.openai_429_rate, retry_after=args.retry_after, seed=args.seed
+    ).start()
+
+    env = dict(
+        os.environ,
+        AIRTABLE_TOKEN="bench",
+        AIRTABLE_BASE_ID=airtable.base_id,
+        AIRTABLE_TABLE_NAME=airtable.table_name,
+        AIRTABLE_ENDPOINT_URL=airtable.url,
+        OPENAI_BASE_URL=f"{openai_mock.url}/v1",
+        OPENAI_API_KEY="bench",
+    )
+    command = [sys.executable] + SCRIPTS[script] + shlex.split(getattr(args, f"{script}_args") or "")
+
+    started = time.perf_counter()
+    try:
+        completed = subprocess.run(command, cwd=ROOT, env=env, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True, timeout=args.timeout)
+        returncode, output = completed.returncode, completed.stdout
+    except subprocess.TimeoutExpired as e:
+        returncode, output = "timeout", e.stdout or ""
+    seconds = time.perf_counter() - started
+
+    airtable.stop()
+    openai_mock.stop()
+
+    if returncode != 0:
+        print(f"{script} with {size} parks failed ({returncode}):")
+        print("\n".join(str(output).splitlines()[-20:]))
+
+    latency = percentiles(airtable.park_latencies)
+    return {
+        "script": script,
+        "parks": size,
+        "ok": returncode == 0,
+        "seconds": round(seconds, 3),
+        "records_per_sec": round(size / seconds, 1) if seconds else None,
+        "parks_written": len(airtable.park_latencies),
+        "p50_ms": round(latency[50] * 1000, 1) if latency[50] is not None else None,
+        "p95_ms": round(latency[95] * 1000, 1) if latency[95] is not None else None,
+        "p99_ms": round(latency[99] * 1000, 1) if latency[99] is not None else None,
+        "airtable_calls": sum(count for name, count in airtable.calls.items() if name.startswith("airtable_")),
+        "airtable_throttled": airtable.calls["throttled"],
+        "openai_calls": openai_mock.calls["openai_chat"],
+        "openai_throttled": openai_mock.calls["throttled"],
+        "calls": {**airtable.calls, **openai_mock.calls},
+    }
+
+def format_value(value):
+    return "-" if value is None else str(value)
+
+def print_results(results, baseline=None):
+    columns = ["script", "parks", "ok", "seconds", "records_per_sec", "p50_ms", "p95_ms", "p99_ms", "airtable_calls", "openai_calls", "airtable_throttled", "openai_throttled"]
+    if baseline:
+        columns.append("vs_baseline")
+        previous = {(result["script"], result["parks"]): result for result in baseline}
+        for result in results:
+            before = previous.get((result["script"], result["parks"]))
+            if before and before.get("records_per_sec") and result["records_per_sec"]:
+                result["vs_baseline"] = f"{(result['records_per_sec'] / before['records_per_sec'] - 1) * 100:+.1f}%"
+
+    rows = [columns] + [[format_value(result.get(column)) for column in columns] for result in results]
+    widths = [max(len(row[index]) for row in rows) for index in range(len(columns))]
+    print()
+    for row in rows:
+        print("  ".join(value.rjust(width) for value, width in zip(row, widths)))
+    print("\nLatency percentiles are per park, from the page that listed it to the PATCH that wrote its region.")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the region scripts against local Airtable and OpenAI stand-ins")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 10000], help="Synthetic table sizes to run (default: 100 1000 10000; up to 100000)")
+    parser.add_argument("--scripts", nargs="+", choices=sorted(SCRIPTS), default=sorted(SCRIPTS, reverse=True), help="Scripts to benchmark (default: update count)")
+    parser.add_argument("--update-args", type=str, default="", help="Extra arguments for update_regions.py, e.g. \"--async --ai-batch-size 20\"")
+    parser.add_argument("--count-args", type=str, default="", help="Extra arguments for count_regions.py")
+    parser.add_argument("--airtable-latency-ms", type=float, default=20, help="Latency added to every Airtable response (default: 20)")
+    parser.add_argument("--openai-latency-ms", type=float, default=200, help="Latency added to every OpenAI response (default: 200)")
+    parser.add_argument("--jitter-ms", type=float, default=0, help="Random extra latency of up to this much per response (default: 0)")
+    parser.add_argument("--airtable-429-rate", type=float, default=0.0, help="Fraction of Airtable requests answered with a 429 (default: 0)")
+    parser.add_argument("--openai-429-rate", type=float, default=0.0, help="Fraction of OpenAI requests answered with a 429 (default: 0)")
+    parser.add_argument("--retry-after", type=int, default=1, help="Retry-After seconds sent with injected 429s (default: 1; Airtable's real penalty is 30)")
+    parser.add_argument("--assigned-fraction", type=float, default=0.1, help="Fraction of synthetic parks that already have a region (default: 0.1)")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the synthetic table and injected errors (default: 0)")
+    parser.add_argument("--timeout", type=float, default=3600, help="Seconds before a run is abandoned (default: 3600)")
+    parser.add_argument("--output", type=str, help="Write the results as JSON to this file")
+    parser.add_argument("--baseline", type=str, help="Compare records/sec with the JSON results of an earlier run")
+    args = parser.parse_args()
+
+    results = []
+    for script in args.scripts:
+        for size in args.sizes:
+            print(f"Running {script} with {size} parks...")
+            results.append(run_case(script, size, args))
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    print_results(results, baseline)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {args.output}")
@@ -0,0 +1,82 @@
+import os
+import sys
+import json
+import time
+import argparse
+import statistics
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Commands whose start-up is measured. `--help` exits right after the
+# arguments are parsed, so each run times the interpreter, the imports and
+# the module-level setup, without touching the network.
+COMMANDS = {
+    "cli": ["parks.py", "--help"],
+    "classify": ["parks.py", "classify", "--help"],
+    "report": ["parks.py", "report", "--help"],
+    "count": ["parks.py", "count", "--help"],
+    "schema": ["parks.py", "schema", "--help"],
+    "update_regions.py": ["update_regions.py", "--help"],
+    "count_regions.py": ["count_regions.py", "--help"],
+    # What every run paid when the scripts imported their clients up front
+    "eager-imports": ["-c", "import openai, pyairtable, requests, tqdm, dotenv"],
+}
+
+# Imports slow enough to be worth reporting when a command loads them
+HEAVY_MODULES = ["openai", "pyairtable", "tiktoken", "numpy", "tqdm", "requests"]
+
+def time_command(command, repeat):
+    """Run a command `repeat` times; return its wall times and the heavy modules it imported"""
+    env = dict(os.environ, OPENAI_API_KEY=os.getenv("OPENAI_API_KEY") or "startup-bench")
+    seconds = []
+    imported = []
+    for run in range(repeat):
+        started = time.perf_counter()
+        completed = subprocess.run(
+            [sys.executable, "-X", "importtime"] + command, cwd=ROOT, env=env,
+            stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True
+        )
+        seconds.append(time.perf_counter() - started)
+        if completed.returncode != 0:
+            print(f"{' '.join(command)} failed ({completed.returncode})")
+            print("\n".join(line for line in completed.stderr.splitlines() if not line.startswith("import time:"))[-2000:])
+            return None, []
+        if run == 0:
+            loaded = {line.rsplit("|", 1)[-1].strip() for line in completed.stderr.splitlines() if line.startswith("import time:")}
+            imported = [module for module in HEAVY_MODULES if module in loaded]
+    return seconds, imported
+
+def print_results(results):
+    columns = ["command", "min_ms", "median_ms", "heavy_imports"]
+    rows = [columns] + [[str(result.get(column) if result.get(column) is not None else "-") for column in columns] for result in results]
+    widths = [max(len(row[index]) for row in rows) for index in range(len(columns))]
+    print()
+    for row in rows:
+        print("  ".join(value.ljust(width) if index in (0, 3) else value.rjust(width) for index, (value, width) in enumerate(zip(row, widths))))
+    print("\nTimes include the Python interpreter start-up; -X importtime adds a little to each.")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure the start-up time of the region scripts and the parks.py subcommands")
+    parser.add_argument("--commands", nargs="+", choices=list(COMMANDS), default=list(COMMANDS), help="Commands to measure (default: all)")
+    parser.add_argument("--repeat", type=int, default=5, help="Runs per command (default: 5)")
+    parser.add_argument("--output", type=str, help="Write the results as JSON to this file")
+    args = parser.parse_args()
+
+    results = []
+    for name in args.commands:
+        print(f"Timing {name}...")
+        seconds, imported = time_command(COMMANDS[name], args.repeat)
+        results.append({
+            "command": name,
+            "ok": seconds is not None,
+            "min_ms": round(min(seconds) * 1000, 1) if seconds else None,
+            "median_ms": round(statistics.median(seconds) * 1000, 1) if seconds else None,
+            "heavy_imports": ",".join(imported) or "none",
+        })
+    print_results(results)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {args.output}")
@@ -0,0 +1,94 @@
+import os
+import sys
+import time
+import socket
+import argparse
+import tempfile
+import threading
+import subprocess
+
+from mock_servers import MockAirtable, MockOpenAI, make_parks, percentiles
+from region_rules import REGION_MAPPING
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def free_port():
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        return probe.getsockname()[1]
+
+def wait_for(predicate, timeout):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.02)
+    return False
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure how fast region_daemon.py reclassifies parks edited in a local Airtable stand-in")
+    parser.add_argument("--parks", type=int, default=1000, help="Synthetic table size (default: 1000)")
+    parser.add_argument("--edits", type=int, default=50, help="Parks moved to another state, one at a time (default: 50)")
+    parser.add_argument("--interval", type=float, default=0.2, help="Seconds between edits (default: 0.2)")
+    parser.add_argument("--airtable-latency-ms", type=float, default=20, help="Latency added to every Airtable response (default: 20)")
+    parser.add_argument("--openai-latency-ms", type=float, default=200, help="Latency added to every OpenAI response (default: 200)")
+    parser.add_argument("--daemon-args", type=str, default="", help="Extra arguments for region_daemon.py")
+    args = parser.parse_args()
+
+    airtable = MockAirtable(make_parks(args.parks, assigned_fraction=1.0), latency=args.airtable_latency_ms / 1000).start()
+    openai_mock = MockOpenAI(latency=args.openai_latency_ms / 1000).start()
+    workdir = tempfile.mkdtemp(prefix="webhook-bench-")
+    port = free_port()
+    env = dict(
+        os.environ,
+        AIRTABLE_TOKEN="bench",
+        AIRTABLE_BASE_ID=airtable.base_id,
+        AIRTABLE_TABLE_NAME=airtable.table_name,
+        AIRTABLE_ENDPOINT_URL=airtable.url,
+        OPENAI_BASE_URL=f"{openai_mock.url}/v1",
+        OPENAI_API_KEY="bench",
+    )
+    command = [
+        sys.executable, "region_daemon.py", "--listen", f"127.0.0.1:{port}", "--public-url", f"http://127.0.0.1:{port}/",
+        "--state-path", os.path.join(workdir, "webhook.json"), "--no-cache", "--debounce", "0.2",
+        "--airtable-rps", "100000", "--openai-rpm", "10000000", "--openai-tpm", "1000000000",
+    ] + args.daemon_args.split()
+    daemon = subprocess.Popen(command, cwd=ROOT, env=env, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+    output = []
+    threading.Thread(target=lambda: output.extend(daemon.stdout), daemon=True).start()
+
+    try:
+        if not wait_for(lambda: any("Watching" in line for line in output), 30):
+            print("The daemon did not start:")
+            print("".join(output))
+            sys.exit(1)
+
+        # Move parks to a state of another region; an edit to Name alone must not trigger anything
+        regions = list(REGION_MAPPING)
+        edited = {}
+        for index in range(args.edits):
+            record_id = airtable.order[index * 7 % len(airtable.order)]
+            current = airtable.records[record_id]["fields"]["Region"][0]
+            target = regions[(regions.index(current) + 1) % len(regions)]
+            airtable.edit(record_id, {"States (Multi)": [REGION_MAPPING[target][0]], "States": ""})
+            airtable.edit(airtable.order[-1 - index], {"Name": f"Renamed Park {index}"})
+            edited[record_id] = (target, time.time())
+            time.sleep(args.interval)
+
+        wait_for(lambda: all(airtable.records[record_id]["fields"]["Region"] == [target] for record_id, (target, _) in edited.items()), 60)
+        latencies = []
+        for record_id, (target, edited_at) in edited.items():
+            if airtable.records[record_id]["fields"]["Region"] == [target]:
+                latencies.append(airtable.modified[record_id] - edited_at)
+    finally:
+        daemon.terminate()
+        daemon.wait(10)
+        airtable.stop()
+        openai_mock.stop()
+
+    points = percentiles(latencies)
+    print(f"Reclassified {len(latencies)} of {len(edited)} edited parks in a table of {args.parks}")
+    print(f"Edit-to-write latency: p50 {points[50]:.2f}s, p95 {points[95]:.2f}s, p99 {points[99]:.2f}s")
+    print(f"Airtable calls: {sum(count for name, count in airtable.calls.items() if name.startswith('airtable_'))} ({dict(airtable.calls)})")
+    print(f"OpenAI calls: {openai_mock.calls['openai_chat']}")
+    print("A scheduled run would instead reread all parks, and a park would wait for the next run.")
@@ -1,7 +1,13 @@
 import os
+import sys
+import time
 import requests
 from dotenv import load_dotenv
 
+from airtable_client import AirtableClient
+from airtable_schema import SchemaCache, DEFAULT_SCHEMA_PATH, region_option_problems
+from region_rules import REGIONS
+
 # Load environment variables
 load_dotenv()
 
@@ -10,65 +16,56 @@ AIRTABLE_TOKEN = os.getenv("AIRTABLE_TOKEN") or "patWxqsOH8eCEVx7Y.2e2fa79f47ca8
 AIRTABLE_BASE_ID = os.getenv("AIRTABLE_BASE_ID") or "appJLgVdJISZ38p3R"
 AIRTABLE_TABLE_NAME = os.getenv("AIRTABLE_TABLE_NAME") or "national-parks"
 
-def check_field_metadata():
-    """Check if Region field exists and what type it is"""
-    url = f"https://api.airtable.com/v0/meta/bases/{AIRTABLE_BASE_ID}/tables"
+airtable = AirtableClient(AIRTABLE_TOKEN, AIRTABLE_BASE_ID, AIRTABLE_TABLE_NAME)
+
+def check_field_metadata(refresh=False, schema_path=DEFAULT_SCHEMA_PATH):
+    """Show the fields of the parks table and check its Region options against REGIONS
     
-    headers = {
-        "Authorization": f"Bearer {AIRTABLE_TOKEN}",
-        "Content-Type": "application/json"
-    }
+    The schema comes from the local cache (see airtable_schema.py) unless it
+    has expired or `refresh` is set; the table schema is returned.
+    """
+    cache = SchemaCache(schema_path)
+    try:
+        table = cache.table(airtable, refresh)
+    except (RuntimeError, requests.RequestException) as e:
+        print(f"Schema unavailable: {e}")
+        return None
     
-    response = requests.get(url, headers=headers)
+    fetched = time.strftime("%Y-%m-%d %H:%M", time.localtime(cache.fetched_at))
+    print(f"Found table: {table.name} (schema fetched {fetched}; refresh with --refresh)")
     
-    if not response.ok:
-        print(f"Error fetching schema: {response.status_code} {response.text}")
-        return
+    for name, field in table.fields.items():
+        print(f"Field: {name} - Type: {field['type']}")
     
-    data = response.json()
+    if table.field_type("Region"):
+        print("\nRegion field details:")
+        print(f"Type: {table.field_type('Region')}")
+        
+        # Select fields only accept their existing options
+        if table.choices("Region"):
+            print("Available options:")
+            for option in table.choices("Region"):
+                print(f"  - {option}")
+        
+        # Show any validation rules
+        if "validation" in table.fields["Region"]:
+            print("Validation rules:", table.fields["Region"]["validation"])
     
-    # Look for the national-parks table
-    for table in data.get("tables", []):
-        if table.get("name") == AIRTABLE_TABLE_NAME:
-            print(f"Found table: {table['name']}")
-            
-            # Look for Region field
-            for field in table.get("fields", []):
-                print(f"Field: {field['name']} - Type: {field['type']}")
-                
-                # If this is the Region field, show details
-                if field["name"] == "Region":
-                    print("\nRegion field details:")
-                    print(f"Type: {field['type']}")
-                    
-                    # If it's a single select field, show the options
-                    if field["type"] == "singleSelect":
-                        options = field.get("options", {}).get("choices", [])
-                        print("Available options:")
-                        for option in options:
-                            print(f"  - {option.get('name')}")
-                    
-                    # Show any validation rules
-                    if "validation" in field:
-                        print("Validation rules:", field["validation"])
+    problems = region_option_problems(table, REGIONS)
+    for problem in problems:
+        print(f"Warning: {problem}")
+    if not problems:
+        print(f"The Region options match the regions the scripts write ({', '.join(REGIONS)})")
+    return table
 
 def test_update_region(record_id, region_value):
     """Test updating a specific record with a region value"""
-    url = f"https://api.airtable.com/v0/{AIRTABLE_BASE_ID}/{AIRTABLE_TABLE_NAME}/{record_id}"
-    
-    headers = {
-        "Authorization": f"Bearer {AIRTABLE_TOKEN}",
-        "Content-Type": "application/json"
-    }
-    
-    data = {
-        "fields": {
-            "Region": region_value
-        }
-    }
-    
     print(f"Testing update for record {record_id} with region value: '{region_value}'")
-    response = requests.patch(url, headers=headers, json=data)
+    problems = SchemaCache().table(airtable).validate({"Region": region_value})
+    if problems:
+        print(f"Update not sent: {'; '.join(problems)}")
+        return
+    response = airtable.update_record(record_id, {"Region": region_value})
     
     if response.ok:
         print(f"Update successful!")
@@ -79,7 +76,7 @@ def test_update_region(record_id, region_value):
 
 if __name__ == "__main__":
     print("Checking Airtable schema...")
-    check_field_metadata()
+    check_field_metadata(refresh="--refresh" in sys.argv[1:])
     
     print("\n--------------------------------\n")
     
@@ -1,8 +1,19 @@
+import io
 import os
+import csv
 import sys
+import json
+import argparse
 from dotenv import load_dotenv
-from pyairtable import Api
 from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+from airtable_client import AirtableClient
+from airtable_mirror import ParksMirror, DEFAULT_MIRROR_PATH
+from airtable_targets import load_targets, print_targets_table
+from rate_limit import RateLimiter
+from park_record import ParkRecord
+from region_rules import REGIONS
 
 # Load environment variables
 load_dotenv()
@@ -20,88 +31,262 @@ if not all([AIRTABLE_TOKEN, AIRTABLE_BASE_ID, AIRTABLE_TABLE_NAME]):
     print(f"AIRTABLE_TABLE_NAME: {'Set' if AIRTABLE_TABLE_NAME else 'Missing'}")
     sys.exit(1)
 
-# Initialize Airtable API
-api = Api(AIRTABLE_TOKEN)
-table = api.table(AIRTABLE_BASE_ID, AIRTABLE_TABLE_NAME)
+def make_table(token, base_id, table_name):
+    """pyairtable Table for a base and table, honoring AIRTABLE_ENDPOINT_URL"""
+    from pyairtable import Api  # imported here so mirror counts don't pay for it
+    
+    if os.getenv('AIRTABLE_ENDPOINT_URL'):
+        api = Api(token, endpoint_url=os.getenv('AIRTABLE_ENDPOINT_URL'))
+    else:
+        api = Api(token)
+    return api.table(base_id, table_name)
+
+# Fields a count needs; Airtable leaves the rest (descriptions, coordinates) out of each page
+COUNT_FIELDS = ["Name", "Region", "States", "States (Multi)"]
 
-def count_parks_by_region():
-    """Count parks by region and print statistics."""
+# Unassigned parks are listed by name only when there are at most this many
+MAX_LISTED_UNASSIGNED = 20
+
+def iter_table(table, limiter=None, fields=None):
+    """Yield a table's records as ParkRecords page by page, taking a rate limiter token (if any) before each page"""
+    pages = table.iterate(page_size=100, **({"fields": fields} if fields else {}))
+    while True:
+        if limiter:
+            limiter.acquire()
+        page = next(pages, None)
+        if page is None:
+            return
+        for record in page:
+            yield ParkRecord.from_api(record)
+
+def iter_records(source="api", mirror_path=DEFAULT_MIRROR_PATH, full_sync=False, target=None, limiter=None):
+    """Yield parks (as ParkRecords) one at a time from the Airtable API or the local mirror.
     
-    print("Fetching parks from Airtable...")
+    `target` (from load_targets) picks another base and table than the
+    configured one; its requests then take tokens from `limiter`.
+    """
+    token, base_id, table_name = (target["token"], target["base_id"], target["table"]) if target else (AIRTABLE_TOKEN, AIRTABLE_BASE_ID, AIRTABLE_TABLE_NAME)
+    if source == "mirror":
+        with AirtableClient(token, base_id, table_name, limiter=limiter) as client:
+            mirror = ParksMirror(client, mirror_path)
+            try:
+                mirror.sync(full=full_sync)
+                yield from map(ParkRecord.from_api, mirror.records())
+            finally:
+                mirror.close()
+        return
     
-    try:
-        # Get all parks
-        records = table.all()
-        print(f"Successfully fetched {len(records)} parks.")
-        
-        # Initialize counters
-        region_counter = Counter()
-        states_by_region = defaultdict(set)
-        unassigned_parks = []
-        
-        # Process each park
-        for record in records:
-            fields = record["fields"]
-            park_name = fields.get("Name", "Unknown Park")
-            
-            # Handle region as either string or list (for multi-select fields)
-            region_value = fields.get("Region", [])
-            if isinstance(region_value, list):
-                region = region_value[0] if region_value else "Unassigned"
-            else:
-                region = region_value if region_value else "Unassigned"
-            
-            # Handle states as either string or list
-            states_string = fields.get("States", "")
-            states_multi = fields.get("States (Multi)", [])
-            
-            if states_multi:
-                states = ", ".join(states_multi)
-            else:
-                states = states_string
-            
-            # Count by region
-            if region and region != "Unassigned":
-                region_counter[region] += 1
-                
-                # Add states to the region
-                if states:
-                    state_list = [s.strip() for s in states.split(',')]
-                    for state in state_list:
-                        states_by_region[region].add(state)
-            else:
-                unassigned_parks.append(f"{park_name} ({states})")
-        
-        # Print region statistics
-        total_parks = len(records)
-        print("\n=== National Parks by Region ===")
-        print(f"Total Parks: {total_parks}\n")
-        
-        # Sort regions by count (descending)
-        sorted_regions = sorted(region_counter.items(), key=lambda x: x[1], reverse=True)
-        
-        for region, count in sorted_regions:
-            percentage = (count / total_parks) * 100
-            print(f"{region}: {count} parks ({percentage:.1f}%)")
-            print(f"  States: {', '.join(sorted(states_by_region[region]))}")
-            print()
+    yield from iter_table(make_table(token, base_id, table_name), limiter, COUNT_FIELDS)
+
+class RegionCounts:
+    """Running tally of parks by region, fed one record at a time
+    
+    Only counts are kept: parks per region, the set of states seen in each
+    region, and the names of the first few unassigned parks. Memory use
+    does not grow with the size of the table.
+    """
+    
+    def __init__(self):
+        self.total = 0
+        self.regions = Counter()
+        self.states = defaultdict(set)
+        self.unassigned = 0
+        self.unassigned_parks = []
+    
+    def add(self, park):
+        self.total += 1
+        region = park.region
+        if region:
+            self.regions[region] += 1
+            self.states[region].update(park.states)
+        else:
+            self.unassigned += 1
+            if len(self.unassigned_parks) <= MAX_LISTED_UNASSIGNED:
+                self.unassigned_parks.append(f"{park.name} ({', '.join(park.states)})")
+    
+    def update(self, parks):
+        for park in parks:
+            self.add(park)
+        return self
+    
+    def percentage(self, count):
+        return round(count / self.total * 100, 1) if self.total else 0.0
+    
+    def rows(self):
+        """(region, parks, percentage, sorted states) per region, most parks first, then Unassigned"""
+        rows = [
+            (region, count, self.percentage(count), sorted(self.states[region]))
+            for region, count in sorted(self.regions.items(), key=lambda item: item[1], reverse=True)
+        ]
+        rows.append(("Unassigned", self.unassigned, self.percentage(self.unassigned), []))
+        return rows
+    
+    def to_dict(self):
+        return {
+            "total": self.total,
+            "regions": {region: {"parks": count, "percentage": percentage, "states": states} for region, count, percentage, states in self.rows()[:-1]},
+            "unassigned": {
+                "parks": self.unassigned,
+                "percentage": self.percentage(self.unassigned),
+                "names": self.unassigned_parks if self.unassigned <= MAX_LISTED_UNASSIGNED else None,
+            },
+        }
+
+def tally_regions(parks):
+    """Count parks by region from an iterable of ParkRecords (see RegionCounts)"""
+    return RegionCounts().update(parks)
+
+def print_region_counts(stats, title="National Parks by Region"):
+    """Print the region statistics collected by tally_regions"""
+    print(f"\n=== {title} ===")
+    print(f"Total Parks: {stats.total}\n")
+    
+    for region, count, percentage, states in stats.rows()[:-1]:
+        print(f"{region}: {count} parks ({percentage:.1f}%)")
+        print(f"  States: {', '.join(states)}")
+        print()
+    
+    # Print unassigned stats
+    if stats.unassigned > 0:
+        print(f"Unassigned: {stats.unassigned} parks ({stats.percentage(stats.unassigned):.1f}%)")
         
-        # Print unassigned stats
-        unassigned_count = total_parks - sum(region_counter.values())
-        if unassigned_count > 0:
-            percentage = (unassigned_count / total_parks) * 100
-            print(f"Unassigned: {unassigned_count} parks ({percentage:.1f}%)")
-            
-            # If there are fewer than 20 unassigned parks, list them
-            if unassigned_count <= 20:
-                print("Unassigned parks:")
-                for park in unassigned_parks:
-                    print(f"  - {park}")
-            print()
-            
+        # If there are few unassigned parks, list them
+        if stats.unassigned <= MAX_LISTED_UNASSIGNED:
+            print("Unassigned parks:")
+            for park in stats.unassigned_parks:
+                print(f"  - {park}")
+        print()
+
+def write_region_counts(results, output_format, output_path=None):
+    """Write region counts as JSON or CSV to `output_path` (default: stdout)
+    
+    `results` is a list of (target, RegionCounts) pairs; target is None for
+    the configured table, and the counts are None for a target that failed.
+    """
+    if output_format == "json":
+        entries = []
+        for target, stats in results:
+            entry = {"target": target["name"], "base_id": target["base_id"], "table": target["table"]} if target else {}
+            entry.update(stats.to_dict() if stats else {"error": "failed to fetch parks"})
+            entries.append(entry)
+        text = json.dumps(entries if any(target for target, _ in results) else entries[0], indent=2) + "\n"
+    else:
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        with_target = any(target for target, _ in results)
+        writer.writerow((["target"] if with_target else []) + ["region", "parks", "percentage", "states"])
+        for target, stats in results:
+            if not stats:
+                continue
+            for region, count, percentage, states in stats.rows():
+                writer.writerow(([target["name"]] if with_target else []) + [region, count, percentage, "; ".join(states)])
+        text = buffer.getvalue()
+    
+    if output_path:
+        with open(output_path, "w", newline="") as f:
+            f.write(text)
+        print(f"Region counts written to {output_path}", file=sys.stderr)
+    else:
+        sys.stdout.write(text)
+
+def count_parks_by_region(source="api", mirror_path=DEFAULT_MIRROR_PATH, full_sync=False, output_format="text", output_path=None):
+    """Count parks by region and print statistics (or write them as JSON or CSV)."""
+    # Progress goes to stderr when stdout carries JSON or CSV
+    log = sys.stdout if output_format == "text" else sys.stderr
+    print("Fetching parks from the local mirror..." if source == "mirror" else "Fetching parks from Airtable...", file=log)
+    
+    try:
+        # Count parks as the pages arrive
+        stats = tally_regions(iter_records(source, mirror_path, full_sync))
+        print(f"Successfully fetched {stats.total} parks.", file=log)
     except Exception as e:
-        print(f"Error fetching parks: {e}")
+        print(f"Error fetching parks: {e}", file=log)
         sys.exit(1)
+    
+    if output_format == "text":
+        print_region_counts(stats)
+    else:
+        write_region_counts([(None, stats)], output_format, output_path)
+
+def count_targets(targets, source="api", mirror_path=DEFAULT_MIRROR_PATH, full_sync=False, airtable_rps=5, output_format="text", output_path=None):
+    """Count the parks of several base/table targets concurrently and print a report per target
+    
+    Airtable limits requests per base, so each base gets its own rate
+    limiter (shared by targets in the same base), of `airtable_rps` unless
+    the target sets its own. With a JSON or CSV `output_format` the counts
+    are written as one document covering every target instead.
+    """
+    log = sys.stdout if output_format == "text" else sys.stderr
+    limiters = {}
+    for target in targets:
+        if target["base_id"] not in limiters:
+            rps = target["airtable_rps"] or airtable_rps
+            limiters[target["base_id"]] = RateLimiter(rps, per=1.0, burst=max(1, int(rps)), name=f"airtable:{target['base_id']}")
+    
+    def count(target):
+        return tally_regions(iter_records(source, mirror_path, full_sync, target, limiters[target["base_id"]]))
+    
+    print(f"Counting parks in {len(targets)} Airtable targets concurrently...", file=log)
+    with ThreadPoolExecutor(max_workers=len(targets)) as executor:
+        futures = [executor.submit(count, target) for target in targets]
+    
+    results = []
+    for target, future in zip(targets, futures):
+        try:
+            results.append(future.result())
+        except Exception as e:
+            print(f"Error fetching parks of target '{target['name']}': {e}", file=log)
+            results.append(None)
+    
+    if output_format != "text":
+        write_region_counts(list(zip(targets, results)), output_format, output_path)
+        if not all(results):
+            sys.exit(1)
+        return
+    
+    for target, stats in zip(targets, results):
+        if stats:
+            print_region_counts(stats, f"{target['name']} ({target['base_id']}/{target['table']}) by Region")
+    
+    columns = ["Target", "Parks"] + REGIONS + ["Unassigned"]
+    rows = []
+    totals = Counter()
+    for target, stats in zip(targets, results):
+        if not stats:
+            rows.append([target["name"], "failed"] + [""] * (len(columns) - 2))
+            continue
+        values = [stats.total] + [stats.regions[region] for region in REGIONS] + [stats.unassigned]
+        totals.update(dict(zip(columns[1:], values)))
+        rows.append([target["name"]] + values)
+    rows.append(["All targets"] + [totals[column] for column in columns[1:]])
+    
+    print("=== Parks by Region per Target ===")
+    print_targets_table(columns, rows)
+    
+    if not all(results):
+        sys.exit(1)
+
+def main(argv=None, prog=None):
+    """Run the script with `argv` (default: sys.argv[1:]); `prog` names it in the usage message"""
+    parser = argparse.ArgumentParser(prog=prog, description="Count National Parks by region")
+    parser.add_argument("--source", choices=["api", "mirror"], default="api", help="Read parks from the Airtable API or from the local mirror (default: api)")
+    parser.add_argument("--mirror-path", type=str, default=DEFAULT_MIRROR_PATH, help="SQLite file holding the local mirror of the parks table")
+    parser.add_argument("--full-sync", action="store_true", help="Re-download the whole table into the local mirror before counting")
+    parser.add_argument("--targets", type=str, help="JSON file listing Airtable base/table pairs to count concurrently")
+    parser.add_argument("--airtable-rps", type=float, default=5, help="Max Airtable requests per second per base with --targets (default: 5)")
+    parser.add_argument("--format", choices=["text", "json", "csv"], default="text", help="Print a text report, or write the counts as JSON or CSV (default: text)")
+    parser.add_argument("--output", type=str, help="With --format json or csv, write the counts to this file instead of stdout")
+    args = parser.parse_args(argv)
+    
+    if args.targets:
+        try:
+            targets = load_targets(args.targets, AIRTABLE_TOKEN)
+        except (OSError, ValueError) as e:
+            print(f"Error reading targets: {e}")
+            sys.exit(1)
+        count_targets(targets, args.source, args.mirror_path, args.full_sync, args.airtable_rps, args.format, args.output)
+    else:
+        count_parks_by_region(args.source, args.mirror_path, args.full_sync, args.format, args.output)
 
 if __name__ == "__main__":
-    count_parks_by_region() 
\ No newline at end of file
+    main()
@@ -0,0 +1,154 @@
+import os
+import json
+import importlib.util
+
+from region_rules import STATE_TO_REGION
+
+# Simplified state and territory outlines as {state: [ring, ...]}, each ring a list of [lon, lat]
+BOUNDARIES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "state_boundaries.json")
+
+# Size of the grid cells (in degrees) used to find candidate states for a point
+GRID_CELL_DEGREES = 1.0
+
+# NumPy, imported by the first StateResolver: it is optional (without it
+# coordinates are left to the AI model) and slow to import for runs that
+# never look up a coordinate
+np = None
+
+class StateResolver:
+    """Offline lookup of the state (and region) containing a lat/lon point
+
+    The bundled outlines are coarse polygons: good enough to place a park in
+    its state, not to settle points within a few miles of a border. Each ring
+    is registered in the cells of a uniform lat/lon grid covered by its
+    bounding box, so a point is only tested against rings sharing its cell.
+    Points are resolved in bulk with NumPy ray casting, one ring at a time
+    over all of its candidate points.
+    """
+
+    def __init__(self, boundaries_path=BOUNDARIES_PATH, cell_degrees=GRID_CELL_DEGREES):
+        global np
+        if np is None:
+            try:
+                import numpy as np
+            except ImportError:
+                raise ImportError("NumPy is required for coordinate lookups (pip install numpy)")
+
+        with open(boundaries_path) as f:
+            boundaries = json.load(f)
+
+        self.cell_degrees = cell_degrees
+        self.columns = int(round(360 / cell_degrees))
+        self.states = []
+        self.rings = []
+        self.areas = []
+        self.ring_cells = []
+
+        for state, rings in boundaries.items():
+            for ring in rings:
+                points = np.asarray(ring, dtype=float)
+                self.states.append(state)
+                self.rings.append(points)
+                self.areas.append(self._area(points))
+                self.ring_cells.append(self._cells_for_bbox(points))
+
+        self.areas = np.asarray(self.areas)
+
+    def _area(self, points):
+        x, y = points[:, 0], points[:, 1]
+        return abs(np.dot(x, np.roll(y, 1)) - np.dot(y, np.roll(x, 1))) / 2
+
+    def _grid_position(self, lons, lats):
+        columns = np.clip(np.floor((lons + 180) / self.cell_degrees), 0, self.columns - 1).astype(int)
+        rows = np.floor((lats + 90) / self.cell_degrees).astype(int)
+        return rows, columns
+
+    def _cell_ids(self, lons, lats):
+        rows, columns = self._grid_position(lons, lats)
+        return rows * self.columns + columns
+
+    def _cells_for_bbox(self, points):
+        (min_row, max_row), (min_column, max_column) = (
+            (axis.min(), axis.max()) for axis in self._grid_position(points[:, 0], points[:, 1])
+        )
+        rows = np.arange(min_row, max_row + 1)
+        columns = np.arange(min_column, max_column + 1)
+        return (rows[:, None] * self.columns + columns[None, :]).ravel()
+
+    def _contains(self, ring, lons, lats):
+        """Vectorized even-odd ray casting of many points against one ring"""
+        x1, y1 = ring[:, 0], ring[:, 1]
+        x2, y2 = np.roll(x1, -1), np.roll(y1, -1)
+        px, py = lons[:, None], lats[:, None]
+
+        crosses = (y1 > py) != (y2 > py)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            x_at_y = x1 + (py - y1) * (x2 - x1) / (y2 - y1)
+        hits = crosses & (px < x_at_y)
+        return np.count_nonzero(hits, axis=1) % 2 == 1
+
+    def resolve(self, lats, lons):
+        """Return the state containing each point, or None
+
+        When rings overlap (e.g. the District of Columbia inside Maryland's
+        outline) the smallest ring wins. Missing or invalid coordinates
+        resolve to None.
+        """
+        lats = np.asarray(lats, dtype=float)
+        lons = np.asarray(lons, dtype=float)
+        best = np.full(lats.shape, -1)
+        best_area = np.full(lats.shape, np.inf)
+
+        valid = np.isfinite(lats) & np.isfinite(lons) & (np.abs(lats) <= 90) & (np.abs(lons) <= 180)
+        point_index = np.flatnonzero(valid)
+        cell_ids = self._cell_ids(lons[point_index], lats[point_index])
+
+        for ring_index, cells in enumerate(self.ring_cells):
+            selected = point_index[np.isin(cell_ids, cells)]
+            if not selected.size:
+                continue
+            inside = self._contains(self.rings[ring_index], lons[selected], lats[selected])
+            selected = selected[inside & (self.areas[ring_index] < best_area[selected])]
+            best[selected] = ring_index
+            best_area[selected] = self.areas[ring_index]
+
+        return [self.states[index] if index >= 0 else None for index in best.tolist()]
+
+def parse_coordinate(value):
+    """Convert an Airtable Latitude/Longitude value to a float (NaN if missing)"""
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return float("nan")
+
+def resolve_records(records, resolver=None):
+    """Resolve the state and region of every park record (ParkRecord) from its coordinates
+
+    Returns {record_id: (state, region)} for records whose coordinates fall
+    inside a known outline. All records are resolved in a single batch.
+    """
+    if not records:
+        return {}
+
+    resolver = resolver or get_resolver()
+    lats = [parse_coordinate(record.latitude) for record in records]
+    lons = [parse_coordinate(record.longitude) for record in records]
+
+    resolved = {}
+    for record, state in zip(records, resolver.resolve(lats, lons)):
+        if state:
+            resolved[record.id] = (state, STATE_TO_REGION.get(state.lower()))
+    return resolved
+
+_resolver = None
+
+def get_resolver():
+    """Return the shared StateResolver, loading the outlines on first use"""
+    global _resolver
+    if _resolver is None:
+        _resolver = StateResolver()
+    return _resolver
+
+def available():
+    """True when coordinate lookups can run (NumPy is installed), without importing NumPy"""
+    return np is not None or importlib.util.find_spec("numpy") is not None
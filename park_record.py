@@ -0,0 +1,103 @@
+import sys
+import json
+
+try:
+    import orjson
+except ImportError:  # orjson is optional; without it pages are decoded with the json module
+    orjson = None
+
+from region_rules import split_states
+
+# Longest description kept per park. Prompts cut descriptions to their token
+# budget (region_prompt.park_details); no token is anywhere near this many
+# characters per token, so the cut never changes a prompt or a cache key.
+MAX_CHARS_PER_TOKEN = 25
+
+# Description length kept by ParkRecord (see configure_description_limit)
+description_limit = 160 * MAX_CHARS_PER_TOKEN
+
+def configure_description_limit(park_tokens):
+    """Keep enough of each description for prompts with a `park_tokens` budget"""
+    global description_limit
+    description_limit = max(1, park_tokens) * MAX_CHARS_PER_TOKEN
+
+def loads(data):
+    """Decode a JSON document (bytes or str), with orjson when it is installed"""
+    if orjson:
+        return orjson.loads(data)
+    return json.loads(data)
+
+class ParkRecord:
+    """One park as the region scripts use it: the fields they read, in slots
+
+    Built straight from an Airtable record (or a mirror row), keeping only
+    the name, states, coordinates, description (cut to `description_limit`)
+    and region. The states are parsed once, here, and state and region
+    names are interned, so parks in the same states share them. `geo` and
+    `ai` carry what the coordinate lookup and batched classification found
+    for the park; `batched` is set once classify_stream has looked it up.
+    """
+
+    __slots__ = ("id", "name", "states_text", "states_multi", "states", "latitude", "longitude", "description", "regions", "geo", "ai", "batched")
+
+    def __init__(self, record_id, fields):
+        self.id = record_id
+        self.name = fields.get("Name", "Unknown Park")
+        self.states_text = fields.get("States", "")
+        self.states_multi = tuple(sys.intern(state) for state in fields.get("States (Multi)") or ())
+        self.states = self.states_multi or (split_states(self.states_text) if self.states_text else ())
+        self.latitude = fields.get("Latitude", "")
+        self.longitude = fields.get("Longitude", "")
+        self.description = (fields.get("Description") or "")[:description_limit]
+        regions = fields.get("Region", [])
+        self.regions = [sys.intern(region) for region in regions] if isinstance(regions, list) else regions
+        self.geo = None
+        self.ai = None
+        self.batched = False
+
+    @classmethod
+    def from_api(cls, record):
+        """Build a park from an Airtable API record ({"id", "fields"}), or a dict written by to_dict"""
+        park = cls(record.get("id"), record.get("fields", {}))
+        park.geo = record.get("geo")
+        park.ai = record.get("ai")
+        return park
+
+    @property
+    def region(self):
+        """The park's current region (the first, if several are selected), or None"""
+        if isinstance(self.regions, list):
+            return self.regions[0] if self.regions else None
+        return self.regions or None
+
+    @property
+    def fields(self):
+        """The kept fields in the shape of the Airtable API, for prompts and cache keys"""
+        fields = {"Name": self.name}
+        if self.states_text:
+            fields["States"] = self.states_text
+        if self.states_multi:
+            fields["States (Multi)"] = list(self.states_multi)
+        if self.latitude != "":
+            fields["Latitude"] = self.latitude
+        if self.longitude != "":
+            fields["Longitude"] = self.longitude
+        if self.description:
+            fields["Description"] = self.description
+        if self.regions:
+            fields["Region"] = self.regions
+        return fields
+
+    def to_dict(self):
+        """The park as plain data (e.g. to send to a worker process); read back with from_api"""
+        data = {"id": self.id, "fields": self.fields}
+        if self.geo:
+            data["geo"] = self.geo
+        if self.ai:
+            data["ai"] = self.ai
+        return data
+
+def parse_page(data):
+    """Decode a page of the Airtable list API into (parks, offset)"""
+    page = loads(data)
+    return [ParkRecord.from_api(record) for record in page.get("records", [])], page.get("offset")
@@ -0,0 +1,82 @@
+import sys
+import argparse
+
+# Subcommands, each running one of the scripts. A subcommand's module is only
+# imported once it is chosen, so `--help` and Airtable-only commands never
+# load the OpenAI client library.
+COMMANDS = {
+    "classify": "Classify parks into regions and write them to Airtable (update_regions.py)",
+    "report": "Print park counts by region, as at the end of a classify run",
+    "count": "Count parks by region with the states in each (count_regions.py)",
+    "schema": "Show the fields of the parks table and check the Region options (check_airtable.py)",
+    "watch": "Reclassify parks as they change, from an Airtable webhook (region_daemon.py)",
+}
+
+def classify(argv):
+    import update_regions
+    update_regions.parser.prog = "parks.py classify"
+    update_regions.main(argv)
+
+def report(argv):
+    from airtable_mirror import DEFAULT_MIRROR_PATH
+
+    parser = argparse.ArgumentParser(prog="parks.py report", description=COMMANDS["report"])
+    parser.add_argument("--source", choices=["api", "mirror"], default="api", help="Read parks from the Airtable API or from the local mirror (default: api)")
+    parser.add_argument("--mirror-path", type=str, default=DEFAULT_MIRROR_PATH, help="SQLite file holding the local mirror of the parks table")
+    parser.add_argument("--full-sync", action="store_true", help="Re-download the whole table into the local mirror first")
+    parser.add_argument("--airtable-rps", type=float, default=5, help="Max Airtable requests per second (default: 5)")
+    args = parser.parse_args(argv)
+
+    import update_regions
+    update_regions.configure_rate_limits(airtable_rps=args.airtable_rps)
+    mirror = None
+    if args.source == "mirror":
+        try:
+            mirror = update_regions.open_mirror(args.mirror_path, args.full_sync)
+        except RuntimeError as e:
+            print(e)
+            sys.exit(1)
+    try:
+        if update_regions.generate_regions_report(mirror) is None:
+            sys.exit(1)
+    finally:
+        if mirror:
+            mirror.close()
+
+def count(argv):
+    import count_regions
+    count_regions.main(argv, prog="parks.py count")
+
+def schema(argv):
+    from airtable_schema import DEFAULT_SCHEMA_PATH
+
+    parser = argparse.ArgumentParser(prog="parks.py schema", description=COMMANDS["schema"])
+    parser.add_argument("--refresh", action="store_true", help="Fetch the schema from Airtable instead of using the cached copy")
+    parser.add_argument("--schema-path", type=str, default=DEFAULT_SCHEMA_PATH, help="JSON file caching the table schema")
+    args = parser.parse_args(argv)
+
+    import check_airtable
+    print("Checking Airtable schema...")
+    if check_airtable.check_field_metadata(args.refresh, args.schema_path) is None:
+        sys.exit(1)
+
+def watch(argv):
+    import region_daemon
+    region_daemon.main(argv, prog="parks.py watch")
+
+def main(argv=None):
+    """Run the subcommand named in `argv` (default: sys.argv[1:]) with the arguments after it"""
+    parser = argparse.ArgumentParser(
+        description="National Parks region tools",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="commands:\n" + "\n".join(f"  {name:<10}{text}" for name, text in COMMANDS.items())
+        + "\n\nRun 'parks.py <command> --help' for the options of a command.",
+    )
+    parser.add_argument("command", choices=list(COMMANDS), metavar="command", help="one of: " + ", ".join(COMMANDS))
+    parser.add_argument("arguments", nargs=argparse.REMAINDER, help="options of the command")
+    args = parser.parse_args(argv)
+    handlers = {"classify": classify, "report": report, "count": count, "schema": schema, "watch": watch}
+    handlers[args.command](args.arguments)
+
+if __name__ == "__main__":
+    main()
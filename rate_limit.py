@@ -0,0 +1,206 @@
+import sqlite3
+import threading
+import time
+
+
+# An adaptive limiter halves its rate when the API pushes back...
+DECREASE_FACTOR = 0.5
+
+# ...and otherwise adds this share of its starting rate for every second's worth of successful calls
+INCREASE_SHARE = 0.1
+
+# Latency this many times its baseline, and at least this many seconds above
+# it (so jitter on fast calls doesn't count), is taken as the API pushing back
+LATENCY_FACTOR = 2.0
+LATENCY_MIN_RISE = 0.1
+
+# Share of a provider-reported quota left at which the limiter slows down
+QUOTA_RESERVE = 0.05
+
+class RateLimiter:
+    """Thread-safe token bucket that spaces out API calls.
+
+    `rate` tokens are refilled every `per` seconds, up to `burst` tokens.
+    Callers take tokens with `acquire()`, which sleeps just long enough to
+    stay within the limit. Tokens may be borrowed ahead of time, so a large
+    request (e.g. an OpenAI call worth many tokens) waits rather than failing.
+    The total time callers were asked to wait is kept in `waited`.
+
+    With `min_rate`, the limiter is adaptive (additive increase,
+    multiplicative decrease): callers report each call with succeeded(),
+    throttled() and observe_quota(). Every successful call adds a little to
+    the rate, up to `rate` or, once a provider reports its quota, up to that
+    quota within `max_rate` (default: `rate`). A throttled call, the quota
+    running low or latency rising to twice its baseline halve the rate, down
+    to `min_rate`, at most once per cooldown. Without `min_rate` these reports
+    are ignored and the rate stays fixed.
+    """
+
+    def __init__(self, rate, per=1.0, burst=None, name="limiter", min_rate=None, max_rate=None):
+        if rate <= 0:
+            raise ValueError(f"{name}: rate must be positive (got {rate})")
+        self.name = name
+        self.per = per
+        self.rate_per_second = rate / per
+        self.capacity = burst if burst is not None else rate
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.waited = 0.0
+        self.lock = threading.Lock()
+
+        self.adaptive = min_rate is not None
+        self.min_rate_per_second = min(rate, min_rate) / per if self.adaptive else self.rate_per_second
+        self.ceiling = (rate if max_rate is None else max_rate) / per
+        self.max_rate_per_second = min(self.ceiling, self.rate_per_second)
+        self.increase = self.rate_per_second * INCREASE_SHARE
+        # The burst is kept to the same number of seconds' worth of calls as the rate changes
+        self.burst_seconds = self.capacity / self.rate_per_second
+        self.latencies = {}
+        self.cooldown_until = 0.0
+        self.decreases = 0
+
+    def reserve(self, amount=1):
+        """Take `amount` tokens and return how many seconds to wait before using them"""
+        with self.lock:
+            now = time.monotonic()
+            elapsed = now - self.updated
+            self.tokens = min(self.capacity, self.tokens + elapsed * self.rate_per_second)
+            self.updated = now
+            self.tokens -= amount
+            if self.tokens >= 0:
+                return 0.0
+            wait = -self.tokens / self.rate_per_second
+            self.waited += wait
+            return wait
+
+    def acquire(self, amount=1):
+        """Block until `amount` tokens are available"""
+        wait = self.reserve(amount)
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+    def succeeded(self, latency=None, amount=1, kind=None):
+        """Report a call that went through, worth `amount` tokens, and how long it took (if measured)
+
+        Latency is compared per `kind` of call (e.g. the HTTP method), since
+        some calls are slower than others to begin with.
+        """
+        if not self.adaptive:
+            return
+        with self.lock:
+            if latency is not None:
+                samples, average, baseline = self._track_latency(kind, latency)
+                if samples >= 5 and average > max(baseline * LATENCY_FACTOR, baseline + LATENCY_MIN_RISE):
+                    if self._decrease(f"latency {average:.2f}s, baseline {baseline:.2f}s"):
+                        return
+            # One second's worth of tokens at the current rate adds `increase`
+            self._set_rate(min(self.max_rate_per_second, self.rate_per_second + self.increase * amount / max(1.0, self.rate_per_second)))
+
+    def throttled(self, reason="429"):
+        """Report a call the API rejected or deferred for going too fast (a 429, a Retry-After, ...)"""
+        if self.adaptive:
+            with self.lock:
+                self._decrease(reason)
+
+    def observe_quota(self, limit=None, remaining=None):
+        """Report the quota a provider announces for this limiter's period (e.g. OpenAI's x-ratelimit-* headers)
+
+        `limit` becomes the ceiling of the rate (within `max_rate`), and the
+        rate is cut when less than 5% of the quota is `remaining`.
+        """
+        if not self.adaptive or not limit:
+            return
+        with self.lock:
+            self.max_rate_per_second = max(self.min_rate_per_second, min(self.ceiling, limit / self.per))
+            self._set_rate(min(self.rate_per_second, self.max_rate_per_second))
+            if remaining is not None and remaining < limit * QUOTA_RESERVE:
+                self._decrease(f"{remaining:g} of {limit:g} left")
+
+    def _track_latency(self, kind, latency):
+        """Fold a latency into the moving average of its kind; returns (samples, average, baseline)"""
+        samples, average, baseline = self.latencies.get(kind, (0, latency, latency))
+        average = 0.8 * average + 0.2 * latency
+        # The baseline is the lowest average seen, following lasting changes slowly
+        baseline = average if average < baseline else baseline + (average - baseline) * 0.01
+        self.latencies[kind] = (samples + 1, average, baseline)
+        return self.latencies[kind]
+
+    def _decrease(self, reason):
+        # Calls already in flight report the same congestion; react to it once
+        now = time.monotonic()
+        if now < self.cooldown_until:
+            return False
+        old = self.rate_per_second
+        self._set_rate(max(self.min_rate_per_second, old * DECREASE_FACTOR))
+        self.tokens = min(self.tokens, self.capacity)
+        self.cooldown_until = now + max([1.0] + [2 * average for _, average, _ in self.latencies.values()])
+        self.decreases += 1
+        print(f"Rate limit {self.name} lowered from {self.format_rate(old)} to {self.format_rate(self.rate_per_second)} ({reason})")
+        return True
+
+    def _set_rate(self, rate_per_second):
+        self.rate_per_second = rate_per_second
+        self.capacity = max(1.0, rate_per_second * self.burst_seconds)
+
+    def format_rate(self, rate_per_second=None):
+        """A rate in the limiter's own unit, e.g. 4.5/s or 480/min"""
+        rate = (self.rate_per_second if rate_per_second is None else rate_per_second) * self.per
+        if self.per == 60.0:
+            return f"{rate:.0f}/min"
+        if self.per == 1.0:
+            return f"{rate:.2g}/s" if rate < 10 else f"{rate:.0f}/s"
+        return f"{rate:.2f}/{self.per:g}s"
+
+    def __repr__(self):
+        return f"RateLimiter({self.name}, {self.rate_per_second:.2f}/s, burst={self.capacity})"
+
+
+class SharedRateLimiter(RateLimiter):
+    """Token bucket kept in a SQLite file, shared by several processes.
+
+    Every process that opens the same `path` with the same `bucket` (by
+    default the limiter's `name`) draws from one bucket, so together they stay
+    within `rate` per `per` seconds. Each reservation is one short write
+    transaction; the bucket is created with `burst` tokens by the first
+    process to use it. An adaptive limiter adapts its rate to what its own
+    process observes.
+    """
+
+    def __init__(self, path, rate, per=1.0, burst=None, name="limiter", bucket=None, min_rate=None, max_rate=None):
+        super().__init__(rate, per, burst, name, min_rate, max_rate)
+        self.path = path
+        self.bucket = bucket or name
+        self.connection = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=OFF")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS buckets (name TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL)"
+        )
+
+    def reserve(self, amount=1):
+        """Take `amount` tokens from the shared bucket and return how many seconds to wait"""
+        with self.lock:
+            self.connection.execute("BEGIN IMMEDIATE")
+            try:
+                # Wall-clock time, since monotonic clocks are not comparable between processes
+                now = time.time()
+                row = self.connection.execute("SELECT tokens, updated FROM buckets WHERE name = ?", (self.bucket,)).fetchone()
+                tokens, updated = row if row else (self.capacity, now)
+                tokens = min(self.capacity, tokens + max(0.0, now - updated) * self.rate_per_second) - amount
+                self.connection.execute(
+                    "INSERT OR REPLACE INTO buckets (name, tokens, updated) VALUES (?, ?, ?)", (self.bucket, tokens, now)
+                )
+                self.connection.execute("COMMIT")
+            except BaseException:
+                self.connection.execute("ROLLBACK")
+                raise
+
+            if tokens >= 0:
+                return 0.0
+            wait = -tokens / self.rate_per_second
+            self.waited += wait
+            return wait
+
+    def __repr__(self):
+        return f"SharedRateLimiter({self.name}, {self.rate_per_second:.2f}/s, burst={self.capacity}, {self.path}:{self.bucket})"
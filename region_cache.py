@@ -0,0 +1,126 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+
+# Default cache file, kept next to the scripts
+DEFAULT_CACHE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "region_cache.sqlite3")
+
+def cache_key(park_name, states_list, lat, lon, description, model, prompt_version):
+    """Hash the normalized inputs of a classification prompt
+
+    Whitespace, letter case and state order don't change the key, so cosmetic
+    edits in Airtable don't cost a new AI call.
+    """
+    normalized = [
+        " ".join(str(park_name or "").split()).lower(),
+        sorted(" ".join(str(state).split()).lower() for state in states_list or []),
+        str(lat or "").strip(),
+        str(lon or "").strip(),
+        " ".join(str(description or "").split()),
+        model,
+        prompt_version,
+    ]
+    return hashlib.sha256(json.dumps(normalized).encode("utf-8")).hexdigest()
+
+class ClassificationCache:
+    """Persistent SQLite cache of AI region classifications
+
+    Entries expire after `ttl_seconds`. When the cache holds more than
+    `max_entries`, the least recently used entries are evicted. The cache is
+    safe to share between the worker threads of an --async run, and between
+    the worker processes of a --workers run: the file is in WAL mode and a
+    locked database is waited on for up to 30 seconds. A lookup or store
+    that still fails counts as a miss rather than stopping the run.
+    """
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, ttl_seconds=30 * 24 * 3600, max_entries=10000):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS classifications ("
+            " key TEXT PRIMARY KEY,"
+            " region TEXT NOT NULL,"
+            " created_at REAL NOT NULL,"
+            " last_used_at REAL NOT NULL)"
+        )
+        self.connection.commit()
+
+    def get(self, key):
+        """Return the cached region for `key`, or None on a miss"""
+        now = time.time()
+        with self.lock:
+            try:
+                row = self.connection.execute(
+                    "SELECT region, created_at FROM classifications WHERE key = ?", (key,)
+                ).fetchone()
+
+                if row and now - row[1] <= self.ttl_seconds:
+                    self.connection.execute("UPDATE classifications SET last_used_at = ? WHERE key = ?", (now, key))
+                    self.connection.commit()
+                    self.hits += 1
+                    return row[0]
+
+                if row:
+                    self.connection.execute("DELETE FROM classifications WHERE key = ?", (key,))
+                    self.connection.commit()
+            except sqlite3.Error as e:
+                self._failed("lookup", e)
+            self.misses += 1
+            return None
+
+    def put(self, key, region):
+        """Store a classification, evicting the oldest entries beyond max_entries"""
+        now = time.time()
+        with self.lock:
+            try:
+                self.connection.execute(
+                    "INSERT OR REPLACE INTO classifications (key, region, created_at, last_used_at) VALUES (?, ?, ?, ?)",
+                    (key, region, now, now),
+                )
+                excess = self.connection.execute("SELECT COUNT(*) FROM classifications").fetchone()[0] - self.max_entries
+                if excess > 0:
+                    self.connection.execute(
+                        "DELETE FROM classifications WHERE key IN"
+                        " (SELECT key FROM classifications ORDER BY last_used_at LIMIT ?)",
+                        (excess,),
+                    )
+                self.connection.commit()
+            except sqlite3.Error as e:
+                self._failed("store", e)
+
+    def _failed(self, operation, error):
+        # Leave no half-done transaction holding the lock; report the first failure only
+        try:
+            self.connection.rollback()
+        except sqlite3.Error:
+            pass
+        self.errors += 1
+        if self.errors == 1:
+            print(f"Classification cache {operation} failed ({error}); carrying on without the cached entry")
+
+    def purge_expired(self):
+        """Delete every expired entry and return how many were removed"""
+        with self.lock:
+            try:
+                cursor = self.connection.execute(
+                    "DELETE FROM classifications WHERE created_at < ?", (time.time() - self.ttl_seconds,)
+                )
+                self.connection.commit()
+                return cursor.rowcount
+            except sqlite3.Error as e:
+                self._failed("purge", e)
+                return 0
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
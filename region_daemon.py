@@ -0,0 +1,352 @@
+import os
+import sys
+import copy
+import hmac
+import json
+import time
+import base64
+import signal
+import hashlib
+import argparse
+import threading
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import update_regions
+from airtable_schema import DEFAULT_SCHEMA_PATH
+from region_cache import DEFAULT_CACHE_PATH
+from run_metrics import write_atomically
+
+# Webhook of the daemon (ID, MAC secret and payload cursor), kept next to the scripts
+DEFAULT_STATE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "region_webhook.json")
+
+# Fields a park's region is derived from; changes to any other field are ignored
+WATCHED_FIELDS = ["States", "States (Multi)", "Latitude", "Longitude", "Description"]
+
+# Airtable disables a webhook that goes 7 days without a refresh; refresh it daily
+REFRESH_INTERVAL = 24 * 3600
+
+# Rounds a park that can't be classified or written is retried in before it is given up on
+MAX_ATTEMPTS = 5
+
+def load_state(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+def save_state(path, state):
+    write_atomically(path, json.dumps(state, indent=2) + "\n")
+
+def changed_record_ids(payloads, table_id, watched_field_ids):
+    """Return the IDs of parks created, or changed in a watched field, in a list of webhook payloads
+
+    IDs are returned once each, in the order of their first change.
+    Deleted records are left out.
+    """
+    record_ids = {}
+    for payload in payloads:
+        changes = payload.get("changedTablesById", {}).get(table_id, {})
+        for record_id in changes.get("createdRecordsById", {}):
+            record_ids[record_id] = True
+        for record_id, change in changes.get("changedRecordsById", {}).items():
+            fields = change.get("current", {}).get("cellValuesByFieldId", {})
+            if watched_field_ids & set(fields):
+                record_ids[record_id] = True
+        for record_id in changes.get("destroyedRecordIds", []):
+            record_ids.pop(record_id, None)
+    return list(record_ids)
+
+class RegionWatcher:
+    """Keeps the Region of changed parks current from an Airtable webhook
+
+    The webhook only watches the fields a region is derived from, so writing
+    Region back does not trigger it. Each time Airtable pings the daemon, or
+    every `poll_interval` seconds without a ping, the payloads since the
+    saved cursor are read, and every park created or changed since is
+    fetched, classified with determine_region and written back. The cursor
+    is saved once a round's writes are done: a restart picks up where the
+    last finished round ended, and a park seen twice is simply classified
+    again. Parks that could not be classified or written are kept in the
+    state as pending and retried in the next rounds, up to MAX_ATTEMPTS.
+    """
+
+    def __init__(self, state_path=DEFAULT_STATE_PATH, notification_url=None, poll_interval=60.0, debounce=2.0,
+                 test_mode=False, model="gpt-4o", use_rules=True, use_geo=True, batch_size=10):
+        self.airtable = update_regions.airtable
+        self.state_path = state_path
+        self.notification_url = notification_url
+        self.poll_interval = poll_interval
+        self.debounce = debounce
+        self.test_mode = test_mode
+        self.model = model
+        self.use_rules = use_rules
+        self.use_geo = use_geo
+        self.batch_size = batch_size
+        self.state = {}
+        self.counts = Counter()
+        self.wake = threading.Event()
+        self.stopped = threading.Event()
+
+    def setup(self):
+        """Reuse the webhook saved in the state file, or create one watching the parks table
+        
+        Needs the table schema loaded by update_regions.configure_schema.
+        """
+        table = update_regions.table_schema
+        if table is None:
+            raise RuntimeError("The schema of the parks table is needed to set up the webhook")
+        field_ids = [table.fields[name]["id"] for name in WATCHED_FIELDS if name in table.fields]
+
+        state = load_state(self.state_path)
+        if state.get("base_id") == self.airtable.base_id and state.get("table_id") == table.id and state.get("webhook_id"):
+            response = self.airtable.list_webhooks()
+            if not response.ok:
+                raise RuntimeError(f"Error listing webhooks: {response.status_code} {response.text}")
+            existing = {webhook["id"]: webhook for webhook in response.json().get("webhooks", [])}
+            webhook = existing.get(state["webhook_id"])
+            if webhook and webhook.get("notificationUrl") == self.notification_url and sorted(state.get("field_ids", [])) == sorted(field_ids):
+                self.state = state
+                print(f"Resuming webhook {state['webhook_id']} at payload {state['cursor']}")
+                return
+            if webhook:
+                print(f"Replacing webhook {webhook['id']}, which watches other fields or pings another URL")
+                self.airtable.delete_webhook(webhook["id"])
+
+        specification = {"options": {"filters": {
+            "dataTypes": ["tableData"],
+            "recordChangeScope": table.id,
+            "watchDataInFieldIds": field_ids,
+        }}}
+        response = self.airtable.create_webhook(specification, self.notification_url)
+        if not response.ok:
+            raise RuntimeError(f"Error creating webhook: {response.status_code} {response.text}")
+        created = response.json()
+        self.state = {
+            "base_id": self.airtable.base_id,
+            "table_id": table.id,
+            "field_ids": field_ids,
+            "webhook_id": created["id"],
+            "mac_secret": created.get("macSecretBase64"),
+            "expiration_time": created.get("expirationTime"),
+            "refreshed_at": time.time(),
+            "cursor": 1,
+        }
+        save_state(self.state_path, self.state)
+        print(f"Created webhook {created['id']} watching {', '.join(WATCHED_FIELDS)}")
+
+    def verify(self, body, header):
+        """True when a ping carries the MAC Airtable signs notifications with"""
+        if not self.state.get("mac_secret"):
+            return True
+        expected = "hmac-sha256=" + hmac.new(base64.b64decode(self.state["mac_secret"]), body, hashlib.sha256).hexdigest()
+        return hmac.compare_digest(expected, header or "")
+
+    def read_payloads(self):
+        """Read every payload after the saved cursor; returns (payloads, next cursor)"""
+        cursor = self.state["cursor"]
+        payloads = []
+        while True:
+            response = self.airtable.list_webhook_payloads(self.state["webhook_id"], cursor)
+            if not response.ok:
+                raise RuntimeError(f"Error reading webhook payloads: {response.status_code} {response.text}")
+            data = response.json()
+            payloads.extend(data.get("payloads", []))
+            cursor = data.get("cursor", cursor)
+            if not data.get("mightHaveMore"):
+                return payloads, cursor
+
+    def run_round(self):
+        """Classify the parks changed since the last round, and those pending, and advance the cursor"""
+        payloads, cursor = self.read_payloads()
+        record_ids = changed_record_ids(payloads, self.state["table_id"], set(self.state["field_ids"]))
+        pending = self.state.get("pending", {})
+        if record_ids:
+            print(f"{len(record_ids)} changed parks in {len(payloads)} webhook payloads")
+        if pending:
+            print(f"Retrying {len(pending)} parks pending from earlier rounds")
+        failed = self.reclassify(list(dict.fromkeys(list(pending) + record_ids))) if record_ids or pending else set()
+
+        still_pending = {}
+        for record_id in failed:
+            # A park that changed again starts its attempts over
+            attempts = 1 if record_id in record_ids else pending.get(record_id, 0) + 1
+            if attempts >= MAX_ATTEMPTS:
+                print(f"Giving up on park {record_id} after {attempts} failed rounds")
+                self.counts["given_up"] += 1
+            else:
+                still_pending[record_id] = attempts
+        if cursor != self.state["cursor"] or still_pending != pending:
+            self.state["cursor"] = cursor
+            self.state["pending"] = still_pending
+            save_state(self.state_path, self.state)
+
+    def reclassify(self, record_ids):
+        """Classify and write back the parks `record_ids`; returns the IDs of those that failed"""
+        found = update_regions.fetch_parks_by_id(record_ids)
+        if len(found) < len(record_ids):
+            print(f"{len(record_ids) - len(found)} changed parks no longer exist")
+        parks = [found[record_id] for record_id in record_ids if record_id in found]
+        if self.use_rules and self.use_geo and update_regions.geo_available():
+            update_regions.locate_parks(parks)
+
+        failed = set()
+        with update_regions.BulkRegionWriter(self.test_mode, self.batch_size, max_delay=1.0) as writer:
+            for park in parks:
+                # Classify from scratch; determine_region would keep the region the park already has
+                unassigned = copy.copy(park)
+                unassigned.regions = []
+                with update_regions.metrics.time("determine_region"):
+                    region = update_regions.determine_region(unassigned, self.test_mode, self.model, self.use_rules)
+                if not region:
+                    self.counts["errors"] += 1
+                    failed.add(park.id)
+                elif region == park.region:
+                    self.counts["unchanged"] += 1
+                else:
+                    update_regions.write_region(park.id, park.name, park.regions, region, self.test_mode, writer)
+                    self.counts["updated"] += 1
+        # The writer has already printed each failed write
+        self.counts["updated"] -= len(writer.failures)
+        self.counts["errors"] += len(writer.failures)
+        failed.update(failure["id"] for failure in writer.failures)
+        return failed
+
+    def refresh_if_due(self):
+        if time.time() - self.state.get("refreshed_at", 0) < REFRESH_INTERVAL:
+            return
+        response = self.airtable.refresh_webhook(self.state["webhook_id"])
+        if not response.ok:
+            print(f"Error refreshing webhook: {response.status_code} {response.text}")
+            return
+        self.state["expiration_time"] = response.json().get("expirationTime")
+        self.state["refreshed_at"] = time.time()
+        save_state(self.state_path, self.state)
+
+    def run(self, once=False):
+        """Run rounds on each ping (or poll) until stop() is called; `once` runs a single round"""
+        while not self.stopped.is_set():
+            try:
+                self.refresh_if_due()
+                self.run_round()
+            except Exception as e:  # keep the daemon up through Airtable outages; the cursor and pending parks were not saved
+                print(f"Error processing webhook payloads: {e}")
+            if once:
+                return
+            self.wake.wait(self.poll_interval)
+            if self.wake.is_set() and not self.stopped.is_set():
+                time.sleep(self.debounce)  # let a burst of edits arrive before the next round
+            self.wake.clear()
+
+    def stop(self):
+        self.stopped.set()
+        self.wake.set()
+
+    def delete(self):
+        """Delete the webhook and forget its state"""
+        if self.state.get("webhook_id"):
+            self.airtable.delete_webhook(self.state["webhook_id"])
+        if os.path.exists(self.state_path):
+            os.remove(self.state_path)
+
+def make_receiver(watcher):
+    """HTTP handler that wakes the watcher when Airtable pings the webhook's notification URL"""
+
+    class Receiver(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def reply(self, status, payload):
+            body = json.dumps(payload).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            if not watcher.verify(body, self.headers.get("X-Airtable-Content-MAC")):
+                self.reply(401, {"error": "invalid MAC"})
+                return
+            watcher.wake.set()
+            self.reply(200, {})
+
+        def do_GET(self):
+            # Health check for a load balancer or process supervisor
+            self.reply(200, {"webhook": watcher.state.get("webhook_id"), "cursor": watcher.state.get("cursor"),
+                             "pending": len(watcher.state.get("pending", {})), "counts": dict(watcher.counts)})
+
+    return Receiver
+
+def main(argv=None, prog=None):
+    """Run the daemon with `argv` (default: sys.argv[1:]); `prog` names it in the usage message"""
+    parser = argparse.ArgumentParser(prog=prog, description="Reclassify parks as they change, from an Airtable webhook")
+    parser.add_argument("--listen", type=str, help="HOST:PORT to receive Airtable's webhook pings on, e.g. 0.0.0.0:8080")
+    parser.add_argument("--public-url", type=str, help="URL Airtable should ping, reaching --listen (without it the daemon only polls)")
+    parser.add_argument("--poll-interval", type=float, default=60, help="Seconds between payload checks when no ping arrives (default: 60)")
+    parser.add_argument("--debounce", type=float, default=2, help="Seconds to wait after a ping so a burst of edits is handled together (default: 2)")
+    parser.add_argument("--state-path", type=str, default=DEFAULT_STATE_PATH, help="JSON file holding the webhook and its payload cursor")
+    parser.add_argument("--once", action="store_true", help="Handle the payloads waiting now and exit")
+    parser.add_argument("--delete-webhook", action="store_true", help="Delete the daemon's webhook and state file, then exit")
+    parser.add_argument("--test", action="store_true", help="Classify changed parks without updating Airtable")
+    parser.add_argument("--api-key", type=str, help="OpenAI API key (overrides env variable)")
+    parser.add_argument("--openai-base-url", type=str, help="OpenAI API base URL (default: OPENAI_BASE_URL or the public API)")
+    parser.add_argument("--model", type=str, default="gpt-4o", help="OpenAI model to use (default: gpt-4o)")
+    parser.add_argument("--no-rules", action="store_true", help="Send every park to the AI model, even when its states settle the region")
+    parser.add_argument("--no-geo", action="store_true", help="Don't place parks without states from their Latitude/Longitude")
+    parser.add_argument("--no-cache", action="store_true", help="Don't read or write the local cache of AI classifications")
+    parser.add_argument("--cache-path", type=str, default=DEFAULT_CACHE_PATH, help="SQLite file holding cached AI classifications")
+    parser.add_argument("--schema-path", type=str, default=DEFAULT_SCHEMA_PATH, help="JSON file caching the table schema used to validate writes")
+    parser.add_argument("--batch-size", type=int, default=10, help="Number of region updates sent per Airtable PATCH (default: 10)")
+    parser.add_argument("--airtable-rps", type=float, default=5, help="Max Airtable requests per second (default: 5)")
+    parser.add_argument("--openai-rpm", type=float, default=500, help="Max OpenAI requests per minute (default: 500)")
+    parser.add_argument("--openai-tpm", type=float, default=30000, help="Max OpenAI tokens per minute (default: 30000)")
+    args = parser.parse_args(argv)
+
+    if args.public_url and not args.listen:
+        parser.error("--public-url needs --listen, where the pings arrive")
+
+    watcher = RegionWatcher(args.state_path, args.public_url, args.poll_interval, args.debounce, args.test, args.model,
+                            not args.no_rules, not args.no_geo, args.batch_size)
+    update_regions.configure_rate_limits(args.airtable_rps, args.openai_rpm, args.openai_tpm)
+    if args.delete_webhook:
+        watcher.state = load_state(args.state_path)
+        watcher.delete()
+        print("Webhook deleted")
+        return
+
+    update_regions.configure_openai(args.api_key, args.openai_base_url)
+    if not args.no_cache:
+        update_regions.configure_cache(args.cache_path)
+    # The webhook watches fields by ID, so start from the current schema
+    update_regions.configure_schema(args.schema_path, refresh=True)
+    try:
+        watcher.setup()
+    except (RuntimeError, OSError) as e:
+        print(e)
+        sys.exit(1)
+
+    server = None
+    if args.listen:
+        host, _, port = args.listen.rpartition(":")
+        server = ThreadingHTTPServer((host or "0.0.0.0", int(port)), make_receiver(watcher))
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        print(f"Listening for webhook pings on {args.listen}")
+
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(signum, lambda *_: watcher.stop())
+    mode = "TEST MODE" if args.test else "UPDATE MODE"
+    print(f"Watching {update_regions.AIRTABLE_TABLE_NAME} for changes in {mode} (polling every {args.poll_interval:g}s)")
+    try:
+        watcher.run(once=args.once)
+    finally:
+        if server:
+            server.shutdown()
+            server.server_close()
+        print(f"Stopped: {watcher.counts['updated']} updated, {watcher.counts['unchanged']} unchanged, {watcher.counts['errors']} errors")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+import json
+
+from region_rules import REGION_MAPPING, REGIONS, parse_states
+
+# Tokens allowed for one park's details (name, states, location and description)
+DEFAULT_PARK_TOKENS = 160
+
+# Rough size of a token in characters, used when tiktoken is not installed
+CHARS_PER_TOKEN = 4
+
+# Tokens the chat format adds around each message
+MESSAGE_OVERHEAD_TOKENS = 4
+
+def state_mapping_text():
+    """REGION_MAPPING as the text listed in classification prompts"""
+    return "\n".join(f"{region}: {', '.join(states)}" for region, states in REGION_MAPPING.items())
+
+# Instructions shared by every classification prompt. They open the system
+# message, ahead of anything park-specific, so that every request starts with
+# the same prefix and the provider can reuse its cached prompt processing.
+INSTRUCTIONS = f"""You are a geography expert who categorizes US National Parks into geographic regions with high accuracy.
+
+US Geographic Regions and their states:
+{state_mapping_text()}
+
+Determine which region a park belongs to based on the park information, especially the state(s) it's located in.
+If the state information clearly puts a park in a specific region, that should be your primary consideration.
+If a park spans multiple regions, choose the most appropriate primary region.
+
+Valid region names: {', '.join(REGIONS)}"""
+
+SINGLE_SYSTEM_PROMPT = INSTRUCTIONS + "\n\nRespond with ONLY ONE of the valid region names, exactly as written."
+
+BATCH_SYSTEM_PROMPT = INSTRUCTIONS + """
+
+You will be given several parks, one JSON object per line. Respond with a JSON object of the form
+{"classifications": [{"record_id": "...", "region": "..."}, ...]} with one item per park, where each region is exactly one of the valid region names."""
+
+_encodings = {}
+
+def get_encoding(model="gpt-4o"):
+    """Return the tiktoken encoding for `model`, or None when token counts are estimated
+    
+    tiktoken is optional, and only imported the first time a prompt is
+    measured; without it token counts are estimated from the text length.
+    """
+    if model not in _encodings:
+        try:
+            import tiktoken
+        except ImportError:
+            _encodings[model] = None
+            return None
+        try:
+            _encodings[model] = tiktoken.encoding_for_model(model)
+        except KeyError:
+            _encodings[model] = tiktoken.get_encoding("o200k_base")
+        except Exception:  # the encoding files could not be loaded (e.g. offline)
+            _encodings[model] = None
+    return _encodings[model]
+
+def count_tokens(text, model="gpt-4o"):
+    encoding = get_encoding(model)
+    if encoding is None:
+        return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+    return len(encoding.encode(text))
+
+def truncate_to_tokens(text, max_tokens, model="gpt-4o"):
+    """Cut `text` down to at most `max_tokens` tokens, marking the cut with "..." """
+    if max_tokens <= 0:
+        return ""
+    if count_tokens(text, model) <= max_tokens:
+        return text
+
+    encoding = get_encoding(model)
+    if encoding is None:
+        return text[:max_tokens * CHARS_PER_TOKEN].rstrip() + "..."
+    return encoding.decode(encoding.encode(text)[:max_tokens]).rstrip() + "..."
+
+def message_tokens(messages, model="gpt-4o"):
+    """Count the prompt tokens of a list of chat messages"""
+    return sum(count_tokens(message["content"], model) + MESSAGE_OVERHEAD_TOKENS for message in messages)
+
+def park_details(fields, model="gpt-4o", park_tokens=DEFAULT_PARK_TOKENS):
+    """Return the details of a park sent to the model, fitted to `park_tokens`
+
+    The description is the only part that gets shortened: it gets whatever
+    is left of the budget after the name, states and location.
+    """
+    states_list = parse_states(fields)
+    states_string = fields.get("States", "")
+    lat = fields.get("Latitude", "")
+    lon = fields.get("Longitude", "")
+
+    details = {
+        "name": fields.get("Name", "Unknown Park"),
+        "states": ', '.join(states_list) if states_list else states_string if states_string else "Unknown",
+        "location": f"Latitude: {lat}, Longitude: {lon}" if lat and lon else "",
+    }
+    used = sum(count_tokens(value, model) for value in details.values())
+    details["description"] = truncate_to_tokens(fields.get("Description", ""), park_tokens - used, model)
+    return details
+
+def compile_single(fields, model="gpt-4o", park_tokens=DEFAULT_PARK_TOKENS):
+    """Build the messages asking for one park's region"""
+    details = park_details(fields, model, park_tokens)
+    lines = [f"- Name: {details['name']}", f"- States: {details['states']}"]
+    if details["location"]:
+        lines.append(f"- {details['location']}")
+    if details["description"]:
+        lines.append(f"- Description: {details['description']}")
+
+    return [
+        {"role": "system", "content": SINGLE_SYSTEM_PROMPT},
+        {"role": "user", "content": "Park Information:\n" + "\n".join(lines)}
+    ]
+
+def compile_batch(parks, model="gpt-4o", park_tokens=DEFAULT_PARK_TOKENS):
+    """Build the messages asking for the regions of several parks as JSON"""
+    lines = []
+    for park in parks:
+        details = park_details(park.fields, model, park_tokens)
+        entry = {"record_id": park.id, "name": details["name"], "states": details["states"]}
+        if details["location"]:
+            entry["location"] = details["location"]
+        if details["description"]:
+            entry["description"] = details["description"]
+        lines.append(json.dumps(entry))
+
+    return [
+        {"role": "system", "content": BATCH_SYSTEM_PROMPT},
+        {"role": "user", "content": "Parks:\n" + "\n".join(lines)}
+    ]
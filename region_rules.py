@@ -0,0 +1,79 @@
+from functools import lru_cache
+
+# US Geographic Regions with corresponding states - updated to match Airtable's options
+REGION_MAPPING = {
+    "Northeast": ["Maine", "New Hampshire", "Vermont", "Massachusetts", "Rhode Island", "Connecticut", "New York", "New Jersey", "Pennsylvania"],
+    "Midwest": ["Ohio", "Michigan", "Indiana", "Wisconsin", "Illinois", "Minnesota", "Iowa", "Missouri", "North Dakota", "South Dakota", "Nebraska", "Kansas"],
+    "South": ["Delaware", "Maryland", "Virginia", "West Virginia", "Kentucky", "North Carolina", "South Carolina", "Tennessee", "Georgia", "Florida", "Alabama", "Mississippi", "Arkansas", "Louisiana", "Oklahoma", "Texas"],
+    "West": ["Colorado", "Wyoming", "Montana", "Idaho", "Utah", "Nevada", "Washington", "Oregon", "California", "Arizona", "New Mexico"],
+    "Territories": ["Alaska", "Hawaii", "Puerto Rico", "Guam", "American Samoa", "U.S. Virgin Islands", "Northern Mariana Islands"]
+}
+
+# Just the region names for easier reference
+REGIONS = list(REGION_MAPPING.keys())
+
+# Reverse lookup, keyed by lower-case state name
+STATE_TO_REGION = {state.lower(): region for region, states in REGION_MAPPING.items() for state in states}
+
+# Confidence levels returned by classify_by_rules
+CONFIDENCE_HIGH = "high"        # every listed state maps to the same region
+CONFIDENCE_MIXED = "mixed"      # the listed states span more than one region
+CONFIDENCE_PARTIAL = "partial"  # some listed states are not in REGION_MAPPING
+CONFIDENCE_NONE = "none"        # no state information at all
+
+def parse_states(fields):
+    """Return the list of states for a park from `States (Multi)` or `States`"""
+    states_multi = fields.get("States (Multi)", [])
+    if states_multi:
+        return list(states_multi)
+
+    states_string = fields.get("States", "")
+    if states_string:
+        return list(split_states(states_string))
+    return []
+
+@lru_cache(maxsize=4096)
+def split_states(states_string):
+    """Split a comma-separated `States` value; cached, since parks share a small set of values"""
+    return tuple(state.strip() for state in states_string.split(',') if state.strip())
+
+def get_region_by_states(states_list):
+    """Try to determine a region based on the states a park is located in"""
+    if not states_list:
+        return None
+
+    region_counts = {region: 0 for region in REGIONS}
+
+    for state in states_list:
+        for region, states in REGION_MAPPING.items():
+            if state in states:
+                region_counts[region] += 1
+
+    # Find the region with the most states
+    max_count = 0
+    best_region = None
+    for region, count in region_counts.items():
+        if count > max_count:
+            max_count = count
+            best_region = region
+
+    return best_region if max_count > 0 else None
+
+def classify_by_rules(states_list):
+    """Classify a park from its states, returning (region, confidence)
+
+    The region is only returned with CONFIDENCE_HIGH when every state is known
+    and they all agree. For the other levels the region is the best guess from
+    get_region_by_states (or None) and the park should go to the AI model.
+    """
+    if not states_list:
+        return None, CONFIDENCE_NONE
+
+    regions = {STATE_TO_REGION.get(state.strip().lower()) for state in states_list}
+    best_guess = get_region_by_states(states_list)
+
+    if None in regions:
+        return best_guess, CONFIDENCE_PARTIAL
+    if len(regions) > 1:
+        return best_guess, CONFIDENCE_MIXED
+    return regions.pop(), CONFIDENCE_HIGH
@@ -0,0 +1,122 @@
+import os
+import json
+import time
+import uuid
+import threading
+
+# Default directory of run journals, kept next to the scripts
+DEFAULT_JOURNAL_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "region_runs")
+
+def new_run_id():
+    """A sortable, unique ID for a run, e.g. 20261018-104701-3fa2c1"""
+    return time.strftime("%Y%m%d-%H%M%S") + "-" + uuid.uuid4().hex[:6]
+
+class RunJournal:
+    """Append-only journal of one update_regions run
+
+    The first line records the run's options. Each later line records one
+    event for a park as it happens: the region it was classified with, and
+    whether writing that region to Airtable succeeded. Lines are flushed as
+    they are written, so the journal survives the process dying; a line cut
+    short by a crash is ignored when the journal is read back.
+
+    A resumed run appends to the same file. It skips parks whose region was
+    written and reuses the classification of parks whose write is still
+    pending or failed. In test mode nothing is written, so a classification
+    completes a park.
+    """
+
+    def __init__(self, path, run_id, options, records=None):
+        self.path = path
+        self.run_id = run_id
+        self.options = options
+        self.records = records or {}
+        self.lock = threading.Lock()
+        self.file = open(path, "a")
+
+    @classmethod
+    def create(cls, directory=DEFAULT_JOURNAL_DIR, options=None):
+        """Start the journal of a new run"""
+        os.makedirs(directory, exist_ok=True)
+        run_id = new_run_id()
+        journal = cls(os.path.join(directory, f"{run_id}.jsonl"), run_id, options or {})
+        journal._append({"run": run_id, "started_at": time.time(), "options": journal.options})
+        return journal
+
+    @classmethod
+    def resume(cls, run_id, directory=DEFAULT_JOURNAL_DIR):
+        """Reopen the journal of an earlier run, or return None if there is none"""
+        path = os.path.join(directory, f"{run_id}.jsonl")
+        if not os.path.exists(path):
+            return None
+
+        options = {}
+        records = {}
+        line = ""
+        with open(path) as f:
+            for line in f:
+                try:
+                    event = json.loads(line)
+                except ValueError:
+                    continue  # a line cut short when the run died
+                if "run" in event:
+                    options = event.get("options", options)
+                    continue
+                record_id = event.get("id")
+                if not record_id:
+                    continue
+                entry = records.setdefault(record_id, {"region": None, "status": None})
+                if event["status"] == "classified":
+                    entry["region"] = event.get("region")
+                entry["status"] = event["status"]
+
+        journal = cls(path, run_id, options, records)
+        if line and not line.endswith("\n"):
+            journal.file.write("\n")  # start after the cut-short line instead of extending it
+        journal._append({"run": run_id, "resumed_at": time.time()})
+        return journal
+
+    @classmethod
+    def attach(cls, run_id, directory=DEFAULT_JOURNAL_DIR):
+        """Append to the journal of a run another process started (a --workers worker)"""
+        return cls(os.path.join(directory, f"{run_id}.jsonl"), run_id, {})
+
+    def completed(self, record_id):
+        """True when an earlier attempt of this run finished the park"""
+        entry = self.records.get(record_id)
+        if not entry:
+            return False
+        if entry["status"] == "written":
+            return True
+        return bool(self.options.get("test") and entry["status"] == "classified" and entry["region"])
+
+    def region(self, record_id):
+        """The region an earlier attempt classified the park with, if any"""
+        entry = self.records.get(record_id)
+        return entry["region"] if entry else None
+
+    def classified(self, record_id, region):
+        self._append({"id": record_id, "status": "classified", "region": region})
+
+    def written(self, record_id, region, error=None):
+        """Record the result of writing a park's region; matches BulkRegionWriter's on_write"""
+        if error:
+            self._append({"id": record_id, "status": "failed", "region": region, "error": error})
+        else:
+            self._append({"id": record_id, "status": "written", "region": region})
+
+    def finish(self, counts):
+        self._append({"run": self.run_id, "finished_at": time.time(), "counts": dict(counts)})
+
+    def close(self):
+        with self.lock:
+            if not self.file.closed:
+                self.file.flush()
+                os.fsync(self.file.fileno())
+                self.file.close()
+
+    def _append(self, event):
+        line = json.dumps(event) + "\n"
+        with self.lock:
+            self.file.write(line)
+            self.file.flush()
@@ -0,0 +1,211 @@
+import os
+import json
+import time
+import threading
+from bisect import bisect_left
+from contextlib import contextmanager
+
+# Upper bounds (seconds) of the latency histogram buckets
+DEFAULT_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+class Histogram:
+    """Latency histogram with fixed buckets, as exported to Prometheus"""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self.counts = [0] * (len(self.buckets) + 1)  # the last slot is +Inf
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds):
+        self.counts[bisect_left(self.buckets, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+        self.max = max(self.max, seconds)
+
+    def cumulative(self):
+        """Yield (upper bound, observations at or below it), ending with +Inf"""
+        total = 0
+        for bound, count in zip(self.buckets + (float("inf"),), self.counts):
+            total += count
+            yield bound, total
+
+    def quantile(self, q):
+        """Estimate a quantile from the buckets (the upper bound of the bucket it falls in)"""
+        if not self.count:
+            return None
+        rank = q * self.count
+        for bound, total in self.cumulative():
+            if total >= rank:
+                return round(self.max if bound == float("inf") else min(bound, self.max), 6)
+        return round(self.max, 6)
+
+    def to_dict(self):
+        return {
+            "count": self.count,
+            "sum": round(self.sum, 6),
+            "mean": round(self.sum / self.count, 6) if self.count else None,
+            "max": round(self.max, 6),
+            "p50": self.quantile(0.5),
+            "p95": self.quantile(0.95),
+            "p99": self.quantile(0.99),
+            "buckets": {format_bound(bound): total for bound, total in self.cumulative()},
+        }
+
+def format_bound(bound):
+    return "+Inf" if bound == float("inf") else repr(float(bound))
+
+def format_labels(labels):
+    if not labels:
+        return ""
+    escaped = (
+        (name, str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"'))
+        for name, value in labels
+    )
+    return "{" + ",".join(f'{name}="{value}"' for name, value in escaped) + "}"
+
+class RunMetrics:
+    """Per-stage timings, counters and gauges of one script run
+
+    Stages are timed with `time(stage)`, which feeds a latency histogram per
+    stage. Counters and gauges carry labels as keyword arguments. The result
+    can be written as JSON, or in the Prometheus text format for
+    node_exporter's textfile collector. Safe to share between threads.
+    """
+
+    def __init__(self, prefix="park_regions", buckets=DEFAULT_BUCKETS):
+        self.prefix = prefix
+        self.buckets = buckets
+        self.started = time.time()
+        self.stages = {}
+        self.counters = {}
+        self.gauges = {}
+        self.help = {}
+        self.lock = threading.Lock()
+
+    @contextmanager
+    def time(self, stage):
+        """Time the body of a `with` block as one call of `stage`"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - started)
+
+    def observe(self, stage, seconds):
+        with self.lock:
+            if stage not in self.stages:
+                self.stages[stage] = Histogram(self.buckets)
+            self.stages[stage].observe(seconds)
+
+    def state(self):
+        """Raw stages and counters as plain data, for merging into another process's metrics"""
+        with self.lock:
+            return {
+                "stages": {
+                    stage: {"counts": histogram.counts, "count": histogram.count, "sum": histogram.sum, "max": histogram.max}
+                    for stage, histogram in self.stages.items()
+                },
+                "counters": [[name, list(labels), value] for (name, labels), value in self.counters.items()],
+                "help": dict(self.help),
+            }
+
+    def merge(self, state):
+        """Add the state() of another process (using the same buckets) to these metrics"""
+        with self.lock:
+            for stage, other in state["stages"].items():
+                if stage not in self.stages:
+                    self.stages[stage] = Histogram(self.buckets)
+                histogram = self.stages[stage]
+                histogram.counts = [mine + theirs for mine, theirs in zip(histogram.counts, other["counts"])]
+                histogram.count += other["count"]
+                histogram.sum += other["sum"]
+                histogram.max = max(histogram.max, other["max"])
+            for name, labels, value in state["counters"]:
+                key = (name, tuple(tuple(label) for label in labels))
+                self.counters[key] = self.counters.get(key, 0) + value
+            for name, text in state["help"].items():
+                self.help.setdefault(name, text)
+
+    def inc(self, name, amount=1, help=None, **labels):
+        """Add `amount` to a counter"""
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+            if help:
+                self.help[name] = help
+
+    def set_total(self, name, value, help=None, **labels):
+        """Set a counter to a total kept elsewhere (e.g. a client's own Counter)"""
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.counters[key] = value
+            if help:
+                self.help[name] = help
+
+    def set(self, name, value, help=None, **labels):
+        """Set a gauge"""
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.gauges[key] = value
+            if help:
+                self.help[name] = help
+
+    def to_dict(self):
+        """Return every metric as plain data, as written by write_json"""
+        with self.lock:
+            data = {
+                "started_at": self.started,
+                "duration_seconds": round(time.time() - self.started, 3),
+                "stages": {stage: histogram.to_dict() for stage, histogram in sorted(self.stages.items())},
+                "counters": {},
+                "gauges": {},
+            }
+            for kind, values in (("counters", self.counters), ("gauges", self.gauges)):
+                for (name, labels), value in sorted(values.items()):
+                    entry = data[kind].setdefault(name, {} if labels else value)
+                    if labels:
+                        entry[",".join(f"{label}={label_value}" for label, label_value in labels)] = value
+        return data
+
+    def write_json(self, path):
+        write_atomically(path, json.dumps(self.to_dict(), indent=2) + "\n")
+
+    def prometheus_text(self):
+        """Render every metric in the Prometheus text exposition format"""
+        lines = []
+        with self.lock:
+            if self.stages:
+                name = f"{self.prefix}_stage_duration_seconds"
+                lines.append(f"# HELP {name} Time spent per call in each stage of the run")
+                lines.append(f"# TYPE {name} histogram")
+                for stage, histogram in sorted(self.stages.items()):
+                    for bound, total in histogram.cumulative():
+                        lines.append(f"{name}_bucket{format_labels([('stage', stage), ('le', format_bound(bound))])} {total}")
+                    lines.append(f"{name}_sum{format_labels([('stage', stage)])} {histogram.sum:.6f}")
+                    lines.append(f"{name}_count{format_labels([('stage', stage)])} {histogram.count}")
+
+            for kind, values in (("counter", self.counters), ("gauge", self.gauges)):
+                by_name = {}
+                for (name, labels), value in values.items():
+                    by_name.setdefault(name, []).append((labels, value))
+                for name, samples in sorted(by_name.items()):
+                    # Prometheus counters end in _total
+                    full_name = f"{self.prefix}_{name}" + ("_total" if kind == "counter" and not name.endswith("_total") else "")
+                    if name in self.help:
+                        lines.append(f"# HELP {full_name} {self.help[name]}")
+                    lines.append(f"# TYPE {full_name} {kind}")
+                    for labels, value in sorted(samples):
+                        lines.append(f"{full_name}{format_labels(labels)} {value}")
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path):
+        write_atomically(path, self.prometheus_text())
+
+def write_atomically(path, text):
+    """Write a file through a temporary file so readers never see it half-written"""
+    temporary = f"{path}.{os.getpid()}.tmp"
+    with open(temporary, "w") as f:
+        f.write(text)
+    os.replace(temporary, path)
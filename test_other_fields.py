@@ -1,7 +1,8 @@
 import os
-import requests
 from dotenv import load_dotenv
 
+from airtable_client import AirtableClient
+
 # Load environment variables
 load_dotenv()
 
@@ -10,19 +11,14 @@ AIRTABLE_TOKEN = os.getenv("AIRTABLE_TOKEN") or "patWxqsOH8eCEVx7Y.2e2fa79f47ca8
 AIRTABLE_BASE_ID = os.getenv("AIRTABLE_BASE_ID") or "appJLgVdJISZ38p3R"
 AIRTABLE_TABLE_NAME = os.getenv("AIRTABLE_TABLE_NAME") or "national-parks"
 
+airtable = AirtableClient(AIRTABLE_TOKEN, AIRTABLE_BASE_ID, AIRTABLE_TABLE_NAME)
+
 # Test record ID
 TEST_RECORD_ID = "rec1SFV71vDup9XIP"  # Colonial National Historical Park in Virginia
 
 def fetch_record(record_id):
     """Fetch a single record to see what fields it has"""
-    url = f"https://api.airtable.com/v0/{AIRTABLE_BASE_ID}/{AIRTABLE_TABLE_NAME}/{record_id}"
-    
-    headers = {
-        "Authorization": f"Bearer {AIRTABLE_TOKEN}",
-        "Content-Type": "application/json"
-    }
-    
-    response = requests.get(url, headers=headers)
+    response = airtable.get_record(record_id)
     
     if response.ok:
         data = response.json()
@@ -37,14 +33,7 @@ def fetch_record(record_id):
 
 def fetch_all_fields():
     """Fetch the first few records to identify all field names"""
-    url = f"https://api.airtable.com/v0/{AIRTABLE_BASE_ID}/{AIRTABLE_TABLE_NAME}?maxRecords=10"
-    
-    headers = {
-        "Authorization": f"Bearer {AIRTABLE_TOKEN}",
-        "Content-Type": "application/json"
-    }
-    
-    response = requests.get(url, headers=headers)
+    response = airtable.list_records(maxRecords=10)
     
     if response.ok:
         data = response.json()
@@ -66,21 +55,8 @@ def fetch_all_fields():
 
 def test_update_other_field(record_id, field_name, field_value):
     """Test updating a different field"""
-    url = f"https://api.airtable.com/v0/{AIRTABLE_BASE_ID}/{AIRTABLE_TABLE_NAME}/{record_id}"
-    
-    headers = {
-        "Authorization": f"Bearer {AIRTABLE_TOKEN}",
-        "Content-Type": "application/json"
-    }
-    
-    data = {
-        "fields": {
-            field_name: field_value
-        }
-    }
-    
     print(f"Testing update of field '{field_name}' with value: '{field_value}'")
-    response = requests.patch(url, headers=headers, json=data)
+    response = airtable.update_record(record_id, {field_name: field_value})
     
     if response.ok:
         print(f"✅ SUCCESS! Update successful!")
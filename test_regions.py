@@ -1,7 +1,9 @@
 import os
-import requests
 from dotenv import load_dotenv
 
+from airtable_client import AirtableClient
+from airtable_schema import SchemaCache
+
 # Load environment variables
 load_dotenv()
 
@@ -10,6 +12,8 @@ AIRTABLE_TOKEN = os.getenv("AIRTABLE_TOKEN") or "patWxqsOH8eCEVx7Y.2e2fa79f47ca8
 AIRTABLE_BASE_ID = os.getenv("AIRTABLE_BASE_ID") or "appJLgVdJISZ38p3R"
 AIRTABLE_TABLE_NAME = os.getenv("AIRTABLE_TABLE_NAME") or "national-parks"
 
+airtable = AirtableClient(AIRTABLE_TOKEN, AIRTABLE_BASE_ID, AIRTABLE_TABLE_NAME)
+
 # Test record ID and various forms of region names
 TEST_RECORD_ID = "rec1SFV71vDup9XIP"  # Colonial National Historical Park in Virginia
 
@@ -37,23 +41,20 @@ REGION_FORMATS = [
     ["1-Northeast", "2-Midwest", "3-South", "4-West", "5-Territories"],
 ]
 
-def test_update_region(record_id, region_value):
-    """Test updating a specific record with a region value"""
-    url = f"https://api.airtable.com/v0/{AIRTABLE_BASE_ID}/{AIRTABLE_TABLE_NAME}/{record_id}"
-    
-    headers = {
-        "Authorization": f"Bearer {AIRTABLE_TOKEN}",
-        "Content-Type": "application/json"
-    }
-    
-    data = {
-        "fields": {
-            "Region": region_value
-        }
-    }
+def test_update_region(record_id, region_value, table=None):
+    """Test updating a specific record with a region value
     
+    With the table schema, values that aren't Region options are rejected
+    here instead of by a failed PATCH.
+    """
     print(f"Testing update with region value: '{region_value}'")
-    response = requests.patch(url, headers=headers, json=data)
+    if table and table.field_type("Region") == "multipleSelects":
+        region_value = [region_value]  # a multi-select field only takes a list of options
+    problems = table.validate({"Region": region_value}) if table else None
+    if problems:
+        print(f"❌ NOT AN OPTION: {'; '.join(problems)}")
+        return False
+    response = airtable.update_record(record_id, {"Region": region_value})
     
     if response.ok:
         print(f"✅ SUCCESS! Update successful!")
@@ -69,6 +70,14 @@ def test_all_formats():
     success_count = 0
     total_tests = 0
     
+    # The cached schema lists the Region options, so only those need a live PATCH
+    try:
+        table = SchemaCache().table(airtable)
+        print(f"Region options in the schema: {', '.join(table.choices('Region'))}")
+    except RuntimeError as e:
+        print(f"{e}; every format will be tried against Airtable")
+        table = None
+    
     # First, test the exact values one by one (most likely match)
     print("\n=== Testing exact values for the 'South' region ===")
     
@@ -80,7 +89,7 @@ def test_all_formats():
     
     for south_format in south_formats:
         total_tests += 1
-        if test_update_region(TEST_RECORD_ID, south_format):
+        if test_update_region(TEST_RECORD_ID, south_format, table):
             success_count += 1
             print(f"Found working format: '{south_format}'")
     
@@ -91,7 +100,7 @@ def test_all_formats():
             print(f"\nTrying format set: {format_set}")
             for region in format_set:
                 total_tests += 1
-                if test_update_region(TEST_RECORD_ID, region):
+                if test_update_region(TEST_RECORD_ID, region, table):
                     success_count += 1
     
     print(f"\nCompleted {total_tests} tests with {success_count} successes")
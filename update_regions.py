@@ -1,15 +1,42 @@
 import os
+import sys
 import json
 import time
+import atexit
+import hashlib
+import shutil
+import asyncio
 import argparse
+import tempfile
+import threading
+import subprocess
+from collections import Counter, deque
+from datetime import datetime, timezone
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
-import openai
 import requests
-from tqdm import tqdm
+
+from airtable_client import AirtableClient
+from airtable_schema import SchemaCache, DEFAULT_SCHEMA_PATH, region_option_problems
+from airtable_mirror import ParksMirror, DEFAULT_MIRROR_PATH, SYNC_OVERLAP
+from region_cache import ClassificationCache, DEFAULT_CACHE_PATH, cache_key
+from region_prompt import DEFAULT_PARK_TOKENS, compile_batch, compile_single, message_tokens, park_details
+from rate_limit import RateLimiter, SharedRateLimiter
+from run_metrics import RunMetrics, write_atomically
+from run_journal import RunJournal, DEFAULT_JOURNAL_DIR
+from airtable_targets import load_targets, print_targets_table
+from park_record import ParkRecord, configure_description_limit, loads, parse_page
+from region_rules import REGIONS, CONFIDENCE_HIGH, CONFIDENCE_NONE, parse_states, get_region_by_states, classify_by_rules
 
 # Load environment variables
 load_dotenv()
 
+# Default state file of `batch` runs; the JSONL request file is written next to it
+DEFAULT_BATCH_STATE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "region_batch.json")
+
+# Default plan file written by `plan` runs and read by `apply`
+DEFAULT_PLAN_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "region_plan.json")
+
 # Parse command line arguments early to get API key
 parser = argparse.ArgumentParser(description="Update National Park regions in Airtable using AI")
 parser.add_argument("--test", action="store_true", help="Run in test mode without updating Airtable")
@@ -19,161 +46,514 @@ parser.add_argument("--name", type=str, help="Process only parks matching this n
 parser.add_argument("--force", action="store_true", help="Force region reassignment even if already set")
 parser.add_argument("--api-key", type=str, help="OpenAI API key (overrides env variable)")
 parser.add_argument("--model", type=str, default="gpt-4o", help="OpenAI model to use (default: gpt-4o)")
+parser.add_argument("--no-rules", action="store_true", help="Send every park to the AI model, even when its states settle the region")
+parser.add_argument("--no-geo", action="store_true", help="Don't place parks without states from their Latitude/Longitude")
+parser.add_argument("--no-cache", action="store_true", help="Don't read or write the local cache of AI classifications")
+parser.add_argument("--cache-path", type=str, default=DEFAULT_CACHE_PATH, help="SQLite file holding cached AI classifications")
+parser.add_argument("--cache-ttl-days", type=float, default=30, help="Days before a cached classification expires (default: 30)")
+parser.add_argument("--cache-max-entries", type=int, default=10000, help="Maximum number of cached classifications (default: 10000)")
+parser.add_argument("--source", choices=["api", "mirror"], default="api", help="Read parks from the Airtable API or from the local mirror (default: api)")
+parser.add_argument("--mirror-path", type=str, default=DEFAULT_MIRROR_PATH, help="SQLite file holding the local mirror of the parks table")
+parser.add_argument("--full-sync", action="store_true", help="Re-download the whole table into the local mirror before reading it")
+parser.add_argument("--verify-report", action="store_true", help="Also re-read the whole table after updating to verify the regions report")
+parser.add_argument("--park-tokens", type=int, default=DEFAULT_PARK_TOKENS, help=f"Token budget for one park's details in a prompt; longer descriptions are cut (default: {DEFAULT_PARK_TOKENS})")
+parser.add_argument("--ai-batch-size", type=int, default=1, help="Parks classified per OpenAI request (default: 1, one park per request)")
+parser.add_argument("--async", dest="use_async", action="store_true", help="Classify and update parks concurrently")
+parser.add_argument("--concurrency", type=int, default=8, help="Number of parks processed at once in --async mode (default: 8)")
+parser.add_argument("--workers", type=int, default=1, help="Number of worker processes that share out the parks and the rate limits (default: 1)")
+parser.add_argument("--targets", type=str, help="JSON file listing Airtable base/table pairs to process concurrently, each within its own base's rate limit")
+parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)  # run as a --workers worker, reading parks from stdin
+parser.add_argument("--shared-limits", type=str, help=argparse.SUPPRESS)  # SQLite file of the rate limiters shared by the workers
+parser.add_argument("--journal-run", type=str, help=argparse.SUPPRESS)  # run whose journal a worker appends to
+parser.add_argument("--worker-result", type=str, help=argparse.SUPPRESS)  # file a worker writes its outcomes to
+parser.add_argument("--target-result", type=str, help=argparse.SUPPRESS)  # file a --targets run writes its totals to
+parser.add_argument("--batch-size", type=int, default=10, help="Number of region updates sent per Airtable PATCH (default: 10, Airtable's maximum)")
+parser.add_argument("--flush-interval", type=float, default=5.0, help="Seconds a queued region update may wait before it is written (default: 5)")
+parser.add_argument("--airtable-rps", type=float, default=5, help="Max Airtable requests per second (default: 5, Airtable's per-base limit)")
+parser.add_argument("--openai-rpm", type=float, default=500, help="Max OpenAI requests per minute until OpenAI reports the account's limit (default: 500)")
+parser.add_argument("--openai-tpm", type=float, default=30000, help="Max OpenAI tokens per minute until OpenAI reports the account's limit (default: 30000)")
+parser.add_argument("--no-adaptive", action="store_true", help="Keep the rate limits fixed instead of adapting them to 429s, rate-limit headers and latency")
+parser.add_argument("--resume", type=str, metavar="RUN_ID", help="Resume an interrupted run: skip parks it finished and retry pending or failed ones")
+parser.add_argument("--journal-dir", type=str, default=DEFAULT_JOURNAL_DIR, help="Directory holding the run journals used by --resume")
+parser.add_argument("--no-journal", action="store_true", help="Don't keep a journal of this run")
+parser.add_argument("--metrics-json", type=str, help="Write per-stage timings and run counters to this JSON file")
+parser.add_argument("--metrics-prom", type=str, help="Write the run metrics to this Prometheus textfile (e.g. for node_exporter's textfile collector)")
+parser.add_argument("--schema-path", type=str, default=DEFAULT_SCHEMA_PATH, help="JSON file caching the table schema used to validate writes")
+parser.add_argument("--schema-ttl-hours", type=float, default=24, help="Hours before the cached table schema is fetched again (default: 24)")
+parser.add_argument("--refresh-schema", action="store_true", help="Fetch the table schema now instead of using the cached copy")
+parser.add_argument("--openai-base-url", type=str, help="OpenAI API base URL, e.g. a local stand-in (default: OPENAI_BASE_URL or the public API)")
 
-args, _ = parser.parse_known_args()  # Parse known args to get API key
+commands = parser.add_subparsers(dest="command", metavar="command")
+batch_parser = commands.add_parser("batch", help="Reclassify parks offline with the OpenAI Batch API; run options go before 'batch'")
+batch_parser.add_argument("action", choices=["submit", "status", "apply"], help="submit the prompts, check on the batch, or write its results to Airtable")
+batch_parser.add_argument("--state-file", type=str, default=DEFAULT_BATCH_STATE_PATH, help="JSON file tracking the submitted batch")
+batch_parser.add_argument("--wait", action="store_true", help="With status, poll until the batch has finished")
+batch_parser.add_argument("--poll-interval", type=float, default=60, help="Seconds between status polls with --wait (default: 60)")
+plan_parser = commands.add_parser("plan", help="Classify parks and save the region changes to a plan file instead of writing them; run options go before 'plan'")
+plan_parser.add_argument("--plan-file", type=str, default=DEFAULT_PLAN_PATH, help="JSON file the plan is written to")
+apply_parser = commands.add_parser("apply", help="Write the region changes of a plan to Airtable, skipping parks changed since it was made")
+apply_parser.add_argument("--plan-file", type=str, default=DEFAULT_PLAN_PATH, help="JSON file holding the plan")
 
 # Airtable API configuration
 AIRTABLE_TOKEN = os.getenv("AIRTABLE_TOKEN") or "patWxqsOH8eCEVx7Y.2e2fa79f47ca86b071c4b5114ceed5a5f9d8124d162bec76b2109882bb0625f2"
 AIRTABLE_BASE_ID = os.getenv("AIRTABLE_BASE_ID") or "appJLgVdJISZ38p3R"
 AIRTABLE_TABLE_NAME = os.getenv("AIRTABLE_TABLE_NAME") or "national-parks"
 
-# OpenAI configuration
-OPENAI_API_KEY = args.api_key or os.getenv("OPENAI_API_KEY")
-if not OPENAI_API_KEY:
-    raise ValueError("OpenAI API key is required. Provide it via --api-key parameter or OPENAI_API_KEY environment variable.")
-
-# Configure OpenAI client
-client = openai.OpenAI(api_key=OPENAI_API_KEY)
-
-# US Geographic Regions with corresponding states - updated to match Airtable's options
-REGION_MAPPING = {
-    "Northeast": ["Maine", "New Hampshire", "Vermont", "Massachusetts", "Rhode Island", "Connecticut", "New York", "New Jersey", "Pennsylvania"],
-    "Midwest": ["Ohio", "Michigan", "Indiana", "Wisconsin", "Illinois", "Minnesota", "Iowa", "Missouri", "North Dakota", "South Dakota", "Nebraska", "Kansas"],
-    "South": ["Delaware", "Maryland", "Virginia", "West Virginia", "Kentucky", "North Carolina", "South Carolina", "Tennessee", "Georgia", "Florida", "Alabama", "Mississippi", "Arkansas", "Louisiana", "Oklahoma", "Texas"],
-    "West": ["Colorado", "Wyoming", "Montana", "Idaho", "Utah", "Nevada", "Washington", "Oregon", "California", "Arizona", "New Mexico"],
-    "Territories": ["Alaska", "Hawaii", "Puerto Rico", "Guam", "American Samoa", "U.S. Virgin Islands", "Northern Mariana Islands"]
-}
+# OpenAI configuration (see configure_openai); the client is only created when a park needs the AI model
+OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+OPENAI_BASE_URL = None
+openai_client_lock = threading.Lock()
+_openai_client = None
+
+# Command line of this run, passed on to --workers and --targets child processes (see main)
+command_arguments = sys.argv[1:]
+
+# Per-stage timings and counters of this run (see export_metrics)
+metrics = RunMetrics()
+
+def count_openai_response(response):
+    """Count every HTTP response the OpenAI client receives, including the ones it retries"""
+    metrics.inc("openai_responses", help="HTTP responses received from OpenAI, including retried ones", status=response.status_code)
+
+def header_number(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+def observe_openai_response(response):
+    """Pass the quota OpenAI reports in its x-ratelimit-* headers, and its 429s, to the OpenAI limiters"""
+    limiters = {"requests": openai_request_limiter, "tokens": openai_token_limiter}
+    exhausted = []
+    for kind, limiter in limiters.items():
+        limit = header_number(response.headers.get(f"x-ratelimit-limit-{kind}"))
+        remaining = header_number(response.headers.get(f"x-ratelimit-remaining-{kind}"))
+        limiter.observe_quota(limit, remaining)
+        if remaining is not None and remaining < 1:
+            exhausted.append(limiter)
+    if response.status_code == 429 or "retry-after" in response.headers:
+        # Slow down whichever quota ran out, or both when OpenAI doesn't say
+        reason = "OpenAI returned 429" if response.status_code == 429 else f"OpenAI sent Retry-After {response.headers['retry-after']}"
+        for limiter in exhausted or limiters.values():
+            limiter.throttled(reason)
+
+def openai_call_succeeded(started, usage, kind="single"):
+    """Report a completed OpenAI call, sent at `started` (time.monotonic()), to the OpenAI limiters"""
+    openai_request_limiter.succeeded(time.monotonic() - started, kind=kind)
+    if usage:
+        openai_token_limiter.succeeded(amount=usage.prompt_tokens + usage.completion_tokens)
+
+def configure_openai(api_key=None, base_url=None, require_key=True):
+    """Set the OpenAI key (default: OPENAI_API_KEY) and base URL
+    
+    Raises ValueError when there is no key, unless `require_key` is false
+    (for commands that never call the model); openai_client() then raises
+    it if a park needs the model after all.
+    """
+    global OPENAI_API_KEY, OPENAI_BASE_URL, _openai_client
+    OPENAI_API_KEY = api_key or os.getenv("OPENAI_API_KEY")
+    OPENAI_BASE_URL = base_url
+    _openai_client = None
+    if require_key and not OPENAI_API_KEY:
+        raise ValueError("OpenAI API key is required. Provide it via --api-key parameter or OPENAI_API_KEY environment variable.")
+
+def openai_client():
+    """Return the OpenAI client, importing openai and creating the client on first use
+    
+    Importing openai takes about a second, which runs that only touch
+    Airtable, or settle every park with the rules, never need to pay.
+    """
+    global _openai_client
+    with openai_client_lock:
+        if _openai_client is None:
+            if not OPENAI_API_KEY:
+                raise ValueError("OpenAI API key is required. Provide it via --api-key parameter or OPENAI_API_KEY environment variable.")
+            import openai
+            _openai_client = openai.OpenAI(
+                api_key=OPENAI_API_KEY,
+                base_url=OPENAI_BASE_URL,
+                http_client=openai.DefaultHttpxClient(event_hooks={"response": [count_openai_response, observe_openai_response]})
+            )
+        return _openai_client
+
+# Rate limits shared by every Airtable and OpenAI call site (see configure_rate_limits)
+airtable_limiter = RateLimiter(5, per=1.0, name="airtable")
+openai_request_limiter = RateLimiter(500, per=60.0, name="openai-requests")
+openai_token_limiter = RateLimiter(30000, per=60.0, name="openai-tokens")
+
+# An adaptive limiter never drops below this share of its configured limit
+ADAPTIVE_MIN_SHARE = 0.1
+
+# Pooled Airtable client shared by every Airtable call site
+airtable = AirtableClient(AIRTABLE_TOKEN, AIRTABLE_BASE_ID, AIRTABLE_TABLE_NAME, limiter=airtable_limiter)
+
+# Airtable accepts at most this many records per batch PATCH
+AIRTABLE_BATCH_LIMIT = 10
+
+# How many parks each classification path handled (see determine_region)
+classification_paths = Counter()
+classification_lock = threading.Lock()
+
+# OpenAI requests sent, parks classified through batched prompts, and tokens used
+openai_usage = Counter()
+
+# Cache of AI classifications, enabled by main (see configure_cache)
+classification_cache = None
+
+# Journal of the current run, enabled by main (see configure_journal)
+run_journal = None
+
+# Schema of the parks table that writes are checked against, loaded by main (see configure_schema)
+table_schema = None
+
+# Bump whenever the classification prompt changes so cached answers are not reused
+PROMPT_VERSION = 2
 
-# Just the region names for easier reference
-REGIONS = list(REGION_MAPPING.keys())
+# Token budget of one park's details in a prompt (see configure_prompts)
+park_token_budget = DEFAULT_PARK_TOKENS
+
+# Upper bound on completion tokens requested per classification
+MAX_COMPLETION_TOKENS = 10
+
+# Completion tokens allowed per park in a batched classification ({"record_id": ..., "region": ...})
+BATCH_TOKENS_PER_PARK = 25
+
+# The only fields determine_region and process_park read; the rest stay on the server
+PARK_FIELDS = ["Name", "States", "States (Multi)", "Latitude", "Longitude", "Description", "Region"]
+
+def configure_rate_limits(airtable_rps=5, openai_rpm=500, openai_tpm=30000, shared_path=None, adaptive=False):
+    """Replace the module rate limiters with the configured limits
+    
+    With `shared_path` the limiters are kept in that SQLite file, so every
+    process using it stays within the limits together. Airtable's limit is
+    per base, so processes working on different bases get separate buckets.
+    
+    `adaptive` limiters start at the configured limits, slow down when an
+    API pushes back and speed up again while it doesn't (see RateLimiter).
+    Airtable's never go beyond `airtable_rps`, its documented per-base
+    limit; OpenAI's go up to the quota OpenAI reports for the account.
+    """
+    global airtable_limiter, openai_request_limiter, openai_token_limiter
+    
+    def limiter(rate, per, burst=None, name="limiter", bucket=None, max_rate=None):
+        min_rate = rate * ADAPTIVE_MIN_SHARE if adaptive else None
+        if shared_path:
+            return SharedRateLimiter(shared_path, rate, per, burst, name, bucket, min_rate, max_rate)
+        return RateLimiter(rate, per, burst, name, min_rate, max_rate)
+    
+    airtable_limiter = limiter(airtable_rps, per=1.0, burst=max(1, int(airtable_rps)), name="airtable", bucket=f"airtable:{AIRTABLE_BASE_ID}")
+    airtable.limiter = airtable_limiter
+    openai_request_limiter = limiter(openai_rpm, per=60.0, name="openai-requests", max_rate=float("inf"))
+    openai_token_limiter = limiter(openai_tpm, per=60.0, name="openai-tokens", max_rate=float("inf"))
+
+def rate_limits_status():
+    """The current rate of each limiter, e.g. for the progress bar: airtable 5/s, openai-requests 500/min, ..."""
+    return ", ".join(f"{limiter.name} {limiter.format_rate()}" for limiter in (airtable_limiter, openai_request_limiter, openai_token_limiter))
+
+def configure_cache(path=DEFAULT_CACHE_PATH, ttl_days=30, max_entries=10000, purge=True):
+    """Open the persistent classification cache used by determine_region
+    
+    Expired entries are deleted as the cache is opened (unless `purge` is
+    false, as in worker processes, whose parent has done it), so they don't
+    linger in the file until max_entries evicts them.
+    """
+    global classification_cache
+    classification_cache = ClassificationCache(path, ttl_seconds=ttl_days * 24 * 3600, max_entries=max_entries)
+    if purge:
+        purged = classification_cache.purge_expired()
+        if purged:
+            print(f"Removed {purged} expired classifications from the cache")
+    return classification_cache
+
+def configure_journal(directory=DEFAULT_JOURNAL_DIR, options=None, resume=None, attach=None):
+    """Start the journal of this run, reopen the journal of the run being resumed,
+    or (in a worker) append to the journal of the parent's run"""
+    global run_journal
+    if attach:
+        run_journal = RunJournal.attach(attach, directory)
+    elif resume:
+        run_journal = RunJournal.resume(resume, directory)
+    else:
+        run_journal = RunJournal.create(directory, options)
+    return run_journal
+
+def configure_schema(path=DEFAULT_SCHEMA_PATH, ttl_hours=24, refresh=False, check_regions=True):
+    """Load the parks table's schema (from the local cache while it is fresh) to validate writes against
+    
+    With `check_regions`, warns when the Region options of the table don't
+    match REGIONS. If the schema can't be fetched, writes go out unchecked.
+    """
+    global table_schema
+    try:
+        table_schema = SchemaCache(path, ttl_seconds=ttl_hours * 3600).table(airtable, refresh)
+    except (RuntimeError, requests.RequestException) as e:
+        print(f"{e}; region writes will not be checked before they are sent")
+        table_schema = None
+        return None
+    if check_regions:
+        for problem in region_option_problems(table_schema, REGIONS):
+            print(f"Warning: {problem}")
+    return table_schema
+
+def schema_problem(fields):
+    """Why the table schema rejects a write of `fields`, or None if it doesn't (or no schema is loaded)"""
+    if table_schema is None:
+        return None
+    problems = table_schema.validate(fields)
+    return "; ".join(problems) if problems else None
+
+def configure_prompts(park_tokens=DEFAULT_PARK_TOKENS):
+    """Set the token budget of one park's details in classification prompts"""
+    global park_token_budget
+    park_token_budget = park_tokens
+    configure_description_limit(park_tokens)
+
+def record_usage(usage):
+    """Add the token usage reported with an OpenAI response to the run totals"""
+    if not usage:
+        return
+    if not isinstance(usage, dict):
+        usage = usage.model_dump()
+    details = usage.get("prompt_tokens_details") or {}
+    with classification_lock:
+        openai_usage["prompt_tokens"] += usage.get("prompt_tokens") or 0
+        openai_usage["completion_tokens"] += usage.get("completion_tokens") or 0
+        openai_usage["cached_tokens"] += details.get("cached_tokens") or 0
+
+def formula_string(value):
+    """Quote a value as a string literal for an Airtable formula"""
+    return '"' + str(value).replace("\\", "\\\\").replace('"', '\\"') + '"'
+
+def build_park_formula(name_filter=None, unassigned_only=False):
+    """Build the filterByFormula matching --name and, unless forcing, parks without a region"""
+    conditions = []
+    if name_filter:
+        conditions.append(f"FIND(LOWER({formula_string(name_filter)}), LOWER({{Name}}))")
+    if unassigned_only:
+        conditions.append("{Region}=BLANK()")
+    
+    if not conditions:
+        return None
+    if len(conditions) == 1:
+        return conditions[0]
+    return f"AND({', '.join(conditions)})"
 
-def fetch_parks(offset=None, limit=None):
-    """Fetch parks from Airtable with pagination support"""
-    url = f"https://api.airtable.com/v0/{AIRTABLE_BASE_ID}/{AIRTABLE_TABLE_NAME}"
+def fetch_parks(offset=None, limit=None, formula=None, fields=None):
+    """Fetch parks from Airtable with pagination support
     
+    `formula` is passed as filterByFormula and `fields` as fields[], so
+    filtering and field selection happen on Airtable's side. Returns the
+    page as ParkRecords, with the offset of the next page.
+    """
     params = {
         "pageSize": min(limit, 100) if limit else 100  # Airtable maximum
     }
     
+    if limit:
+        params["maxRecords"] = limit
+    if formula:
+        params["filterByFormula"] = formula
+    if fields:
+        params["fields[]"] = fields
     if offset:
         params["offset"] = offset
     
-    headers = {
-        "Authorization": f"Bearer {AIRTABLE_TOKEN}",
-        "Content-Type": "application/json"
-    }
-    
-    response = requests.get(url, headers=headers, params=params)
+    with metrics.time("airtable_fetch"):
+        response = airtable.list_records(**params)
     
     if not response.ok:
         print(f"Error fetching data: {response.status_code} {response.text}")
         return [], None
     
-    data = response.json()
-    return data.get("records", []), data.get("offset")
+    parks, offset = parse_page(response.content)
+    metrics.inc("records_fetched", len(parks), help="Park records read from Airtable")
+    return parks, offset
 
-def get_region_by_states(states_list):
-    """Try to determine a region based on the states a park is located in"""
-    if not states_list:
+def fetch_park(record_id):
+    """Fetch a single park by its Airtable record ID"""
+    with metrics.time("airtable_fetch"):
+        response = airtable.get_record(record_id)
+    if not response.ok:
+        print(f"Error fetching park with ID {record_id}: {response.status_code} {response.text}")
         return None
-        
-    region_counts = {region: 0 for region in REGIONS}
-    
-    for state in states_list:
-        for region, states in REGION_MAPPING.items():
-            if state in states:
-                region_counts[region] += 1
-    
-    # Find the region with the most states
-    max_count = 0
-    best_region = None
-    for region, count in region_counts.items():
-        if count > max_count:
-            max_count = count
-            best_region = region
-    
-    return best_region if max_count > 0 else None
-
-def determine_region(park_data, test_mode=False, model="gpt-4o"):
-    """Use AI to determine the region of a park based on its data"""
-    fields = park_data.get("fields", {})
-    park_name = fields.get("Name", "Unknown Park")
-    states_string = fields.get("States", "")
-    states_multi = fields.get("States (Multi)", [])
-    lat = fields.get("Latitude", "")
-    lon = fields.get("Longitude", "")
-    description = fields.get("Description", "")
+    return ParkRecord.from_api(loads(response.content))
+
+# Record IDs looked up per list request by fetch_parks_by_id, keeping the formula well within URL limits
+IDS_PER_REQUEST = 100
+
+def fetch_parks_by_id(record_ids):
+    """Return {record_id: park} for the parks among `record_ids` that still exist
+    
+    The IDs are looked up through the list endpoint, up to 100 per request
+    with an OR(RECORD_ID()=...) formula, rather than with one GET each.
+    Raises RuntimeError if a page can't be read.
+    """
+    parks = {}
+    for start in range(0, len(record_ids), IDS_PER_REQUEST):
+        chunk = record_ids[start:start + IDS_PER_REQUEST]
+        formula = "OR(" + ",".join(f"RECORD_ID()='{record_id}'" for record_id in chunk) + ")"
+        params = {"pageSize": 100, "filterByFormula": formula, "fields[]": PARK_FIELDS}
+        while True:
+            with metrics.time("airtable_fetch"):
+                response = airtable.list_records(**params)
+            if not response.ok:
+                raise RuntimeError(f"Error fetching {len(chunk)} parks by ID: {response.status_code} {response.text}")
+            page, offset = parse_page(response.content)
+            metrics.inc("records_fetched", len(page), help="Park records read from Airtable")
+            parks.update((park.id, park) for park in page)
+            if not offset:
+                break
+            params["offset"] = offset
+    return parks
+
+def filter_parks(records, limit=None, name_filter=None):
+    """Apply the --name and --limit filters to a stream of parks"""
+    yielded = 0
+    for record in records:
+        if limit and yielded >= limit:
+            return
+        if name_filter and name_filter.lower() not in record.name.lower():
+            continue
+        yielded += 1
+        yield record
+
+def iter_parks(limit=None, name_filter=None, unassigned_only=False, fields=None):
+    """Yield parks from Airtable page by page, filtered as they arrive
+    
+    The --name filter (and, with `unassigned_only`, the skip of parks that
+    already have a region) is pushed to Airtable as a formula, and --limit
+    as maxRecords. The next page is fetched in the background while the
+    parks of the current page are being processed, so at most two pages are
+    held in memory.
+    """
+    formula = build_park_formula(name_filter, unassigned_only)
+    
+    def pages():
+        with ThreadPoolExecutor(max_workers=1) as prefetcher:
+            pending = prefetcher.submit(fetch_parks, None, limit, formula, fields)
+            while pending:
+                records, offset = pending.result()
+                pending = prefetcher.submit(fetch_parks, offset, limit, formula, fields) if offset else None
+                try:
+                    yield from records
+                except GeneratorExit:
+                    if pending:
+                        pending.cancel()
+                    raise
+    
+    return filter_parks(pages(), limit, name_filter)
+
+def open_mirror(path=DEFAULT_MIRROR_PATH, full_sync=False):
+    """Open the local mirror of the parks table and bring it up to date"""
+    mirror = ParksMirror(airtable, path)
+    mirror.sync(full=full_sync)
+    return mirror
+
+def count_classification(path):
+    """Record which path (rules, geo, cache, ai or fallback) classified a park"""
+    with classification_lock:
+        classification_paths[path] += 1
+
+def report_region(park_name, state_info, region, existing_region, test_mode=False, source="AI"):
+    """Print the determined region, comparing it with the existing one in test mode"""
+    if test_mode and existing_region:
+        existing_str = existing_region[0] if isinstance(existing_region, list) and existing_region else existing_region
+        if region == existing_str:
+            print(f"MATCH: '{park_name}' ({state_info}): {source} region '{region}' matches existing region")
+        else:
+            print(f"DIFF: '{park_name}' ({state_info}): {source} suggests '{region}' but current region is '{existing_str}'")
+    else:
+        print(f"Determined region for '{park_name}' ({state_info}): {region}")
+
+def classification_key(fields, model="gpt-4o"):
+    """Cache key of a park's classification prompt inputs"""
+    return cache_key(
+        fields.get("Name", "Unknown Park"), parse_states(fields), fields.get("Latitude", ""),
+        fields.get("Longitude", ""), park_details(fields, model, park_token_budget)["description"], model, PROMPT_VERSION
+    )
+
+def region_request(fields, model="gpt-4o"):
+    """Build the chat completion request that asks the AI model for one park's region"""
+    return {
+        "model": model,
+        "messages": compile_single(fields, model, park_token_budget),
+        "temperature": 0.2,
+        "max_tokens": MAX_COMPLETION_TOKENS
+    }
+
+def determine_region(park_data, test_mode=False, model="gpt-4o", use_rules=True):
+    """Determine the region of a park based on its data
+    
+    Parks whose states all belong to one region are settled by the rule engine,
+    and parks without states by their coordinates when locate_parks placed them.
+    Only the remaining parks go to the AI model, unless classify_stream already
+    answered them in a batched request.
+    """
+    park_name = park_data.name
     
     # If region is already set and not in test mode, return it
     # Note: Region is now a multi-select field, so it's an array
-    existing_region = fields.get("Region", [])
+    existing_region = park_data.regions
     if existing_region and not test_mode:
         print(f"Park '{park_name}' already has region: {existing_region}")
-        return existing_region[0] if isinstance(existing_region, list) and existing_region else existing_region
+        count_classification("existing")
+        return park_data.region
     
     # If in test mode and region exists, track it for comparison
     if test_mode and existing_region:
         print(f"EXISTING: Park '{park_name}' already has region: {existing_region}")
     
-    # Parse states from string if not available in multi
-    states_list = []
-    if states_multi:
-        states_list = states_multi
-    elif states_string:
-        # Simple state parsing from comma-separated list
-        states_list = [state.strip() for state in states_string.split(',')]
+    # States were parsed when the record was read
+    states_list = park_data.states
+    state_info = ', '.join(states_list) if states_list else park_data.states_text or "Unknown"
     
     # Try to determine region based on states first
-    region_by_states = get_region_by_states(states_list)
-    
-    # Prepare data for AI analysis - use more context for better accuracy
-    state_info = ', '.join(states_list) if states_list else states_string if states_string else "Unknown"
-    location_info = f"Latitude: {lat}, Longitude: {lon}" if lat and lon else ""
+    region_by_states, confidence = classify_by_rules(states_list)
+    if use_rules and confidence == CONFIDENCE_HIGH:
+        count_classification("rules")
+        report_region(park_name, state_info, region_by_states, existing_region, test_mode, source="Rules")
+        return region_by_states
     
-    # Create a condensed park description to provide context
-    park_description = description[:500] + "..." if len(description) > 500 else description
+    located = park_data.geo or {}
+    if use_rules and confidence == CONFIDENCE_NONE and located.get("region"):
+        count_classification("geo")
+        report_region(park_name, f"{located['state']}, from coordinates", located["region"], existing_region, test_mode, source="Coordinates")
+        return located["region"]
     
-    # Prepare a message with state statistics to help the model
-    state_region_info = []
-    for region, states in REGION_MAPPING.items():
-        state_region_info.append(f"{region}: {', '.join(states)}")
+    answer = park_data.ai
+    if answer:
+        count_classification(answer["source"])
+        source = {"cache": "Cached", "journal": "Journaled"}.get(answer["source"], "AI")
+        report_region(park_name, state_info, answer["region"], existing_region, test_mode, source=source)
+        return answer["region"]
     
-    state_mapping_text = "\n".join(state_region_info)
+    fields = park_data.fields
+    key = None
+    if classification_cache:
+        key = classification_key(fields, model)
+        # classify_stream already looked up the parks it batched (their "ai" is None when it had no answer)
+        cached_region = classification_cache.get(key) if not park_data.batched else None
+        if cached_region in REGIONS:
+            count_classification("cache")
+            report_region(park_name, state_info, cached_region, existing_region, test_mode, source="Cached")
+            return cached_region
     
     try:
         # Query the OpenAI API with detailed context
-        prompt = f"""
-I need to determine which geographic region of the United States the following national park belongs to.
-
-Park Information:
-- Name: {park_name}
-- States: {state_info}
-- {location_info}
-- Description: {park_description}
-
-US Geographic Regions and their states:
-{state_mapping_text}
-
-Based on the park information, especially the state(s) it's located in, determine which region this park belongs to. 
-If a park spans multiple regions, choose the most appropriate primary region.
-
-If the state information clearly puts this park in a specific region, that should be your primary consideration.
-
-Respond with ONLY ONE of these exact region names:
-{', '.join(REGIONS)}
-"""
-
-        response = client.chat.completions.create(
-            model=model,  # Use the specified model
-            messages=[
-                {"role": "system", "content": "You are a geography expert who categorizes US National Parks into geographic regions with high accuracy. Always respond with exactly one region name."},
-                {"role": "user", "content": prompt}
-            ],
-            temperature=0.2,
-            max_tokens=10
-        )
+        request = region_request(fields, model)
+        
+        openai_request_limiter.acquire()
+        openai_token_limiter.acquire(message_tokens(request["messages"], model) + MAX_COMPLETION_TOKENS)
+        with classification_lock:
+            openai_usage["requests"] += 1
+        started = time.monotonic()
+        with metrics.time("openai_request"):
+            response = openai_client().chat.completions.create(**request)
+        openai_call_succeeded(started, response.usage)
+        record_usage(response.usage)
         
         region = response.choices[0].message.content.strip()
+        source = "ai"
         
         # Verify the region is valid
         if region not in REGIONS:
@@ -187,63 +567,1198 @@ Respond with ONLY ONE of these exact region names:
                 if region_by_states:
                     print(f"AI returned invalid region '{region}' for {park_name}. Using state-based region: {region_by_states}")
                     region = region_by_states
+                    source = "fallback"
                 else:
                     print(f"Warning: AI returned invalid region '{region}' for {park_name}. Defaulting to 'West'.")
                     region = "West"  # Default fallback
+                    source = "fallback"
         
-        # In test mode, show comparison if existing region exists
-        if test_mode and existing_region:
-            existing_str = existing_region[0] if isinstance(existing_region, list) and existing_region else existing_region
-            if region == existing_str:
-                print(f"MATCH: '{park_name}' ({state_info}): AI region '{region}' matches existing region")
-            else:
-                print(f"DIFF: '{park_name}' ({state_info}): AI suggests '{region}' but current region is '{existing_str}'")
-        else:
-            print(f"Determined region for '{park_name}' ({state_info}): {region}")
+        count_classification(source)
+        report_region(park_name, state_info, region, existing_region, test_mode)
+        
+        if key and source == "ai":
+            classification_cache.put(key, region)
         
         return region
         
     except Exception as e:
         print(f"Error determining region for {park_name}: {str(e)}")
+        metrics.inc("openai_errors", help="OpenAI requests that failed after the client's own retries", error=type(e).__name__)
         # Fall back to state-based region if available
         if region_by_states:
             print(f"Using fallback state-based region for {park_name}: {region_by_states}")
+            count_classification("fallback")
             return region_by_states
         return None
 
+def classify_locally(park_data, use_rules=True):
+    """Return (region, path) when the rule engine or coordinates settle a park, else (None, None)"""
+    if not use_rules:
+        return None, None
+    
+    region, confidence = classify_by_rules(park_data.states)
+    if confidence == CONFIDENCE_HIGH:
+        return region, "rules"
+    
+    located = park_data.geo or {}
+    if confidence == CONFIDENCE_NONE and located.get("region"):
+        return located["region"], "geo"
+    return None, None
+
+def needs_ai(park_data, test_mode=False, use_rules=True):
+    """True when determine_region would have to ask the AI model about this park"""
+    if park_data.regions and not test_mode:
+        return False
+    if park_data.ai:
+        return False
+    return classify_locally(park_data, use_rules)[0] is None
+
+def match_region(answer):
+    """Map a model's region answer onto REGIONS, or None if it names none of them"""
+    answer = str(answer or "").strip()
+    if answer in REGIONS:
+        return answer
+    for valid_region in REGIONS:
+        if valid_region.lower() in answer.lower():
+            return valid_region
+    return None
+
+def classify_parks_batch(parks, model="gpt-4o"):
+    """Classify several parks with one chat completion
+    
+    The model answers with a JSON object holding a `{record_id, region}` item
+    per park. Returns {record_id: region} for the items that name one of the
+    parks and a valid region; the other parks are left out so the caller can
+    classify them one at a time.
+    """
+    messages = compile_batch(parks, model, park_token_budget)
+    max_tokens = BATCH_TOKENS_PER_PARK * len(parks) + 20
+    
+    openai_request_limiter.acquire()
+    openai_token_limiter.acquire(message_tokens(messages, model) + max_tokens)
+    with classification_lock:
+        openai_usage["requests"] += 1
+    started = time.monotonic()
+    with metrics.time("openai_batch_request"):
+        response = openai_client().chat.completions.create(
+            model=model,
+            messages=messages,
+            temperature=0.2,
+            max_tokens=max_tokens,
+            response_format={"type": "json_object"}
+        )
+    openai_call_succeeded(started, response.usage, kind="batch")
+    record_usage(response.usage)
+    
+    try:
+        data = json.loads(response.choices[0].message.content)
+    except (TypeError, ValueError):
+        return {}
+    items = data.get("classifications", []) if isinstance(data, dict) else data
+    
+    wanted = {park.id for park in parks}
+    regions = {}
+    for item in items if isinstance(items, list) else []:
+        if not isinstance(item, dict) or item.get("record_id") not in wanted:
+            continue
+        region = match_region(item.get("region"))
+        if region:
+            regions[item["record_id"]] = region
+    return regions
+
+def classify_stream(parks, batch_size, test_mode=False, model="gpt-4o", use_rules=True, window=100):
+    """Answer the parks of a stream that need the AI model in batched requests
+    
+    Parks are buffered until `batch_size` of them need the AI model (or the
+    buffer holds `window` parks). Cached answers are used first; the rest are
+    sent through classify_parks_batch. Each answered park gets an "ai" entry
+    that determine_region uses instead of a single-park request. Parks the
+    batch didn't answer, or answered with an invalid region, keep going
+    through the usual one-at-a-time path.
+    """
+    buffer = []
+    pending = []
+    
+    def answer_pending():
+        uncached = []
+        for park in pending:
+            key = classification_key(park.fields, model) if classification_cache else None
+            cached_region = classification_cache.get(key) if key else None
+            if cached_region in REGIONS:
+                park.ai = {"region": cached_region, "source": "cache"}
+            else:
+                uncached.append((park, key))
+        
+        for start in range(0, len(uncached), batch_size):
+            chunk = uncached[start:start + batch_size]
+            try:
+                regions = classify_parks_batch([park for park, _ in chunk], model)
+            except Exception as e:
+                print(f"Error classifying a batch of {len(chunk)} parks: {str(e)}; classifying them individually")
+                metrics.inc("openai_errors", help="OpenAI requests that failed after the client's own retries", error=type(e).__name__)
+                continue
+            
+            with classification_lock:
+                openai_usage["batched_parks"] += len(regions)
+            for park, key in chunk:
+                region = regions.get(park.id)
+                if region:
+                    park.ai = {"region": region, "source": "ai"}
+                    if key:
+                        classification_cache.put(key, region)
+    
+    for park in parks:
+        buffer.append(park)
+        if needs_ai(park, test_mode, use_rules):
+            park.batched = True
+            pending.append(park)
+        if len(pending) < batch_size and len(buffer) < max(window, batch_size):
+            continue
+        answer_pending()
+        yield from buffer
+        buffer = []
+        pending = []
+    
+    if pending:
+        answer_pending()
+    yield from buffer
+
 def update_park_region(record_id, region, test_mode=False):
     """Update the region field of a park in Airtable"""
+    # IMPORTANT: Region is a multi-select field, so we need to provide it as an array
+    problem = schema_problem({"Region": [region]})
+    if problem:
+        print(f"Error updating record {record_id}: {problem}")
+        return False
+    
     if test_mode:
         # In test mode, don't actually update Airtable
         print(f"TEST MODE: Would update record {record_id} with region: {region}")
         return True
     
-    url = f"https://api.airtable.com/v0/{AIRTABLE_BASE_ID}/{AIRTABLE_TABLE_NAME}/{record_id}"
+    with metrics.time("airtable_write"):
+        response = airtable.update_record(record_id, {"Region": [region]})
     
-    headers = {
-        "Authorization": f"Bearer {AIRTABLE_TOKEN}",
-        "Content-Type": "application/json"
-    }
+    if not response.ok:
+        print(f"Error updating record {record_id}: {response.status_code} {response.text}")
+        return False
     
-    # IMPORTANT: Region is a multi-select field, so we need to provide it as an array
-    data = {
-        "fields": {
-            "Region": [region]  # Now sending as an array for multi-select field
+    return True
+
+class BulkRegionWriter:
+    """Write-behind queue that sends region updates to Airtable in batches
+    
+    Updates queued with add() are sent as one PATCH per `batch_size` records.
+    A queue is flushed when it is full, when its oldest update has waited
+    `max_delay` seconds, and on close(). If Airtable rejects a batch, its
+    records are retried one by one so a single bad value only fails its own
+    record. Updates the table schema rejects (see schema_problem) fail
+    without being queued. Failed records are collected in `failures`, and
+    `on_write` (if given) is called with (record_id, region, error) once a
+    record's write has succeeded (error is None) or failed.
+    """
+    
+    def __init__(self, test_mode=False, batch_size=AIRTABLE_BATCH_LIMIT, max_delay=5.0, on_write=None):
+        self.test_mode = test_mode
+        self.on_write = on_write
+        self.batch_size = max(1, min(batch_size, AIRTABLE_BATCH_LIMIT))
+        self.max_delay = max_delay
+        self.pending = []
+        self.oldest = None
+        self.failures = []
+        self.written = 0
+        self.batches = 0
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+        self.timer = threading.Thread(target=self._flush_when_due, name="region-writer", daemon=True)
+        self.timer.start()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+    
+    def add(self, record_id, region, context=None):
+        """Queue a region update; `context` is returned with the record if it fails"""
+        problem = schema_problem({"Region": [region]})
+        if problem:
+            self._fail((record_id, region, context or {}), problem)
+            return
+        
+        if self.test_mode:
+            # In test mode, don't actually update Airtable
+            print(f"TEST MODE: Would update record {record_id} with region: {region}")
+            return
+        
+        batch = None
+        with self.lock:
+            if not self.pending:
+                self.oldest = time.monotonic()
+            self.pending.append((record_id, region, context or {}))
+            if len(self.pending) >= self.batch_size:
+                batch = self._take(self.batch_size)
+        
+        if batch:
+            self._send(batch)
+    
+    def flush(self):
+        """Send every queued update now"""
+        while True:
+            with self.lock:
+                batch = self._take(self.batch_size)
+            if not batch:
+                return
+            self._send(batch)
+    
+    def close(self):
+        """Stop the flush timer and send whatever is still queued"""
+        self.stopped.set()
+        self.timer.join()
+        self.flush()
+    
+    def _take(self, count):
+        batch, self.pending = self.pending[:count], self.pending[count:]
+        self.oldest = time.monotonic() if self.pending else None
+        return batch
+    
+    def _flush_when_due(self):
+        while not self.stopped.wait(min(self.max_delay, 1.0)):
+            with self.lock:
+                due = self.oldest is not None and time.monotonic() - self.oldest >= self.max_delay
+            if due:
+                self.flush()
+    
+    def _send(self, batch):
+        ok, message = self._patch(batch)
+        if ok:
+            with self.lock:
+                self.written += len(batch)
+            self._report(batch)
+            return
+        
+        if len(batch) == 1:
+            self._fail(batch[0], message)
+            return
+        
+        # Airtable rejects the whole batch if one record is invalid, so find the culprits
+        print(f"Batch update of {len(batch)} records failed ({message}); retrying records individually")
+        for item in batch:
+            ok, message = self._patch([item])
+            if ok:
+                with self.lock:
+                    self.written += 1
+                self._report([item])
+            else:
+                self._fail(item, message)
+    
+    def _patch(self, batch):
+        # Region is a multi-select field, so each value is sent as an array
+        records = [{"id": record_id, "fields": {"Region": [region]}} for record_id, region, _ in batch]
+        
+        with self.lock:
+            self.batches += 1
+        try:
+            with metrics.time("airtable_write"):
+                response = airtable.update_records(records)
+        except requests.RequestException as e:
+            return False, str(e)
+        
+        if not response.ok:
+            return False, f"{response.status_code} {response.text}"
+        return True, None
+    
+    def _report(self, batch, error=None):
+        if self.on_write:
+            for record_id, region, _ in batch:
+                self.on_write(record_id, region, error)
+    
+    def _fail(self, item, message):
+        record_id, region, context = item
+        print(f"Error updating record {record_id}: {message}")
+        with self.lock:
+            self.failures.append({"id": record_id, "region": region, "error": message, **context})
+        self._report([item], message)
+
+class PlannedWrites:
+    """Stand-in for BulkRegionWriter in `plan` runs: region updates are checked but not sent
+    
+    The updates themselves end up in the run's changes map, which
+    write_region_plan saves. Updates the table schema rejects are collected
+    in `failures`, like BulkRegionWriter does.
+    """
+    
+    def __init__(self):
+        self.failures = []
+        self.written = 0
+        self.batches = 0
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc, tb):
+        pass
+    
+    def add(self, record_id, region, context=None):
+        problem = schema_problem({"Region": [region]})
+        if problem:
+            print(f"Error updating record {record_id}: {problem}")
+            self.failures.append({"id": record_id, "region": region, "error": problem, **(context or {})})
+
+def apply_write_failures(failures, changes_map, counts):
+    """Move records whose queued write failed from the updated count to the errors"""
+    for failure in failures:
+        counts["updated"] -= 1
+        counts["errors"] += 1
+        changes_map["errors"].append({
+            "id": failure["id"],
+            "name": failure.get("name", "Unknown Park"),
+            "existing_region": failure.get("existing_region"),
+            "error": failure["error"]
+        })
+
+def skip_completed(parks, journal, resumed):
+    """Leave out parks an earlier attempt of the run finished
+    
+    Parks it classified but did not write get their region back as an "ai"
+    entry, so they are written without being classified again.
+    """
+    for park in parks:
+        record_id = park.id
+        if journal.completed(record_id):
+            resumed["completed"] += 1
+            continue
+        region = journal.region(record_id)
+        if region:
+            park.ai = {"region": region, "source": "journal"}
+            resumed["reused"] += 1
+        yield park
+
+def geo_available():
+    """True when parks can be located from their coordinates (see geo_resolver.available)"""
+    import geo_resolver
+    return geo_resolver.available()
+
+def locate_parks(records):
+    """Place parks that have no states using their coordinates
+    
+    All such parks are resolved in one batch and annotated with a "geo" entry
+    holding the state and region, which determine_region uses instead of the AI model.
+    Returns (located, stateless) counts.
+    """
+    import geo_resolver  # imported here, like NumPy by its resolver, so runs that locate nothing skip both
+    
+    stateless = [park for park in records if not park.states]
+    with metrics.time("geo_locate"):
+        located = geo_resolver.resolve_records(stateless)
+    for park in stateless:
+        if park.id in located:
+            state, region = located[park.id]
+            park.geo = {"state": state, "region": region}
+    
+    return len(located), len(stateless)
+
+def locate_stream(parks, totals, batch_size=100):
+    """Run locate_parks over a stream of parks, one batch at a time"""
+    batch = []
+    for park in parks:
+        batch.append(park)
+        if len(batch) < batch_size:
+            continue
+        located, stateless = locate_parks(batch)
+        totals["located"] += located
+        totals["stateless"] += stateless
+        yield from batch
+        batch = []
+    
+    if batch:
+        located, stateless = locate_parks(batch)
+        totals["located"] += located
+        totals["stateless"] += stateless
+        yield from batch
+
+def process_park(park, test_mode=False, force_update=False, model="gpt-4o", writer=None, use_rules=True):
+    """Classify a single park and write its region back, returning the outcome
+    
+    With a BulkRegionWriter the update is only queued; failed writes are
+    reported afterwards by apply_write_failures.
+    """
+    record_id = park.id
+    park_name = park.name
+    existing_region = park.regions
+    
+    # Skip if region already set and not forcing or in test mode
+    if park.region and not force_update and not test_mode:
+        return {"status": "skipped"}
+    
+    # Determine region
+    with metrics.time("determine_region"):
+        region = determine_region(park, test_mode, model, use_rules)
+    if run_journal:
+        run_journal.classified(record_id, region)
+    
+    outcome = write_region(record_id, park_name, existing_region, region, test_mode, writer)
+    if run_journal and not writer and region and not test_mode:
+        run_journal.written(record_id, region, None if outcome["status"] == "updated" else "write failed")
+    return outcome
+
+def write_region(record_id, park_name, existing_region, region, test_mode=False, writer=None):
+    """Write a determined region back to Airtable and describe the change as an outcome"""
+    existing_region_str = existing_region[0] if isinstance(existing_region, list) and existing_region else existing_region
+    
+    if not region:
+        return {
+            "status": "error",
+            "kind": "errors",
+            "entry": {
+                "id": record_id,
+                "name": park_name,
+                "existing_region": existing_region_str
+            },
+            "previous": existing_region
         }
+    
+    # Track the change type
+    if existing_region_str:
+        if region == existing_region_str:
+            kind, entry = "unchanged", {
+                "id": record_id,
+                "name": park_name,
+                "region": region
+            }
+        else:
+            kind, entry = "changed", {
+                "id": record_id,
+                "name": park_name,
+                "old_region": existing_region_str,
+                "new_region": region
+            }
+    else:
+        kind, entry = "new", {
+            "id": record_id,
+            "name": park_name,
+            "region": region
+        }
+    
+    # Update Airtable (or simulate in test mode)
+    if writer:
+        writer.add(record_id, region, {"name": park_name, "existing_region": existing_region_str})
+        return {"status": "updated", "kind": kind, "entry": entry, "previous": existing_region}
+    
+    success = update_park_region(record_id, region, test_mode)
+    
+    return {"status": "updated" if success else "write_failed", "kind": kind, "entry": entry, "previous": existing_region}
+
+def record_outcome(outcome, changes_map, counts):
+    """Fold the outcome of process_park into the changes map and run counters"""
+    status = outcome["status"]
+    if status == "skipped":
+        counts["already_set"] += 1
+        return
+    
+    changes_map[outcome["kind"]].append(outcome["entry"])
+    if status == "updated":
+        counts["updated"] += 1
+    else:
+        counts["errors"] += 1
+
+async def process_parks_async(records, on_outcome, test_mode=False, force_update=False, model="gpt-4o", concurrency=8, writer=None, use_rules=True, progress_bar=True):
+    """Process a stream of parks concurrently, passing outcomes to `on_outcome` in input order
+    
+    Each park still runs through process_park; the blocking OpenAI and Airtable
+    calls run on a thread pool while the shared rate limiters keep the overall
+    request rate within each API's limits. Parks are pulled from `records` only
+    as workers free up, so a streamed table is never fully held in memory.
+    """
+    loop = asyncio.get_running_loop()
+    semaphore = asyncio.Semaphore(concurrency)
+    from tqdm import tqdm
+    progress = tqdm(desc="Processing parks", disable=not progress_bar)
+    records = iter(records)
+    pending = deque()
+    
+    async def run(park):
+        try:
+            return await loop.run_in_executor(executor, process_park, park, test_mode, force_update, model, writer, use_rules)
+        finally:
+            semaphore.release()
+            if airtable_limiter.adaptive:
+                progress.set_postfix_str(rate_limits_status(), refresh=False)
+            progress.update(1)
+    
+    with ThreadPoolExecutor(max_workers=concurrency) as executor, ThreadPoolExecutor(max_workers=1) as reader:
+        try:
+            while True:
+                await semaphore.acquire()
+                park = await loop.run_in_executor(reader, next, records, None)
+                if park is None:
+                    semaphore.release()
+                    break
+                pending.append(asyncio.ensure_future(run(park)))
+                while pending and pending[0].done():
+                    on_outcome(pending.popleft().result())
+            
+            while pending:
+                on_outcome(await pending.popleft())
+        finally:
+            progress.close()
+
+# Options the parent of a --workers run handles itself, with the number of values each takes
+PARENT_ONLY_OPTIONS = {
+    "--workers": 1, "--resume": 1, "--metrics-json": 1, "--metrics-prom": 1, "--verify-report": 0, "--no-journal": 0,
+    "--full-sync": 0, "--shared-limits": 1, "--target-result": 1, "--refresh-schema": 0,
+}
+
+# Options the parent of a --targets run handles itself
+TARGET_PARENT_OPTIONS = {"--targets": 1, "--metrics-json": 1, "--metrics-prom": 1}
+
+def worker_arguments(argv, options=PARENT_ONLY_OPTIONS):
+    """Drop the options a parent process handles itself from the command line passed on to its children"""
+    kept = []
+    skip = 0
+    for arg in argv:
+        if skip:
+            skip -= 1
+            continue
+        name = arg.split("=", 1)[0]
+        if name in options:
+            skip = 0 if "=" in arg else options[name]
+            continue
+        kept.append(arg)
+    return kept
+
+def read_worker_parks(stream):
+    """Parks sent to a worker by its parent, one JSON object per line"""
+    for line in stream:
+        if line.strip():
+            yield ParkRecord.from_api(loads(line))
+
+def forward_output(label, stream):
+    """Print a child process's output, each line prefixed with its label"""
+    for line in stream:
+        print(f"[{label}] {line}", end="", flush=True)
+
+def run_workers(parks, count, workdir, limits_path, journal_run=None):
+    """Deal a stream of parks out to `count` worker processes and return their results
+    
+    Each worker is this script started with --worker and the same options:
+    it reads its parks as JSON lines on stdin and runs them through the
+    usual pipeline, drawing on the rate limiters shared through `limits_path`.
+    Parks are dealt round-robin as they stream in. A worker that dies has
+    its share passed to the others; its finished parks are in the run
+    journal, so --resume picks up whatever it left undone.
+    
+    Returns the result of each worker that finished (see write_worker_result).
+    """
+    command = [sys.executable, os.path.abspath(__file__), "--worker", "--shared-limits", limits_path]
+    if journal_run:
+        command += ["--journal-run", journal_run]
+    
+    workers = []
+    for index in range(count):
+        result_path = os.path.join(workdir, f"worker-{index}.json")
+        process = subprocess.Popen(
+            command + ["--worker-result", result_path] + worker_arguments(command_arguments),
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True
+        )
+        reader = threading.Thread(target=forward_output, args=(f"worker {index}", process.stdout), daemon=True)
+        reader.start()
+        workers.append({"index": index, "process": process, "reader": reader, "result": result_path, "alive": True})
+    
+    dealt = 0
+    for park in parks:
+        line = json.dumps(park.to_dict()) + "\n"
+        for _ in range(count):
+            worker = workers[dealt % count]
+            dealt += 1
+            if not worker["alive"]:
+                continue
+            try:
+                worker["process"].stdin.write(line)
+                break
+            except BrokenPipeError:
+                print(f"Worker {worker['index']} stopped early; dealing its parks to the others")
+                worker["alive"] = False
+        else:
+            raise RuntimeError("Every worker process has stopped")
+    
+    results = []
+    for worker in workers:
+        try:
+            worker["process"].stdin.close()
+        except BrokenPipeError:
+            pass
+        returncode = worker["process"].wait()
+        worker["reader"].join()
+        if returncode != 0 or not os.path.exists(worker["result"]):
+            print(f"Worker {worker['index']} failed (exit code {returncode}); its unfinished parks are left for --resume")
+            continue
+        with open(worker["result"]) as f:
+            results.append(json.load(f))
+    return results
+
+def run_totals():
+    """The counters of this process that a parent process adds to its own (see merge_run_totals)"""
+    limiters = (airtable_limiter, openai_request_limiter, openai_token_limiter)
+    return {
+        "classification_paths": dict(classification_paths),
+        "openai_usage": dict(openai_usage),
+        "cache": [classification_cache.hits, classification_cache.misses] if classification_cache else None,
+        "airtable": dict(airtable.stats),
+        "waited": {limiter.name: limiter.waited for limiter in limiters},
+        "rates": {limiter.name: [limiter.rate_per_second, limiter.decreases] for limiter in limiters},
+        "metrics": metrics.state(),
+    }
+
+def write_worker_result(path, outcomes, writer, located):
+    """Write what a worker did, for its parent to merge with merge_run_totals"""
+    result = {
+        "outcomes": outcomes,
+        "failures": writer.failures,
+        "written": writer.written,
+        "batches": writer.batches,
+        "located": dict(located),
+        **run_totals()
     }
+    with open(path, "w") as f:
+        json.dump(result, f)
+
+def merge_run_totals(result):
+    """Add the run_totals of a worker or target process to this process's counters"""
+    with classification_lock:
+        classification_paths.update(result["classification_paths"])
+        openai_usage.update(result["openai_usage"])
+    airtable.stats.update(result["airtable"])
+    for limiter in (airtable_limiter, openai_request_limiter, openai_token_limiter):
+        limiter.waited += result["waited"].get(limiter.name, 0.0)
+        if limiter.adaptive and limiter.name in result["rates"]:
+            # Report the lowest rate any process ended at, and every cut
+            rate, decreases = result["rates"][limiter.name]
+            limiter.rate_per_second = min(limiter.rate_per_second, rate)
+            limiter.decreases += decreases
+    if classification_cache and result["cache"]:
+        classification_cache.hits += result["cache"][0]
+        classification_cache.misses += result["cache"][1]
+    metrics.merge(result["metrics"])
+
+def write_target_result(path, total_parks, counts, changes_map, report):
+    """Write the outcome of one --targets run, for its parent's combined report"""
+    result = {
+        "parks": total_parks,
+        "counts": dict(counts),
+        "changes": {kind: len(entries) for kind, entries in changes_map.items()},
+        "regions": report.counts if report else None,
+        **run_totals()
+    }
+    with open(path, "w") as f:
+        json.dump(result, f)
+
+def run_targets(targets, workdir):
+    """Run this script for every Airtable target at the same time and return their results
     
-    response = requests.patch(url, headers=headers, json=data)
+    Each target runs in its own process, with AIRTABLE_BASE_ID,
+    AIRTABLE_TABLE_NAME and (if the target has one) AIRTABLE_TOKEN set to the
+    target's, and the options of this run. The processes share one SQLite
+    file of rate limiters: every base gets its own Airtable bucket, since
+    Airtable limits requests per base, while all targets draw on the same
+    OpenAI buckets. Output is printed prefixed with the target's name.
     
-    if not response.ok:
-        print(f"Error updating record {record_id}: {response.status_code} {response.text}")
-        return False
+    Returns one result per target (see write_target_result), or None for a
+    target whose run failed.
+    """
+    limits_path = os.path.join(workdir, "limits.sqlite3")
+    runs = []
+    for index, target in enumerate(targets):
+        result_path = os.path.join(workdir, f"target-{index}.json")
+        env = dict(os.environ, AIRTABLE_BASE_ID=target["base_id"], AIRTABLE_TABLE_NAME=target["table"])
+        if target["token"]:
+            env["AIRTABLE_TOKEN"] = target["token"]
+        options = ["--shared-limits", limits_path, "--target-result", result_path]
+        # After the options of this run, so the target's rate replaces a global --airtable-rps
+        rate = ["--airtable-rps", str(target["airtable_rps"])] if target["airtable_rps"] else []
+        
+        process = subprocess.Popen(
+            [sys.executable, os.path.abspath(__file__)] + options + worker_arguments(command_arguments, TARGET_PARENT_OPTIONS) + rate,
+            env=env, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True
+        )
+        reader = threading.Thread(target=forward_output, args=(target["name"], process.stdout), daemon=True)
+        reader.start()
+        runs.append((target, process, reader, result_path))
     
-    return True
+    results = []
+    for target, process, reader, result_path in runs:
+        returncode = process.wait()
+        reader.join()
+        if returncode != 0 or not os.path.exists(result_path):
+            print(f"Target '{target['name']}' failed (exit code {returncode})")
+            results.append(None)
+            continue
+        with open(result_path) as f:
+            results.append(json.load(f))
+    return results
+
+def print_targets_report(targets, results):
+    """Print the outcome and regions of every target, with a row of totals"""
+    columns = ["Target", "Parks", "Processed", "Errors"] + REGIONS + ["Unassigned"]
+    rows = []
+    totals = Counter()
+    for target, result in zip(targets, results):
+        if not result:
+            rows.append([target["name"], "failed"] + [""] * (len(columns) - 2))
+            continue
+        regions = result["regions"] or {}
+        values = [result["parks"], result["counts"].get("updated", 0), result["counts"].get("errors", 0)]
+        values += [regions.get(region, 0) if result["regions"] else "-" for region in REGIONS + ["Unassigned"]]
+        for column, value in zip(columns[1:], values):
+            if isinstance(value, int):
+                totals[column] += value
+        rows.append([target["name"]] + values)
+    rows.append(["All targets"] + [totals[column] for column in columns[1:]])
+    
+    print("\n--- TARGETS REPORT ---")
+    print_targets_table(columns, rows)
+
+def load_batch_state(state_path):
+    """Read the state file of a submitted batch, or None if there is none"""
+    if not os.path.exists(state_path):
+        print(f"No batch has been submitted (no {state_path})")
+        return None
+    with open(state_path) as f:
+        return json.load(f)
+
+def submit_region_batch(parks, state_path=DEFAULT_BATCH_STATE_PATH, model="gpt-4o", use_rules=True, include_existing=False):
+    """Write the region prompts of `parks` to a JSONL file and submit it to the Batch API
+    
+    Parks the rule engine, their coordinates or the classification cache
+    already settle are not sent; their regions are kept in the state file and
+    written together with the batch results by apply_region_batch.
+    """
+    if os.path.exists(state_path):
+        print(f"A batch is already pending in {state_path}; apply it (or delete the file) before submitting another")
+        return None
+    
+    state = {"model": model, "batch_id": None, "parks": {}, "local": {}}
+    input_path = os.path.splitext(state_path)[0] + ".jsonl"
+    
+    with open(input_path, "w") as f:
+        for park in parks:
+            record_id = park.id
+            if park.regions and not include_existing:
+                continue
+            
+            fields = park.fields
+            key = classification_key(fields, model) if classification_cache else None
+            state["parks"][record_id] = {
+                "name": park.name,
+                "existing_region": park.regions,
+                "fallback": get_region_by_states(list(park.states)),
+                "key": key
+            }
+            
+            region, path = classify_locally(park, use_rules)
+            if not region and key:
+                region = classification_cache.get(key)
+                path = "cache" if region in REGIONS else None
+            if region and path:
+                state["local"][record_id] = [region, path]
+                continue
+            
+            request = {"custom_id": record_id, "method": "POST", "url": "/v1/chat/completions", "body": region_request(fields, model)}
+            f.write(json.dumps(request) + "\n")
+    
+    queued = len(state["parks"]) - len(state["local"])
+    if queued:
+        with open(input_path, "rb") as f:
+            batch_file = openai_client().files.create(file=f, purpose="batch")
+        batch = openai_client().batches.create(
+            input_file_id=batch_file.id,
+            endpoint="/v1/chat/completions",
+            completion_window="24h",
+            metadata={"description": "park region classification"}
+        )
+        state["batch_id"] = batch.id
+        print(f"Submitted batch {batch.id} with {queued} requests ({input_path})")
+    else:
+        print("Every park was settled without the AI model; nothing to submit")
+    
+    with open(state_path, "w") as f:
+        json.dump(state, f)
+    print(f"{len(state['local'])} parks were classified locally; run 'batch apply' once the batch has completed")
+    return state
+
+def check_region_batch(state_path=DEFAULT_BATCH_STATE_PATH, wait=False, poll_interval=60):
+    """Print the status of the submitted batch, polling until it finishes with `wait`"""
+    state = load_batch_state(state_path)
+    if not state:
+        return None
+    if not state["batch_id"]:
+        print("The batch needed no AI requests; it can be applied")
+        return "completed"
+    
+    while True:
+        batch = openai_client().batches.retrieve(state["batch_id"])
+        counts = batch.request_counts
+        progress = f" ({counts.completed} of {counts.total} requests completed, {counts.failed} failed)" if counts else ""
+        print(f"Batch {batch.id}: {batch.status}{progress}")
+        if not wait or batch.status in ("completed", "failed", "expired", "cancelled"):
+            return batch.status
+        time.sleep(poll_interval)
+
+def read_batch_results(batch_id):
+    """Return {record_id: answer} from the output file of a completed batch"""
+    batch = openai_client().batches.retrieve(batch_id)
+    if batch.status != "completed":
+        print(f"Batch {batch_id} is {batch.status}; it can only be applied once it has completed")
+        return None
+    
+    answers = {}
+    if batch.output_file_id:
+        for line in openai_client().files.content(batch.output_file_id).text.splitlines():
+            if not line.strip():
+                continue
+            result = json.loads(line)
+            response = result.get("response") or {}
+            if response.get("status_code") != 200:
+                continue
+            record_usage(response.get("body", {}).get("usage"))
+            choices = response.get("body", {}).get("choices") or [{}]
+            answers[result.get("custom_id")] = (choices[0].get("message") or {}).get("content", "")
+    return answers
+
+def apply_region_batch(state_path=DEFAULT_BATCH_STATE_PATH, test_mode=False, batch_size=AIRTABLE_BATCH_LIMIT, flush_interval=5.0):
+    """Write the regions of a completed batch (and the locally settled parks) to Airtable
+    
+    Answers that don't name a valid region, and requests the batch failed,
+    fall back to the state-based region like determine_region does.
+    """
+    state = load_batch_state(state_path)
+    if not state:
+        return None
+    
+    answers = {}
+    if state["batch_id"]:
+        answers = read_batch_results(state["batch_id"])
+        if answers is None:
+            return None
+    
+    changes_map = {"unchanged": [], "changed": [], "new": [], "errors": []}
+    counts = Counter()
+    
+    with BulkRegionWriter(test_mode, batch_size, flush_interval) as writer:
+        for record_id, park in state["parks"].items():
+            if record_id in state["local"]:
+                region, path = state["local"][record_id]
+            else:
+                region, path = match_region(answers.get(record_id)), "ai"
+                if region and park["key"] and classification_cache:
+                    classification_cache.put(park["key"], region)
+                if not region and park["fallback"]:
+                    region, path = park["fallback"], "fallback"
+                    print(f"No valid batch answer for {park['name']}; using state-based region: {region}")
+                elif not region:
+                    print(f"No valid batch answer for {park['name']} and no state-based region")
+            
+            if region:
+                count_classification(path)
+            outcome = write_region(record_id, park["name"], park["existing_region"], region, test_mode, writer)
+            record_outcome(outcome, changes_map, counts)
+    
+    apply_write_failures(writer.failures, changes_map, counts)
+    if writer.batches:
+        print(f"Wrote {writer.written} region updates in {writer.batches} Airtable requests")
+    record_run_metrics(len(state["parks"]), counts)
+    print_summary(len(state["parks"]), counts, changes_map, test_mode, force_update=True)
+    
+    if not test_mode:
+        # The batch is done with; keep the request file for reference
+        os.remove(state_path)
+    return counts
+
+def park_stamp(park):
+    """Fingerprint of the fields a park is classified from and its region, to tell whether it has changed since"""
+    return hashlib.sha256(json.dumps(park.fields, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+
+def write_region_plan(plan_path, changes_map, stamps, read_at, model="gpt-4o"):
+    """Save the changes map of a `plan` run, with each park's stamp, for a later `apply`
+    
+    `read_at` is when the run started reading parks; apply checks every park
+    modified after it against its stamp.
+    """
+    for kind in ("new", "changed", "unchanged"):
+        for entry in changes_map[kind]:
+            entry["stamp"] = stamps.get(entry["id"])
+    plan = {
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "read_at": read_at.isoformat(),
+        "base_id": AIRTABLE_BASE_ID,
+        "table": AIRTABLE_TABLE_NAME,
+        "model": model,
+        "park_tokens": park_token_budget,
+        "changes": changes_map,
+    }
+    write_atomically(plan_path, json.dumps(plan, indent=2) + "\n")
+    
+    writes = len(changes_map["new"]) + len(changes_map["changed"])
+    print(f"\nPlan written to {plan_path}: {writes} region writes ({len(changes_map['new'])} new, {len(changes_map['changed'])} changed)")
+    apply_command = "python update_regions.py apply" + (f" --plan-file {plan_path}" if plan_path != DEFAULT_PLAN_PATH else "")
+    print(f"Review it, then write it to Airtable with: {apply_command}")
+
+def load_region_plan(plan_path):
+    """Read a plan written by a `plan` run, or None if there is none"""
+    if not os.path.exists(plan_path):
+        print(f"No plan has been made (no {plan_path})")
+        return None
+    with open(plan_path) as f:
+        return json.load(f)
+
+def modified_parks(since, record_ids):
+    """Return {record_id: park} for the parks among `record_ids` modified after `since`
+    
+    Only the records Airtable reports as modified since are downloaded, like
+    a mirror's incremental sync. Raises RuntimeError if they can't be read,
+    so a plan is never applied unchecked.
+    """
+    since = (datetime.fromisoformat(since) - SYNC_OVERLAP).strftime("%Y-%m-%dT%H:%M:%S.000Z")
+    params = {
+        "pageSize": 100,
+        "filterByFormula": f"IS_AFTER(LAST_MODIFIED_TIME(), DATETIME_PARSE('{since}'))",
+        "fields[]": PARK_FIELDS,
+    }
+    parks = {}
+    while True:
+        with metrics.time("airtable_fetch"):
+            response = airtable.list_records(**params)
+        if not response.ok:
+            raise RuntimeError(f"Error reading parks changed since the plan was made: {response.status_code} {response.text}")
+        page, offset = parse_page(response.content)
+        parks.update((park.id, park) for park in page if park.id in record_ids)
+        if not offset:
+            return parks
+        params["offset"] = offset
+
+def apply_region_plan(plan_path=DEFAULT_PLAN_PATH, test_mode=False, batch_size=AIRTABLE_BATCH_LIMIT, flush_interval=5.0):
+    """Write the new and changed regions of a plan to Airtable
+    
+    Parks whose fields or region changed after the plan read them are
+    skipped: their planned region may no longer be right. The plan is
+    removed once applied (kept in test mode).
+    """
+    plan = load_region_plan(plan_path)
+    if not plan:
+        return None
+    if plan["base_id"] != AIRTABLE_BASE_ID or plan["table"] != AIRTABLE_TABLE_NAME:
+        print(f"The plan in {plan_path} is for table '{plan['table']}' of base {plan['base_id']}, not '{AIRTABLE_TABLE_NAME}' of {AIRTABLE_BASE_ID}")
+        return None
+    
+    # Stamps cover descriptions as cut when the plan was made
+    configure_prompts(plan["park_tokens"])
+    planned = plan["changes"]["new"] + plan["changes"]["changed"]
+    print(f"Applying the plan made {plan['created_at']} with {plan['model']}: {len(planned)} region writes")
+    
+    try:
+        current = modified_parks(plan["read_at"], {entry["id"] for entry in planned})
+    except RuntimeError as e:
+        print(e)
+        return None
+    
+    changes_map = {"unchanged": [], "changed": [], "new": [], "errors": []}
+    counts = Counter()
+    conflicts = []
+    
+    with BulkRegionWriter(test_mode, batch_size, flush_interval) as writer:
+        for entry in planned:
+            park = current.get(entry["id"])
+            if park and park_stamp(park) != entry["stamp"]:
+                conflicts.append(entry)
+                continue
+            region = entry.get("new_region") or entry["region"]
+            outcome = write_region(entry["id"], entry["name"], entry.get("old_region"), region, test_mode, writer)
+            record_outcome(outcome, changes_map, counts)
+    
+    apply_write_failures(writer.failures, changes_map, counts)
+    if writer.batches:
+        print(f"Wrote {writer.written} region updates in {writer.batches} Airtable requests")
+    record_run_metrics(len(planned), counts)
+    metrics.set("plan_conflicts", len(conflicts), help="Planned parks skipped because they changed after the plan was made")
+    
+    print("\n--- APPLY SUMMARY ---")
+    print(f"Region writes in the plan: {len(planned)}")
+    print(f"{'Would be written' if test_mode else 'Written'}: {counts['updated']} ({len(changes_map['new'])} new, {len(changes_map['changed'])} changed)")
+    print(f"Skipped, changed since the plan was made: {len(conflicts)}")
+    print(f"Errors: {counts['errors']}")
+    if conflicts:
+        print("\nParks changed since the plan was made (classify them again):")
+        for entry in conflicts:
+            print(f"  {entry['name']} ({entry['id']})")
+    
+    if not test_mode:
+        os.remove(plan_path)
+    return counts
+
+def print_summary(total_parks, counts, changes_map, test_mode=False, force_update=False, planning=False, unassigned_only=False):
+    """Print the run summary and the changes detail (of the planned writes, for the plan command)"""
+    print("\n--- PLAN SUMMARY ---" if planning else "\n--- SUMMARY ---")
+    print(f"Total parks processed: {total_parks}")
+    if unassigned_only:
+        print("Parks already had regions: not downloaded (Airtable only sent parks without a region)")
+    elif not test_mode and not force_update:
+        print(f"Parks already had regions (skipped): {counts['already_set']}")
+    if planning:
+        print(f"Parks with a planned region write: {counts['updated']} (nothing was written to Airtable)")
+    else:
+        print(f"Parks processed: {counts['updated']}")
+    print(f"Errors: {counts['errors']}")
+    print(f"Classified by rule engine: {classification_paths['rules']}")
+    if classification_paths["geo"]:
+        print(f"Classified by coordinates: {classification_paths['geo']}")
+    print(f"Classified by AI model: {classification_paths['ai']}")
+    if openai_usage["requests"]:
+        print(f"OpenAI requests: {openai_usage['requests']} ({openai_usage['batched_parks']} parks classified in batches)")
+    if openai_usage["prompt_tokens"] or openai_usage["completion_tokens"]:
+        print(f"OpenAI tokens: {openai_usage['prompt_tokens']} input ({openai_usage['cached_tokens']} cached), {openai_usage['completion_tokens']} output")
+    if classification_cache:
+        print(f"Classification cache: {classification_cache.hits} hits, {classification_cache.misses} misses")
+    if classification_paths["fallback"]:
+        print(f"Classified by state fallback: {classification_paths['fallback']}")
+    if classification_paths["journal"]:
+        print(f"Classifications reused from the run journal: {classification_paths['journal']}")
+    if airtable_limiter.adaptive:
+        decreases = sum(limiter.decreases for limiter in (airtable_limiter, openai_request_limiter, openai_token_limiter))
+        print(f"Rate limits at the end: {rate_limits_status()} (lowered {decreases} times)")
+    
+    # Print changes detail
+    planned = " planned" if planning else ""
+    print("\n--- PLANNED CHANGES ---" if planning else "\n--- CHANGES DETAIL ---")
+    print(f"New region assignments{planned}: {len(changes_map['new'])}")
+    print(f"Changed region assignments{planned}: {len(changes_map['changed'])}")
+    print(f"Unchanged region assignments: {len(changes_map['unchanged'])}")
+    
+    # Print changed regions if any
+    if changes_map["changed"]:
+        print("\nPlanned region changes:" if planning else "\nRegion changes:")
+        for change in changes_map["changed"]:
+            print(f"  {change['name']}: {change['old_region']} → {change['new_region']}")
+
+def record_run_metrics(total_parks, counts):
+    """Record the outcome counts of a run, as printed by print_summary"""
+    metrics.set("parks_seen", total_parks, help="Parks read during the run")
+    for outcome in ("updated", "already_set", "errors"):
+        metrics.set("parks", counts[outcome], help="Parks by outcome (updated, already_set, errors)", outcome=outcome)
+
+def export_metrics(json_path=None, prom_path=None, success=True):
+    """Fold the run totals into the metrics and write them to the requested files"""
+    if not json_path and not prom_path:
+        return
+    
+    stats = dict(airtable.stats)
+    metrics.set_total("airtable_requests", stats.get("requests", 0), help="Airtable HTTP requests, including retries")
+    metrics.set_total("airtable_retries", stats.get("retries", 0), help="Airtable requests that were retries")
+    metrics.set_total("airtable_throttled", stats.get("throttled", 0), help="Airtable responses with status 429")
+    metrics.set_total("airtable_server_errors", stats.get("server_errors", 0), help="Airtable responses with a 5xx status")
+    metrics.set_total("airtable_connection_errors", stats.get("connection_errors", 0), help="Airtable requests that failed to connect or timed out")
+    metrics.set_total("airtable_retry_wait_seconds", round(stats.get("retry_wait_seconds", 0.0), 3), help="Seconds spent backing off before Airtable retries")
+    
+    metrics.set_total("openai_requests", openai_usage["requests"], help="OpenAI chat completions requested")
+    metrics.set_total("openai_batched_parks", openai_usage["batched_parks"], help="Parks classified through batched prompts")
+    for kind in ("prompt", "completion", "cached"):
+        metrics.set_total("openai_tokens", openai_usage[f"{kind}_tokens"], help="OpenAI tokens used, by kind (cached tokens are part of prompt)", kind=kind)
+    for path, count in classification_paths.items():
+        metrics.set_total("classifications", count, help="Parks classified, by path", path=path)
+    if classification_cache:
+        metrics.set_total("cache_lookups", classification_cache.hits, help="Classification cache lookups, by result", result="hit")
+        metrics.set_total("cache_lookups", classification_cache.misses, result="miss")
+    for limiter in (airtable_limiter, openai_request_limiter, openai_token_limiter):
+        metrics.set_total("rate_limit_wait_seconds", round(limiter.waited, 3), help="Seconds callers waited for a rate limiter", limiter=limiter.name)
+        metrics.set("rate_limit_per_second", round(limiter.rate_per_second, 3), help="Rate a limiter allowed at the end of the run", limiter=limiter.name)
+        metrics.set_total("rate_limit_decreases", limiter.decreases, help="Times an adaptive limiter cut its rate", limiter=limiter.name)
+    
+    metrics.set("run_duration_seconds", round(time.time() - metrics.started, 3), help="Wall time of the run")
+    metrics.set("last_run_timestamp_seconds", round(time.time(), 3), help="Unix time the run finished")
+    metrics.set("last_run_success", 1 if success else 0, help="1 if the run finished without an unhandled error")
+    
+    if json_path:
+        metrics.write_json(json_path)
+        print(f"Metrics written to {json_path}")
+    if prom_path:
+        metrics.write_prometheus(prom_path)
+        print(f"Metrics written to {prom_path}")
+
+def run_worker(args):
+    """Process the parks a --workers parent sends on stdin, then write the outcomes for it to merge"""
+    use_rules = not args.no_rules
+    if not args.no_cache:
+        configure_cache(args.cache_path, args.cache_ttl_days, args.cache_max_entries, purge=False)
+    configure_rate_limits(args.airtable_rps, args.openai_rpm, args.openai_tpm, args.shared_limits, not args.no_adaptive)
+    configure_prompts(args.park_tokens)
+    configure_schema(args.schema_path, args.schema_ttl_hours, check_regions=False)  # the parent has refreshed it and warned
+    if args.journal_run:
+        configure_journal(args.journal_dir, attach=args.journal_run)
+    
+    parks = read_worker_parks(sys.stdin)
+    located = Counter()
+    if use_rules and not args.no_geo and geo_available():
+        parks = locate_stream(parks, located)
+    if args.ai_batch_size > 1:
+        parks = classify_stream(parks, args.ai_batch_size, args.test, args.model, use_rules)
+    
+    outcomes = []
+    on_write = run_journal.written if run_journal else None
+    planning = args.command == "plan"
+    with PlannedWrites() if planning else BulkRegionWriter(args.test, args.batch_size, args.flush_interval, on_write) as writer:
+        if args.use_async:
+            asyncio.run(process_parks_async(parks, outcomes.append, args.test, args.force, args.model, args.concurrency, writer, use_rules, progress_bar=False))
+        else:
+            for park in parks:
+                outcomes.append(process_park(park, args.test, args.force, args.model, writer, use_rules))
+    
+    if run_journal:
+        run_journal.close()
+    write_worker_result(args.worker_result, outcomes, writer, located)
+
+def run_all_targets(args):
+    """Process every base/table pair listed in --targets concurrently and print a combined report"""
+    if args.command or args.resume:
+        print("--targets can't be combined with the batch, plan and apply commands or --resume; run those for one table at a time")
+        return
+    try:
+        targets = load_targets(args.targets, AIRTABLE_TOKEN)
+    except (OSError, ValueError) as e:
+        print(f"Error reading targets: {e}")
+        sys.exit(1)
+    
+    print(f"Processing {len(targets)} Airtable targets concurrently:")
+    for target in targets:
+        print(f"  {target['name']}: base {target['base_id']}, table {target['table']}")
+    
+    workdir = tempfile.mkdtemp(prefix="region-targets-")
+    atexit.register(shutil.rmtree, workdir, True)
+    results = run_targets(targets, workdir)
+    for result in results:
+        if result:
+            merge_run_totals(result)
+    
+    print_targets_report(targets, results)
+    if not all(results):
+        sys.exit(1)
 
-def main():
-    """Main function to process all parks"""
-    # Parse command line arguments (full parse)
-    args = parser.parse_args()
+def run(args):
+    """Process all parks as the parsed command line `args` asks"""
+    if args.worker:
+        run_worker(args)
+        return
+    if args.targets:
+        run_all_targets(args)
+        return
+    
+    if args.command == "apply":
+        # apply never classifies: it only needs Airtable's rate limit and the schema
+        print(f"Applying plan {args.plan_file}{' in TEST MODE (nothing is written)' if args.test else ''}...")
+        configure_rate_limits(args.airtable_rps, shared_path=args.shared_limits, adaptive=not args.no_adaptive)
+        print(f"Rate limits: Airtable {args.airtable_rps:g} req/s")
+        if configure_schema(args.schema_path, args.schema_ttl_hours, args.refresh_schema):
+            print(f"Checking region writes against the schema of table '{table_schema.name}' ({args.schema_path})")
+        apply_region_plan(args.plan_file, args.test, args.batch_size, args.flush_interval)
+        return
     
     test_mode = args.test
     limit = args.limit
@@ -251,8 +1766,10 @@ def main():
     park_name_filter = args.name
     force_update = args.force
     model = args.model
+    use_rules = not args.no_rules
+    planning = args.command == "plan"
     
-    mode_description = "TEST MODE" if test_mode else "UPDATE MODE"
+    mode_description = "PLAN MODE" if planning else "TEST MODE" if test_mode else "UPDATE MODE"
     print(f"Starting region update process in {mode_description}...")
     print(f"Using OpenAI model: {model}")
     print(f"Using region options: {', '.join(REGIONS)}")
@@ -265,57 +1782,123 @@ def main():
         print(f"Limiting to {limit} parks")
     if force_update:
         print("Forcing update even for parks with existing regions")
+    if not use_rules:
+        print("Rule engine disabled: every park goes to the AI model")
+    
+    if not args.no_cache:
+        configure_cache(args.cache_path, args.cache_ttl_days, args.cache_max_entries)
+        print(f"Using classification cache: {args.cache_path}")
+    
+    # With --workers, the limits are kept in a file every worker shares (the batch commands run alone);
+    # a --targets run passes in the file its targets share
+    workdir = None
+    if args.workers > 1 and args.command in (None, "plan"):
+        workdir = tempfile.mkdtemp(prefix="region-workers-")
+        atexit.register(shutil.rmtree, workdir, True)
+    limits_path = args.shared_limits or (os.path.join(workdir, "limits.sqlite3") if workdir else None)
     
-    # Track statistics
-    total_parks = 0
-    updated_parks = 0
-    already_set = 0
-    errors = 0
+    configure_rate_limits(args.airtable_rps, args.openai_rpm, args.openai_tpm, limits_path, not args.no_adaptive)
+    configure_prompts(args.park_tokens)
+    print(f"Rate limits: Airtable {args.airtable_rps:g} req/s, OpenAI {args.openai_rpm:g} req/min and {args.openai_tpm:g} tokens/min")
+    if not args.no_adaptive:
+        print("Adapting the rate limits to 429s, rate-limit headers and latency (the current limits are shown next to the progress bar)")
+    if workdir:
+        print(f"Sharing parks and rate limits between {args.workers} worker processes")
     
-    # Fetch all parks with pagination
-    offset = None
-    all_records = []
+    if args.command == "batch" and args.action == "status":
+        check_region_batch(args.state_file, args.wait, args.poll_interval)
+        return
     
-    # If specific_id is provided, just fetch that record
+    if configure_schema(args.schema_path, args.schema_ttl_hours, args.refresh_schema):
+        print(f"Checking region writes against the schema of table '{table_schema.name}' ({args.schema_path})")
+    
+    # A plan's stamps hold for the parks as read from here on
+    read_at = datetime.now(timezone.utc)
+    if args.command == "batch" and args.action == "apply":
+        apply_region_batch(args.state_file, test_mode, args.batch_size, args.flush_interval)
+        return
+    
+    mirror = None
+    if args.source == "mirror":
+        print("Reading parks from the local mirror...")
+        try:
+            mirror = open_mirror(args.mirror_path, args.full_sync)
+        except RuntimeError as e:
+            print(e)
+            return
+    
+    # Parks that already have a region would only be skipped, so Airtable leaves them out
+    unassigned_only = not force_update and not test_mode and not mirror
+    
+    # Parks are streamed: Airtable pages (or mirror rows) are processed as they arrive
     if specific_id:
-        url = f"https://api.airtable.com/v0/{AIRTABLE_BASE_ID}/{AIRTABLE_TABLE_NAME}/{specific_id}"
-        headers = {
-            "Authorization": f"Bearer {AIRTABLE_TOKEN}",
-            "Content-Type": "application/json"
-        }
-        response = requests.get(url, headers=headers)
-        if response.ok:
-            record = response.json()
-            all_records = [record]
-            total_parks = 1
-            print(f"Fetched park with ID {specific_id}: {record.get('fields', {}).get('Name', 'Unknown')}")
+        # If specific_id is provided, just fetch that record
+        if mirror:
+            record = mirror.get(specific_id)
+            record = ParkRecord.from_api(record) if record else None
         else:
-            print(f"Error fetching park with ID {specific_id}: {response.status_code} {response.text}")
+            record = fetch_park(specific_id)
+        if not record:
+            if mirror:
+                print(f"Park with ID {specific_id} is not in the mirror")
             return
+        print(f"Fetched park with ID {specific_id}: {record.name}")
+        parks = [record]
+    elif mirror:
+        parks = filter_parks(map(ParkRecord.from_api, mirror.records()), limit, park_name_filter)
     else:
-        # Otherwise fetch parks normally with pagination
         print("Fetching parks from Airtable...")
-        while True:
-            records, offset = fetch_parks(offset, limit)
-            
-            # Filter by name if specified
-            if park_name_filter:
-                records = [r for r in records if park_name_filter.lower() in r.get('fields', {}).get('Name', '').lower()]
-            
-            all_records.extend(records)
-            total_parks += len(records)
-            print(f"Fetched {len(records)} parks...")
-            
-            # Stop if we've reached the limit
-            if limit and total_parks >= limit:
-                all_records = all_records[:limit]
-                total_parks = limit
-                break
-                
-            if not offset:
-                break
+        if unassigned_only:
+            print("Only fetching parks without a region (use --force to include the rest)")
+        parks = iter_parks(limit, park_name_filter, unassigned_only, PARK_FIELDS)
     
-    print(f"Total parks to process: {total_parks}")
+    located = Counter()
+    if use_rules and not args.no_geo and not workdir:  # workers locate their own parks
+        if geo_available():
+            parks = locate_stream(parks, located)
+        else:
+            print("NumPy is not installed; parks without states will be classified by the AI model")
+    
+    if args.command == "batch":
+        submit_region_batch(parks, args.state_file, model, use_rules, include_existing=force_update)
+        return
+    
+    resumed = Counter()
+    if args.resume:
+        journal = configure_journal(args.journal_dir, resume=args.resume)
+        if not journal:
+            print(f"No journal for run {args.resume} in {args.journal_dir}")
+            return
+        print(f"Resuming run {journal.run_id} ({journal.path})")
+        for option in ("test", "force", "model"):
+            if journal.options.get(option) != getattr(args, option):
+                print(f"Warning: run {journal.run_id} was started with --{option} {journal.options.get(option)}, now {getattr(args, option)}")
+        parks = skip_completed(parks, journal, resumed)
+    elif not args.no_journal:
+        options = {"test": test_mode, "force": force_update, "model": model, "id": specific_id, "name": park_name_filter, "limit": limit}
+        journal = configure_journal(args.journal_dir, options)
+        print(f"Run ID: {journal.run_id} (if interrupted, continue with --resume {journal.run_id})")
+    
+    if args.ai_batch_size > 1:
+        print(f"Classifying up to {args.ai_batch_size} parks per OpenAI request")
+        if not workdir:  # workers batch their own parks
+            parks = classify_stream(parks, args.ai_batch_size, test_mode, model, use_rules)
+    
+    # Tally existing regions as parks stream past, for the report at the end
+    tally = RegionTally()
+    # Parks read in this run, which the report must not count again once they have a region
+    streamed = set() if unassigned_only else None
+    
+    stamps = {}
+    
+    def tallied(parks):
+        for park in parks:
+            tally.add(park.regions)
+            if streamed is not None:
+                streamed.add(park.id)
+            if planning:
+                stamps[park.id] = park_stamp(park)
+            yield park
     
     # Create a map to track changes
     changes_map = {
@@ -324,136 +1907,221 @@ def main():
         "new": [],        # Parks that didn't have a region before
         "errors": []      # Parks that had errors during processing
     }
+    counts = Counter()
+    previous_regions = {}
     
-    # Process each park
-    for park in tqdm(all_records, desc="Processing parks"):
-        record_id = park.get("id")
-        fields = park.get("fields", {})
-        park_name = fields.get("Name", "Unknown Park")
-        existing_region = fields.get("Region", [])
-        
-        # Convert existing_region to a simple string for comparison if it's a list
-        existing_region_str = existing_region[0] if isinstance(existing_region, list) and existing_region else existing_region
-        
-        # Skip if region already set and not forcing or in test mode
-        if existing_region_str and not force_update and not test_mode:
-            already_set += 1
-            continue
-        
-        # Determine region
-        region = determine_region(park, test_mode, model)
-        
-        if not region:
-            errors += 1
-            changes_map["errors"].append({
-                "id": record_id,
-                "name": park_name,
-                "existing_region": existing_region_str
-            })
-            continue
-        
-        # Track the change type
-        if existing_region_str:
-            if region == existing_region_str:
-                changes_map["unchanged"].append({
-                    "id": record_id,
-                    "name": park_name,
-                    "region": region
-                })
+    def handle(outcome):
+        record_outcome(outcome, changes_map, counts)
+        if outcome["status"] != "skipped":
+            previous_regions[outcome["entry"]["id"]] = outcome["previous"]
+    
+    # Process each park, queueing region updates for batched write-back
+    if workdir:
+        results = run_workers(tallied(parks), args.workers, workdir, limits_path, run_journal.run_id if run_journal else None)
+        failures, written, batches = [], 0, 0
+        for result in results:
+            merge_run_totals(result)
+            located.update(result["located"])
+            for outcome in result["outcomes"]:
+                handle(outcome)
+            failures += result["failures"]
+            written += result["written"]
+            batches += result["batches"]
+    else:
+        on_write = run_journal.written if run_journal else None
+        with PlannedWrites() if planning else BulkRegionWriter(test_mode, args.batch_size, args.flush_interval, on_write) as writer:
+            if args.use_async:
+                print(f"Processing parks concurrently (concurrency: {args.concurrency})")
+                asyncio.run(process_parks_async(tallied(parks), handle, test_mode, force_update, model, args.concurrency, writer, use_rules))
             else:
-                changes_map["changed"].append({
-                    "id": record_id,
-                    "name": park_name,
-                    "old_region": existing_region_str,
-                    "new_region": region
-                })
-        else:
-            changes_map["new"].append({
-                "id": record_id,
-                "name": park_name,
-                "region": region
-            })
-        
-        # Update Airtable (or simulate in test mode)
-        success = update_park_region(record_id, region, test_mode)
-        
-        if success:
-            updated_parks += 1
-        else:
-            errors += 1
-        
-        # Rate limiting to avoid hitting API limits
-        time.sleep(1)
+                from tqdm import tqdm
+                progress = tqdm(tallied(parks), desc="Processing parks")
+                for park in progress:
+                    handle(process_park(park, test_mode, force_update, model, writer, use_rules))
+                    if airtable_limiter.adaptive:
+                        progress.set_postfix_str(rate_limits_status(), refresh=False)
+        failures, written, batches = writer.failures, writer.written, writer.batches
     
-    # Print summary
-    print("\n--- SUMMARY ---")
-    print(f"Total parks processed: {total_parks}")
-    if not test_mode and not force_update:
-        print(f"Parks already had regions (skipped): {already_set}")
-    print(f"Parks processed: {updated_parks}")
-    print(f"Errors: {errors}")
+    apply_write_failures(failures, changes_map, counts)
+    if batches:
+        print(f"Wrote {written} region updates in {batches} Airtable requests")
+    if located["stateless"]:
+        print(f"Located {located['located']} of {located['stateless']} parks without states from their coordinates")
+    if resumed["completed"]:
+        print(f"Skipped {resumed['completed']} parks finished before run {run_journal.run_id} was interrupted")
+    if run_journal:
+        run_journal.finish(counts)
+        run_journal.close()
     
-    # Print changes detail
-    print("\n--- CHANGES DETAIL ---")
-    print(f"New region assignments: {len(changes_map['new'])}")
-    print(f"Changed region assignments: {len(changes_map['changed'])}")
-    print(f"Unchanged region assignments: {len(changes_map['unchanged'])}")
+    # The report may add the parks Airtable left out to the tally
+    processed = tally.total
+    record_run_metrics(processed, counts)
+    print_summary(processed, counts, changes_map, test_mode, force_update, planning, unassigned_only)
     
-    # Print changed regions if any
-    if changes_map["changed"]:
-        print("\nRegion changes:")
-        for change in changes_map["changed"]:
-            print(f"  {change['name']}: {change['old_region']} → {change['new_region']}")
+    if planning:
+        write_region_plan(args.plan_file, changes_map, stamps, read_at, model)
+        return
     
-    # Create a regions report
-    if updated_parks > 0:
+    # Create a regions report (always for a --targets run, whose parent combines them)
+    report = None
+    if counts["updated"] > 0 or args.target_result:
         print("\nGenerating regions report...")
-        generate_regions_report()
+        if specific_id or park_name_filter or limit or resumed["completed"]:
+            # Only part of the table was streamed, so re-read its regions
+            report = generate_regions_report(mirror)
+        else:
+            if not test_mode:
+                for record_id, region in applied_regions(changes_map).items():
+                    tally.replace(previous_regions[record_id], [region])
+            report = tally
+            if unassigned_only:
+                print("Parks that already had a region were not downloaded; reading just their Region field for the report...")
+                if not tally_assigned_parks(tally, streamed):
+                    report = None
+            if report:
+                tally.print_report()
+            
+            if args.verify_report:
+                print("\nVerifying regions report against Airtable...")
+                remote = generate_regions_report(mirror)
+                if remote and remote.counts != tally.counts:
+                    print("Warning: the table's region counts differ from the in-memory report")
+                elif remote:
+                    print("Regions report verified: counts match the table")
+    
+    if args.target_result:
+        write_target_result(args.target_result, processed, counts, changes_map, report)
 
-def generate_regions_report():
-    """Generate a report of park counts by region"""
-    try:
-        # Fetch all parks
-        all_records = []
-        offset = None
-        
-        while True:
-            records, offset = fetch_parks(offset)
-            all_records.extend(records)
-            if not offset:
-                break
-        
-        # Count parks by region
-        region_counts = {region: 0 for region in REGIONS}
-        region_counts["Unassigned"] = 0
-        
-        for park in all_records:
-            regions = park.get("fields", {}).get("Region", [])
-            # Handle Region as array (multi-select field)
-            if regions:
-                if isinstance(regions, list):
-                    for region in regions:
-                        if region in REGIONS:
-                            region_counts[region] += 1
-                        else:
-                            print(f"Warning: Unknown region '{region}' found in park record")
-                else:
-                    # Handle as string for backward compatibility
-                    if regions in REGIONS:
-                        region_counts[regions] += 1
+class RegionTally:
+    """Count of parks per region, as shown in the regions report"""
+    
+    def __init__(self):
+        self.counts = {region: 0 for region in REGIONS}
+        self.counts["Unassigned"] = 0
+        self.total = 0
+    
+    def add(self, regions):
+        """Count one park given the value of its Region field"""
+        self.total += 1
+        # Handle Region as array (multi-select field)
+        if regions:
+            if isinstance(regions, list):
+                for region in regions:
+                    if region in REGIONS:
+                        self.counts[region] += 1
                     else:
-                        print(f"Warning: Unknown region '{regions}' found in park record")
+                        print(f"Warning: Unknown region '{region}' found in park record")
             else:
-                region_counts["Unassigned"] += 1
-        
-        # Print report
+                # Handle as string for backward compatibility
+                if regions in REGIONS:
+                    self.counts[regions] += 1
+                else:
+                    print(f"Warning: Unknown region '{regions}' found in park record")
+        else:
+            self.counts["Unassigned"] += 1
+    
+    def replace(self, old_regions, new_regions):
+        """Move a park already counted under `old_regions` to `new_regions`"""
+        self.total -= 1
+        if not old_regions:
+            self.counts["Unassigned"] -= 1
+        else:
+            for region in old_regions if isinstance(old_regions, list) else [old_regions]:
+                if region in REGIONS:
+                    self.counts[region] -= 1
+        self.add(new_regions)
+    
+    def print_report(self):
         print("\n--- REGIONS REPORT ---")
-        for region, count in sorted(region_counts.items(), key=lambda x: (-x[1], x[0])):
-            percentage = (count / len(all_records)) * 100 if all_records else 0
+        for region, count in sorted(self.counts.items(), key=lambda x: (-x[1], x[0])):
+            percentage = (count / self.total) * 100 if self.total else 0
             print(f"{region}: {count} parks ({percentage:.1f}%)")
+
+def applied_regions(changes_map):
+    """Return {record_id: region} for every region written during the run"""
+    failed = {error["id"] for error in changes_map["errors"]}
+    applied = {change["id"]: change["region"] for change in changes_map["new"]}
+    applied.update({change["id"]: change["new_region"] for change in changes_map["changed"]})
+    return {record_id: region for record_id, region in applied.items() if record_id not in failed}
+
+def build_regions_report(records, applied=None):
+    """Tally regions from an iterable of records, with the applied changes folded in"""
+    applied = applied or {}
+    tally = RegionTally()
+    for park in records:
+        if park.id in applied:
+            tally.add([applied[park.id]])
+        else:
+            tally.add(park.regions)
+    return tally
+
+def tally_assigned_parks(tally, counted):
+    """Add the parks that have a region to `tally`, reading only their Region field
+    
+    A run without --force only downloads parks without a region, so this
+    completes its report. Parks in `counted` (those the run read, which may
+    have a region by now) are already in the tally and are skipped. Returns
+    False if the table could not be read.
+    """
+    params = {"pageSize": 100, "filterByFormula": "NOT({Region}=BLANK())", "fields[]": ["Region"]}
+    try:
+        with metrics.time("regions_report"):
+            while True:
+                with metrics.time("airtable_fetch"):
+                    response = airtable.list_records(**params)
+                if not response.ok:
+                    raise RuntimeError(f"Error fetching data: {response.status_code} {response.text}")
+                parks, offset = parse_page(response.content)
+                metrics.inc("records_fetched", len(parks), help="Park records read from Airtable")
+                for park in parks:
+                    if park.id not in counted:
+                        tally.add(park.regions)
+                if not offset:
+                    return True
+                params["offset"] = offset
+    except Exception as e:
+        print(f"Error generating regions report: {str(e)}")
+        return False
+
+def generate_regions_report(mirror=None):
+    """Generate a report of park counts by region by re-reading the table
+    
+    With a local mirror only the records changed since its last sync are
+    downloaded; otherwise the Region field of every park is fetched from Airtable.
+    Returns the RegionTally, or None if the table could not be read.
+    """
+    try:
+        # Stream all parks, counting them by region as they arrive
+        if mirror:
+            mirror.sync()
+            records = map(ParkRecord.from_api, mirror.records())
+        else:
+            records = iter_parks(fields=["Region"])
+        
+        with metrics.time("regions_report"):
+            tally = build_regions_report(records)
+        tally.print_report()
+        return tally
             
     except Exception as e:
         print(f"Error generating regions report: {str(e)}")
+        return None
+
+def main(argv=None):
+    """Run the script with `argv` (default: sys.argv[1:]), exporting the run's metrics when it ends"""
+    global command_arguments
+    command_arguments = sys.argv[1:] if argv is None else list(argv)
+    args = parser.parse_args(command_arguments)
+    # apply only writes the planned regions to Airtable, and a --targets parent
+    # leaves the parks to its children
+    configure_openai(args.api_key, args.openai_base_url, require_key=args.command != "apply" and not args.targets)
+    
+    succeeded = False
+    try:
+        run(args)
+        succeeded = True
+    finally:
+        export_metrics(args.metrics_json, args.metrics_prom, succeeded)
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    main()
\ No newline at end of file